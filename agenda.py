@@ -0,0 +1,73 @@
+# --- AGENDA DE EQUIPOS: ÍNDICE DE RESERVAS Y DETECCIÓN DE CHOQUES ---
+# El choque definitivo lo garantiza la restricción de exclusión de sql/004_reservas_sin_solape.sql;
+# el índice en memoria sirve para avisar antes de escribir y para buscar huecos libres.
+from datetime import datetime, time, timedelta
+import numpy as np
+import pandas as pd
+
+HORA_APERTURA = time(7, 0)
+HORA_CIERRE = time(22, 0)
+FRECUENCIAS = {"No se repite": None, "Diaria": timedelta(days=1), "Semanal": timedelta(weeks=1)}
+
+
+def normalizar_reservas(df_reservas):
+    """fecha_inicio/fecha_fin como datetime sin zona (hora de pared), en una sola pasada."""
+    df = df_reservas.copy()
+    for col in ['fecha_inicio', 'fecha_fin']:
+        df[col] = pd.to_datetime(df[col], errors='coerce', utc=True, format='mixed').dt.tz_localize(None)
+    df['equipo_id'] = df['equipo_id'].astype(str)
+    return df.dropna(subset=['fecha_inicio', 'fecha_fin'])
+
+
+class IndiceReservas:
+    """Intervalos ordenados por inicio para cada equipo, con el máximo acumulado de los fines.
+    Una consulta de solape cuesta O(log n + k)."""
+
+    def __init__(self, df_reservas):
+        self._por_equipo = {}
+        if df_reservas.empty: return
+        df = normalizar_reservas(df_reservas).sort_values('fecha_inicio')
+        for equipo_id, g in df.groupby('equipo_id'):
+            ini = g['fecha_inicio'].to_numpy(dtype='datetime64[us]')
+            fin = g['fecha_fin'].to_numpy(dtype='datetime64[us]')
+            self._por_equipo[equipo_id] = (ini, fin, np.maximum.accumulate(fin))
+
+    def conflictos(self, equipo_id, inicio, fin):
+        if str(equipo_id) not in self._por_equipo: return []
+        ini, fins, max_fin = self._por_equipo[str(equipo_id)]
+        a, b = np.datetime64(inicio, 'us'), np.datetime64(fin, 'us')
+        hasta = np.searchsorted(ini, b, side='left')
+        desde = np.searchsorted(max_fin[:hasta], a, side='right')
+        return [(ini[k].astype(datetime), fins[k].astype(datetime)) for k in range(desde, hasta) if fins[k] > a]
+
+    def choca(self, equipo_id, inicio, fin):
+        return bool(self.conflictos(equipo_id, inicio, fin))
+
+    def proximo_libre(self, equipo_id, duracion, desde, apertura=HORA_APERTURA, cierre=HORA_CIERRE, max_dias=60):
+        """Primer inicio >= `desde` con `duracion` libre dentro del horario del laboratorio."""
+        t = desde
+        for d in range(max_dias + 1):
+            dia = desde.date() + timedelta(days=d)
+            t = max(t, datetime.combine(dia, apertura))
+            fin_dia = datetime.combine(dia, cierre)
+            while t + duracion <= fin_dia:
+                choques = self.conflictos(equipo_id, t, t + duracion)
+                if not choques: return t
+                t = max(f for _, f in choques)
+        return None
+
+
+def ocurrencias(inicio, fin, frecuencia="No se repite", repeticiones=1):
+    paso = FRECUENCIAS.get(frecuencia)
+    if paso is None: return [(inicio, fin)]
+    return [(inicio + paso * i, fin + paso * i) for i in range(max(int(repeticiones), 1))]
+
+
+def reservas_en_ventana(cliente, equipo_id, inicio, fin):
+    """Sólo las reservas de `equipo_id` que se solapan con [inicio, fin)."""
+    return cliente.table("reservas").select("id, fecha_inicio, fecha_fin, usuario").eq("equipo_id", str(equipo_id)).lt("fecha_inicio", fin.isoformat()).gt("fecha_fin", inicio.isoformat()).execute().data
+
+
+def es_error_solape(error):
+    # 23P01 = exclusion_violation de Postgres
+    return "23P01" in str(error) or "reservas_sin_solape" in str(error)
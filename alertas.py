@@ -0,0 +1,28 @@
+# --- MOTOR DE ALERTAS DE INVENTARIO ---
+# Estados vectorizados sobre el DataFrame de items normalizado por datos.normalizar_items.
+import pandas as pd
+
+DIAS_VENCIMIENTO = 30
+
+
+def calcular_alertas(df, hoy=None, dias_vencimiento=DIAS_VENCIMIENTO):
+    """Máscaras booleanas por item: vencido, vence_pronto, bajo_umbral y sin_stock."""
+    hoy = pd.Timestamp(hoy if hoy is not None else pd.Timestamp.today()).normalize()
+    fv = df['vencimiento_dt'] if 'vencimiento_dt' in df.columns else pd.to_datetime(df['fecha_vencimiento'], errors='coerce')
+    dias = (fv - hoy).dt.days
+    cant, umb = df['cantidad_actual'], df['umbral_minimo']
+    return pd.DataFrame({
+        'vencido': (dias < 0).fillna(False),
+        'vence_pronto': dias.between(0, dias_vencimiento).fillna(False),
+        'bajo_umbral': (umb > 0) & (cant <= umb) & (cant > 0),
+        'sin_stock': cant <= 0,
+    }, index=df.index)
+
+
+def resumen_alertas(df, alertas):
+    """Subconjuntos listos para mostrar: críticos (bajo umbral o sin stock), vencidos y por vencer."""
+    return {
+        'criticos': df[alertas['bajo_umbral'] | alertas['sin_stock']],
+        'vencidos': df[alertas['vencido']],
+        'por_vencer': df[alertas['vence_pronto']],
+    }
@@ -0,0 +1,186 @@
+# --- LOTE NOCTURNO DE ALERTAS Y RESÚMENES POR CORREO ---
+# Recorre todos los laboratorios de una vez, sin Streamlit: refresca el rollup de consumo
+# (sql/008), lee items y consumo de todos los labs con consultas paginadas, calcula vencidos,
+# por vencer, críticos y de consumo rápido con los mismos motores vectorizados de la app,
+# guarda el resultado en alertas_lab y manda un resumen por administrador por una sola
+# sesión SMTP. Pensado para cron:
+#   0 7 * * *  cd /srv/stck && python alertas_lote.py >> /var/log/stck_alertas.log 2>&1
+# La configuración sale de variables de entorno o, si faltan, de .streamlit/secrets.toml.
+import argparse
+import html
+import logging
+import os
+import sys
+import time
+import tomllib
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import pandas as pd
+from alertas import DIAS_VENCIMIENTO, calcular_alertas
+from consumo import calcular_burn_rate
+from datos import leer_todo, normalizar_items
+
+DIAS_CONSUMO = 30
+DIAS_AGOTAMIENTO = 14
+ALERTAS_POR_LLAMADA = 5000
+MAX_FILAS_CORREO = 15
+ESPERA_CORREOS_S = 300
+TIPOS = {"vencido": "⛔ Vencidos", "por_vencer": "📅 Por vencer", "critico": "⚠️ Críticos / sin stock", "consumo_rapido": "🔥 Se agotan pronto"}
+COLUMNAS_ITEMS = "id, lab_id, nombre, cantidad_actual, unidad, umbral_minimo, fecha_vencimiento, ubicacion"
+
+log = logging.getLogger("stck.lote")
+
+
+def cargar_config(ruta_secrets=os.path.join(".streamlit", "secrets.toml")):
+    """Variables de entorno con respaldo en el secrets.toml de la app."""
+    secretos = {}
+    if os.path.exists(ruta_secrets):
+        with open(ruta_secrets, "rb") as f: secretos = tomllib.load(f)
+    return lambda clave, defecto=None: os.environ.get(clave, secretos.get(clave, defecto))
+
+
+def calcular_alertas_lote(df_items, consumo, hoy, dias_vencimiento=DIAS_VENCIMIENTO, dias_consumo=DIAS_CONSUMO, dias_agotamiento=DIAS_AGOTAMIENTO):
+    """Una fila por (item, tipo de alerta) para todos los labs: lab_id, item_id, tipo, nombre, unidad, detalle."""
+    a = calcular_alertas(df_items, hoy, dias_vencimiento)
+    pred = calcular_burn_rate(df_items, consumo, dias_consumo)
+    rapido = pred[(pred['dias_restantes_num'] <= dias_agotamiento) & (pred['cantidad_actual'] > 0)]
+    ext = df_items.assign(lab_id=df_items['lab_id'].astype(str), item_id=df_items['id'].astype(str), sin_stock=a['sin_stock'],
+                          tasa_diaria=rapido['tasa_diaria'].round(3), dias_restantes=rapido['dias_restantes_num'])
+    ext = ext.rename(columns={'cantidad_actual': 'cantidad', 'umbral_minimo': 'umbral'})
+    partes = [
+        (a['vencido'], "vencido", ['fecha_vencimiento', 'cantidad']),
+        (a['vence_pronto'], "por_vencer", ['fecha_vencimiento', 'cantidad']),
+        (a['bajo_umbral'] | a['sin_stock'], "critico", ['cantidad', 'umbral', 'sin_stock']),
+        (ext.index.isin(rapido.index), "consumo_rapido", ['cantidad', 'tasa_diaria', 'dias_restantes']),
+    ]
+    filas = []
+    for mascara, tipo, cols in partes:
+        sub = ext[mascara]
+        if tipo == "consumo_rapido": sub = sub.astype({'dias_restantes': int})
+        filas.extend({"lab_id": l, "item_id": i, "tipo": tipo, "nombre": n, "unidad": u, "detalle": d}
+                     for l, i, n, u, d in zip(sub['lab_id'], sub['item_id'], sub['nombre'], sub['unidad'], sub[cols].to_dict('records')))
+    return filas
+
+
+def guardar_alertas(cliente, labs, alertas, calculado_en, por_llamada=ALERTAS_POR_LLAMADA):
+    """Reemplaza las alertas de `labs` agrupando labs completos en llamadas de ~`por_llamada` filas."""
+    por_lab = {}
+    for fila in alertas: por_lab.setdefault(fila['lab_id'], []).append({k: fila[k] for k in ("lab_id", "item_id", "tipo", "nombre", "detalle")})
+    lote_labs, lote, guardadas = [], [], 0
+    for lab in labs:
+        lote_labs.append(lab)
+        lote.extend(por_lab.get(lab, []))
+        if len(lote) >= por_llamada or lab == labs[-1]:
+            guardadas += cliente.rpc("reemplazar_alertas", {"p_labs": lote_labs, "p_calculado_en": calculado_en, "p_alertas": lote}).execute().data or 0
+            lote_labs, lote = [], []
+    return guardadas
+
+
+def _celda(fila):
+    d = fila['detalle']
+    if fila['tipo'] in ("vencido", "por_vencer"): return f"vence {d['fecha_vencimiento']} · quedan {d['cantidad']:g} {fila['unidad']}"
+    if fila['tipo'] == "critico": return "sin stock" if d['sin_stock'] else f"{d['cantidad']:g} {fila['unidad']} (mínimo {d['umbral']:g})"
+    return f"{d['cantidad']:g} {fila['unidad']} · ~{d['dias_restantes']} días al ritmo actual"
+
+
+def armar_resumen(nombre_admin, alertas_por_lab, hoy):
+    """(asunto, html) del resumen diario de un administrador; None si no hay nada que avisar."""
+    total = sum(len(v) for v in alertas_por_lab.values())
+    if not total: return None
+    partes = [f"<html><body><h2>Resumen de Inventario · {hoy}</h2><p>Hola {html.escape(nombre_admin or '')}, estas son las alertas de hoy:</p>"]
+    for lab, filas in alertas_por_lab.items():
+        if not filas: continue
+        if len(alertas_por_lab) > 1: partes.append(f"<h3>Laboratorio {html.escape(lab)}</h3>")
+        for tipo, titulo in TIPOS.items():
+            del_tipo = [f for f in filas if f['tipo'] == tipo]
+            if not del_tipo: continue
+            items = "".join(f"<li><b>{html.escape(f['nombre'])}</b>: {html.escape(_celda(f))}</li>" for f in del_tipo[:MAX_FILAS_CORREO])
+            mas = f"<li>… y {len(del_tipo) - MAX_FILAS_CORREO} más en Stck</li>" if len(del_tipo) > MAX_FILAS_CORREO else ""
+            partes.append(f"<h4>{titulo} ({len(del_tipo)})</h4><ul>{items}{mas}</ul>")
+    partes.append("</body></html>")
+    return f"📋 Stck: {total} alertas de inventario ({hoy})", "".join(partes)
+
+
+def ejecutar_lote(cliente, bandeja, remitente, hoy=None, dias_vencimiento=DIAS_VENCIMIENTO, dias_consumo=DIAS_CONSUMO, dias_agotamiento=DIAS_AGOTAMIENTO, labs=None):
+    """Corre el lote completo. `bandeja` es una correo.BandejaSalida (o None para no enviar).
+    Devuelve un resumen con conteos, tiempos y los correos que fallaron."""
+    hoy = hoy or date.today()
+    t0, tiempos = time.perf_counter(), {}
+
+    def marcar(etapa):
+        nonlocal t0
+        tiempos[etapa] = round((time.perf_counter() - t0) * 1000, 1)
+        t0 = time.perf_counter()
+
+    cliente.rpc("refrescar_consumo_diario_todos", {}).execute()
+    marcar("rollup_ms")
+    filtrar = (lambda q: q.in_("lab_id", labs)) if labs else (lambda q: q)
+    df_items = normalizar_items(leer_todo(lambda: filtrar(cliente.table("items").select(COLUMNAS_ITEMS)), ["id"]))
+    if 'lab_id' not in df_items.columns: df_items['lab_id'] = ""
+    desde = (hoy - timedelta(days=dias_consumo)).isoformat()
+    filas_consumo = leer_todo(lambda: filtrar(cliente.table("consumo_diario").select("lab_id, item_id, dia, cantidad").gte("dia", desde)), ["lab_id", "item_id", "dia"])
+    df_c = pd.DataFrame(filas_consumo, columns=["lab_id", "item_id", "dia", "cantidad"])
+    consumo = pd.to_numeric(df_c['cantidad'], errors='coerce').fillna(0).groupby(df_c['item_id'].astype(str)).sum()
+    admins = leer_todo(lambda: filtrar(cliente.table("equipo").select("email, nombre, lab_id").eq("rol", "admin")), ["email", "lab_id"])
+    marcar("lectura_ms")
+
+    alertas = calcular_alertas_lote(df_items, consumo, hoy, dias_vencimiento, dias_consumo, dias_agotamiento)
+    marcar("calculo_ms")
+    todos_labs = sorted(set(df_items['lab_id'].astype(str)) | {str(a['lab_id']) for a in admins if a.get('lab_id')})
+    guardadas = guardar_alertas(cliente, todos_labs, alertas, datetime.now(timezone.utc).isoformat()) if todos_labs else 0
+    marcar("guardado_ms")
+
+    por_lab = {}
+    for fila in alertas: por_lab.setdefault(fila['lab_id'], []).append(fila)
+    por_admin = {}
+    for a in admins:
+        if a.get('email'): por_admin.setdefault(a['email'].strip().lower(), (a.get('nombre'), []))[1].append(str(a['lab_id']))
+    ids = {}
+    for email, (nombre, labs_admin) in por_admin.items():
+        correo = armar_resumen(nombre, {lab: por_lab.get(lab, []) for lab in labs_admin}, hoy)
+        if correo is None or bandeja is None: continue
+        msg = MIMEMultipart()
+        msg['From'], msg['To'], msg['Subject'] = remitente, email, correo[0]
+        msg.attach(MIMEText(correo[1], 'html'))
+        ids[bandeja.encolar(msg)] = email
+    if bandeja is not None and ids: bandeja.esperar(ESPERA_CORREOS_S)
+    estados = [bandeja.estado(i) for i in ids] if bandeja is not None else []
+    marcar("correo_ms")
+
+    fallidos = [{"para": ids[e['id']], "estado": e['estado'], "error": e.get('error')} for e in estados if e['estado'] != "enviado"]
+    return {"hoy": hoy.isoformat(), "labs": len(todos_labs), "items": len(df_items), "alertas": len(alertas), "guardadas": guardadas,
+            "por_tipo": dict(Counter(f['tipo'] for f in alertas)), "correos": len(ids), "correos_fallidos": fallidos, "tiempos": tiempos}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alertas de inventario y resúmenes diarios para todos los laboratorios.")
+    parser.add_argument("--hoy", type=date.fromisoformat, default=None, help="Fecha de referencia (AAAA-MM-DD); por defecto hoy.")
+    parser.add_argument("--labs", default=None, help="Sólo estos lab_id, separados por coma.")
+    parser.add_argument("--dias-vencimiento", type=int, default=None)
+    parser.add_argument("--dias-consumo", type=int, default=DIAS_CONSUMO)
+    parser.add_argument("--dias-agotamiento", type=int, default=DIAS_AGOTAMIENTO)
+    parser.add_argument("--sin-correo", action="store_true", help="Calcula y guarda, pero no envía resúmenes.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from supabase import create_client
+    from correo import BandejaSalida
+    config = cargar_config()
+    # El lote lee todos los laboratorios: con RLS activo necesita la clave de servicio
+    cliente = create_client(config("SUPABASE_URL"), config("SUPABASE_SERVICE_KEY") or config("SUPABASE_KEY"))
+    bandeja = None if args.sin_correo else BandejaSalida(config("SMTP_HOST", "smtp.gmail.com"), int(config("SMTP_PORT", 587)), config("EMAIL_SENDER"), config("EMAIL_PASSWORD"), max_retenidos=None)
+    try:
+        res = ejecutar_lote(cliente, bandeja, config("EMAIL_SENDER"), args.hoy, args.dias_vencimiento or int(config("DIAS_ALERTA_VENCIMIENTO", DIAS_VENCIMIENTO)),
+                            args.dias_consumo, args.dias_agotamiento, args.labs.split(",") if args.labs else None)
+    finally:
+        if bandeja is not None: bandeja.cerrar()
+    log.info("Lote %s: %d labs, %d items, %d alertas %s, %d resúmenes enviados, %d fallidos · %s", res['hoy'], res['labs'], res['items'], res['alertas'],
+             res['por_tipo'], res['correos'] - len(res['correos_fallidos']), len(res['correos_fallidos']), res['tiempos'])
+    for f in res['correos_fallidos']: log.error("Resumen a %s: %s (%s)", f['para'], f['estado'], f['error'])
+    return 1 if res['correos_fallidos'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
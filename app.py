@@ -1,30 +1,36 @@
 import streamlit as st
-import google.generativeai as genai
-from supabase import create_client
+from supabase import ClientOptions, create_client
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import json
 import re
 import html as html_lib
-from streamlit_mic_recorder import speech_to_text
 from datetime import datetime, date, timedelta, time
 import numpy as np
-from PIL import Image
-import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import urllib.parse
-import qrcode
 from io import BytesIO
-from fpdf import FPDF
-import pytz
-
-try:
-    from streamlit_calendar import calendar
-except ImportError:
-    st.error("⚠️ Falta instalar 'streamlit-calendar'. Por favor, agrégalo a tu archivo requirements.txt")
+from datos import LECTORES, NORMALIZADORES, TABLAS_VACIAS, TIMEOUT_CARGA_S, VersionesLab, cargar_en_paralelo, ajustar_stock, guardar_cambios, leer_consumos_bitacora, leer_pagina_bitacora, limpiar_item, registrar_entrada_bitacora, revertir_entrada_bitacora
+from alertas import DIAS_VENCIMIENTO, calcular_alertas, resumen_alertas
+from consumo import VENTANAS_DIAS, calcular_burn_rate, consumo_ventana, refrescar_rollup
+from atajos_ia import CacheRespuestas, clave_cache, es_respuesta_corta as es_respuesta_corta_ia, huella_catalogo, resolver_local
+from agenda import FRECUENCIAS, IndiceReservas, es_error_solape, normalizar_reservas, ocurrencias, reservas_en_ventana
+from contexto_ia import IndiceContexto
+from busqueda import IndiceCatalogo
+from ia_streaming import generar_en_streaming
+from vision import decodificar_qr, preparar_para_ia
+from correo import BandejaSalida
+from costeo import detalle_protocolo, items_por_id, matriz_bom, parsear_receta, patron_nombres, simular_costos
+from importacion import contar_filas, importar_catalogo
+from etiquetas import COLUMNAS, FILAS, generar_hoja_etiquetas, generar_qr
+from espejo import EspejoLocal
+from telemetria import UMBRALES_MS, ClienteMedido, ModeloMedido, Telemetria, lab_actual, pestana_actual
 
 # --- 1. CONFIGURACIÓN Y ESTÉTICA ---
-st.set_page_config(page_title="Stck", layout="wide", page_icon="🔬")
+# Ícono Material y no emoji: validar un emoji carga el catálogo completo de Streamlit (~100 ms)
+st.set_page_config(page_title="Stck", layout="wide", page_icon=":material/biotech:")
 
 st.markdown("""
 <style>
@@ -83,16 +89,111 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- TELEMETRÍA ---
+# Una instancia por proceso; los umbrales de "lento" se ajustan con UMBRAL_LENTO_<TIPO>_MS en secrets.
+@st.cache_resource
+def telemetria_app():
+    return Telemetria({t: float(st.secrets[f"UMBRAL_LENTO_{t.upper()}_MS"]) for t in UMBRALES_MS if f"UMBRAL_LENTO_{t.upper()}_MS" in st.secrets})
+tel = telemetria_app()
+
+# Un cliente por proceso: su pool HTTP (keep-alive) se reutiliza entre re-ejecuciones y sesiones.
+# El login usa un cliente aparte para que la sesión de auth de un usuario no quede en el compartido.
+TIMEOUT_SUPABASE_S = 10
+
+@st.cache_resource
+def cliente_supabase():
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"], options=ClientOptions(postgrest_client_timeout=float(st.secrets.get("TIMEOUT_SUPABASE_S", TIMEOUT_SUPABASE_S))))
+
 try:
-    supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
-    genai.configure(api_key=st.secrets["GENAI_KEY"])
+    supabase = ClienteMedido(cliente_supabase(), tel)
 except Exception as e:
     st.error(f"Error en Secrets: {e}")
     st.stop()
 
+# Gemini (y su import, el más pesado de la app) se carga recién cuando se usa la IA
 @st.cache_resource
-def cargar_modelo_rapido(): return genai.GenerativeModel('gemini-2.5-flash')
-model = cargar_modelo_rapido()
+def cargar_modelo_rapido():
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GENAI_KEY"])
+    return genai.GenerativeModel('gemini-2.5-flash')
+
+def modelo_ia(): return ModeloMedido(cargar_modelo_rapido(), tel)
+
+# --- CACHÉ DE DATOS POR LABORATORIO ---
+# Cada tabla se cachea por (tabla, lab_id, versión). Las escrituras suben la versión
+# sólo de las tablas que tocan; el TTL cubre cambios hechos desde otros procesos.
+TTL_DATOS = 300
+
+@st.cache_resource
+def registro_versiones(): return VersionesLab()
+versiones = registro_versiones()
+
+# Espejo SQLite opcional (ESPEJO_SQLITE = ruta del archivo): una caché fallida sólo pide a
+# Supabase lo cambiado desde la última sincronización y, sin conexión, sirve la copia local.
+@st.cache_resource
+def espejo_local():
+    ruta = st.secrets.get("ESPEJO_SQLITE")
+    return EspejoLocal(ruta) if ruta else None
+espejo = espejo_local()
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def cargar_tabla(tabla, lab_id, version):
+    if espejo is not None: return NORMALIZADORES[tabla](espejo.leer_sincronizado(supabase, lab_id, tabla))
+    return LECTORES[tabla](supabase, lab_id)
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def cargar_pagina_bitacora(lab_id, version, usuario, cursor): return leer_pagina_bitacora(supabase, lab_id, usuario, cursor)
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def consumos_bitacora_lab(lab_id, version, bitacora_ids): return leer_consumos_bitacora(supabase, lab_id, list(bitacora_ids))
+
+# Sólo lee: el rollup se refresca aparte (refrescar_consumo_lab, y cada noche en alertas_lote.py)
+# y la marca que devuelve ese refresco es parte de la clave.
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def burn_rate_lab(lab_id, marca_rollup, version_items, hoy, dias):
+    return calcular_burn_rate(cargar_tabla("items", lab_id, version_items), consumo_ventana(supabase, lab_id, dias, date.fromisoformat(hoy)), dias)
+
+@st.cache_resource(ttl=TTL_DATOS, show_spinner=False)
+def indice_reservas_lab(lab_id, version): return IndiceReservas(cargar_tabla("reservas", lab_id, version))
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def bom_lab(lab_id, version_prot, version_items):
+    return matriz_bom(cargar_tabla("protocolos", lab_id, version_prot), cargar_tabla("items", lab_id, version_items))
+
+@st.cache_resource(ttl=TTL_DATOS, show_spinner=False)
+def indice_contexto_lab(lab_id, version_items, version_prot):
+    return IndiceContexto(cargar_tabla("items", lab_id, version_items), cargar_tabla("protocolos", lab_id, version_prot), bom_lab(lab_id, version_prot, version_items))
+
+@st.cache_resource(ttl=TTL_DATOS, show_spinner=False)
+def indice_catalogo_lab(lab_id, version): return IndiceCatalogo(cargar_tabla("items", lab_id, version))
+
+@st.cache_resource(ttl=TTL_DATOS, show_spinner=False)
+def catalogo_lab(lab_id, version):
+    """Categorías ya ordenadas, cada una con sus filas ordenadas por nombre, y el CSS de alertas por fila."""
+    df_items = cargar_tabla("items", lab_id, version)
+    ordenado = df_items.assign(_cat=df_items['categoria'].astype(str).str.strip(), _nombre=df_items['nombre'].astype(str).str.lower()).sort_values(['_cat', '_nombre'], kind='stable')
+    ordenado = ordenado[~ordenado['_cat'].isin(["", "nan", "None"])]
+    grupos = {cat: g.drop(columns=['_cat', '_nombre']) for cat, g in ordenado.groupby('_cat', sort=False)}
+    return grupos, css_inventario(df_items)
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def huella_catalogo_lab(lab_id, version): return huella_catalogo(cargar_tabla("items", lab_id, version))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def leer_qr(foto_bytes):
+    from PIL import Image
+    return decodificar_qr(Image.open(BytesIO(foto_bytes)))
+
+@st.cache_data(ttl=TTL_DATOS, max_entries=8, show_spinner=False)
+def reporte_pdf_lab(lab_id, version, agrupar, generado_por, hoy):
+    from reportes import generar_reporte_inventario
+    with tel.span("pdf", "reporte_inventario"):
+        return generar_reporte_inventario(cargar_tabla("items", lab_id, version), generado_por, agrupar, date.fromisoformat(hoy))
+
+@st.cache_data(ttl=TTL_DATOS, show_spinner=False)
+def alertas_lab(lab_id, version, hoy, dias_vencimiento):
+    df_items = cargar_tabla("items", lab_id, version)
+    return resumen_alertas(df_items, calcular_alertas(df_items, hoy, dias_vencimiento))
 
 # --- GESTOR DE RUTINAS DIARIAS ---
 if "rutinas_diarias" not in st.session_state:
@@ -112,6 +213,7 @@ if st.session_state.usuario_autenticado is None:
     st.markdown("<h1 style='text-align: center;'>🔬 Stck</h1>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center; color: gray;'>Sistema de Gestión e Inventario para Laboratorios de Investigación</p>", unsafe_allow_html=True)
     
+    cliente_auth = ClienteMedido(create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"]), tel)
     col_espacio1, col_login, col_espacio2 = st.columns([1, 2, 1])
     with col_login:
         tab_login, tab_reg = st.tabs(["🔐 Iniciar Sesión", "🏢 Crear Cuenta"])
@@ -122,14 +224,14 @@ if st.session_state.usuario_autenticado is None:
                 if st.button("Acceder a Stck", type="primary", use_container_width=True):
                     with st.spinner("Autenticando..."):
                         try:
-                            res = supabase.auth.sign_in_with_password({"email": email_login.strip(), "password": pass_login})
+                            res = cliente_auth.auth.sign_in_with_password({"email": email_login.strip(), "password": pass_login})
                         except Exception as e:
                             st.error("Credenciales incorrectas o usuario no registrado.")
                             st.stop()
                         st.session_state.usuario_autenticado = res.user.email
                         st.session_state.user_uid = res.user.id
                         try:
-                            req_eq = supabase.table("equipo").select("*").eq("email", res.user.email).execute()
+                            req_eq = cliente_auth.table("equipo").select("*").eq("email", res.user.email).execute()
                             if req_eq.data:
                                 st.session_state.lab_id = req_eq.data[0]['lab_id']
                                 st.session_state.rol = req_eq.data[0]['rol']
@@ -158,9 +260,9 @@ if st.session_state.usuario_autenticado is None:
                         if not nombre_reg: st.warning("Falta el nombre.")
                         else:
                             try:
-                                supabase.auth.sign_up({"email": email_reg.strip(), "password": pass_reg})
-                                supabase.table("equipo").insert({"email": email_reg.strip().lower(), "nombre": nombre_reg, "perfil_academico": perfil_reg, "institucion": inst_reg, "rol": "espera"}).execute()
-                                res_login = supabase.auth.sign_in_with_password({"email": email_reg.strip(), "password": pass_reg})
+                                cliente_auth.auth.sign_up({"email": email_reg.strip(), "password": pass_reg})
+                                cliente_auth.table("equipo").insert({"email": email_reg.strip().lower(), "nombre": nombre_reg, "perfil_academico": perfil_reg, "institucion": inst_reg, "rol": "espera"}).execute()
+                                res_login = cliente_auth.auth.sign_in_with_password({"email": email_reg.strip(), "password": pass_reg})
                                 st.session_state.usuario_autenticado = res_login.user.email
                                 st.session_state.user_uid = res_login.user.id
                                 st.session_state.lab_id = "PENDIENTE"
@@ -176,9 +278,9 @@ if st.session_state.usuario_autenticado is None:
                         if not empresa_prov: st.warning("Pon el nombre de la empresa.")
                         else:
                             try:
-                                res_up = supabase.auth.sign_up({"email": email_prov.strip(), "password": pass_prov})
-                                supabase.table("equipo").insert({"email": email_prov.strip().lower(), "nombre": empresa_prov, "lab_id": res_up.user.id, "rol": "proveedor"}).execute()
-                                res_login = supabase.auth.sign_in_with_password({"email": email_prov.strip(), "password": pass_prov})
+                                res_up = cliente_auth.auth.sign_up({"email": email_prov.strip(), "password": pass_prov})
+                                cliente_auth.table("equipo").insert({"email": email_prov.strip().lower(), "nombre": empresa_prov, "lab_id": res_up.user.id, "rol": "proveedor"}).execute()
+                                res_login = cliente_auth.auth.sign_in_with_password({"email": email_prov.strip(), "password": pass_prov})
                                 st.session_state.usuario_autenticado = res_login.user.email
                                 st.session_state.user_uid = res_login.user.id
                                 st.session_state.lab_id = res_login.user.id
@@ -195,6 +297,7 @@ if st.session_state.lab_id == "PENDIENTE":
         res_check = supabase.table("equipo").select("*").eq("email", st.session_state.usuario_autenticado).execute()
         if res_check.data: supabase.table("equipo").update({"lab_id": st.session_state.user_uid, "rol": "admin"}).eq("email", st.session_state.usuario_autenticado).execute()
         else: supabase.table("equipo").insert({"email": st.session_state.usuario_autenticado, "lab_id": st.session_state.user_uid, "rol": "admin", "nombre": "Admin"}).execute()
+        versiones.invalidar(st.session_state.user_uid, "equipo")
         st.session_state.lab_id = st.session_state.user_uid
         st.session_state.rol = "admin"
         st.rerun()
@@ -205,50 +308,35 @@ if st.session_state.lab_id == "PENDIENTE":
 
 # --- VARIABLES GLOBALES Y FUNCIONES ---
 lab_id = st.session_state.lab_id
+lab_actual.set(lab_id)
 usuario_actual = st.session_state.get('nombre_usuario', st.session_state.get('usuario_autenticado', 'Usuario'))
 rol_actual = str(st.session_state.get('rol', 'miembro')).strip().lower()
 correo_destinatario_compras = st.secrets.get("EMAIL_RECEIVER", "No configurado")
 
 if 'auto_search' not in st.session_state: st.session_state.auto_search = ""
 
-def generar_qr(texto):
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-    qr.add_data(texto)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
-
-def generar_pdf_inventario(df_inventario, nombre_lab):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt=f"Reporte Oficial de Inventario", ln=True, align='C')
-    pdf.set_font("Arial", size=10)
-    pdf.cell(200, 10, txt=f"Generado por: Stck LIMS | Fecha: {date.today()}", ln=True, align='C')
-    pdf.ln(10)
-    
-    pdf.set_font("Arial", 'B', 10)
-    pdf.cell(85, 10, 'Reactivo', border=1)
-    pdf.cell(25, 10, 'Stock', border=1)
-    pdf.cell(40, 10, 'Ubicacion', border=1)
-    pdf.cell(40, 10, 'Vencimiento', border=1)
-    pdf.ln()
-
-    pdf.set_font("Arial", size=9)
-    for _, row in df_inventario.iterrows():
-        nombre = str(row['nombre']).encode('latin-1', 'replace').decode('latin-1')[:45]
-        stock = f"{row['cantidad_actual']} {row['unidad']}".encode('latin-1', 'replace').decode('latin-1')
-        ub = str(row['ubicacion']).encode('latin-1', 'replace').decode('latin-1')[:20]
-        venc = str(row['fecha_vencimiento']).encode('latin-1', 'replace').decode('latin-1')
-        
-        pdf.cell(85, 10, nombre, border=1)
-        pdf.cell(25, 10, stock, border=1)
-        pdf.cell(40, 10, ub, border=1)
-        pdf.cell(40, 10, venc, border=1)
-        pdf.ln()
-    return pdf.output(dest='S').encode('latin-1')
+def invalidar(*tablas): versiones.invalidar(lab_id, *tablas)
+
+def refrescar_consumo_lab(forzar=False):
+    """Refresca el rollup de consumo una vez por versión de movimiento y día en la sesión. Devuelve su marca."""
+    clave = (lab_id, versiones.version(lab_id, "movimiento"), date.today().isoformat())
+    if forzar or st.session_state.get("rollup_consumo", (None, None))[0] != clave:
+        st.session_state.rollup_consumo = (clave, refrescar_rollup(supabase, lab_id))
+    return st.session_state.rollup_consumo[1]
+
+def guardar_editor(tabla, original, editado, limpiar=None):
+    n = guardar_cambios(supabase, tabla, original, editado, lab_id, limpiar)
+    if n == 0:
+        st.info("No hay cambios que guardar.")
+        return
+    invalidar(tabla)
+    st.session_state[f"aviso_{tabla}"] = f"✅ {n} fila(s) modificada(s) guardadas."
+    st.rerun()
+
+def num_limpio(x): return int(x) if float(x).is_integer() else float(x)
+
+def mostrar_aviso(tabla):
+    if st.session_state.get(f"aviso_{tabla}"): st.success(st.session_state.pop(f"aviso_{tabla}"))
 
 def obtener_admin_email(lab_id):
     try:
@@ -257,47 +345,49 @@ def obtener_admin_email(lab_id):
         return correos[0] if correos else st.secrets.get("EMAIL_SENDER")
     except: return st.secrets.get("EMAIL_SENDER")
 
-def enviar_correo_reserva(equipo_nombre, fecha_str, hora_ini, hora_fin, usuario_reserva, admin_email, usuario_email):
-    try:
-        sender = st.secrets["EMAIL_SENDER"]
-        password = st.secrets["EMAIL_PASSWORD"]
-        msg_user = MIMEMultipart()
-        msg_user['From'] = sender
-        msg_user['To'] = usuario_email
-        msg_user['Subject'] = f"✅ Reserva Confirmada: {equipo_nombre} - Stck"
-        msg_user.attach(MIMEText(f"<html><body><h3>Reserva Exitosa</h3><p>Hola, has reservado exitosamente el equipo <b>{equipo_nombre}</b> para el <b>{fecha_str}</b> en el horario de <b>{hora_ini}</b> a <b>{hora_fin}</b>.</p></body></html>", 'html'))
-        msg_admin = MIMEMultipart()
-        msg_admin['From'] = sender
-        msg_admin['To'] = admin_email
-        msg_admin['Subject'] = f"📅 Nueva Reserva de Equipo: {equipo_nombre} - Stck"
-        msg_admin.attach(MIMEText(f"<html><body><h3>Notificación de Laboratorio</h3><p>El usuario <b>{usuario_reserva}</b> ({usuario_email}) ha agendado el uso de <b>{equipo_nombre}</b> para el <b>{fecha_str}</b> desde las <b>{hora_ini}</b> hasta las <b>{hora_fin}</b>.</p></body></html>", 'html'))
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender, password)
-        server.send_message(msg_user)
-        if admin_email and admin_email != usuario_email: server.send_message(msg_admin)
-        server.quit()
-        return True
-    except: return False
+@st.cache_resource
+def bandeja_correo():
+    # El envío corre en otro hilo: el lab y la pestaña viajan con cada mensaje
+    medir = lambda ms, ctx: tel.registrar("correo", "smtp.send_message", ms, *(ctx or (None, None)))
+    return BandejaSalida(st.secrets.get("SMTP_HOST", "smtp.gmail.com"), int(st.secrets.get("SMTP_PORT", 587)), st.secrets["EMAIL_SENDER"], st.secrets["EMAIL_PASSWORD"], medir=medir)
 
-def enviar_correo_compras(item_nombre, precio, operador):
+def encolar_correo(para, asunto, cuerpo_html):
+    # Si el correo no llega a la bandeja (destinatario inválido, secreto ausente, bandeja que no
+    # arranca) queda registrado como "error" junto a los demás y se avisa en pantalla.
     try:
-        sender = st.secrets["EMAIL_SENDER"]
-        password = st.secrets["EMAIL_PASSWORD"]
-        receiver = st.secrets.get("EMAIL_RECEIVER", sender)
+        if not para or "@" not in str(para): raise ValueError(f"destinatario inválido: {para!r}")
         msg = MIMEMultipart()
-        msg['From'] = sender
-        msg['To'] = receiver
-        msg['Subject'] = f"🛒 SOLICITUD DE COMPRA: {item_nombre} - Stck"
-        body = f"<html><body><h2>Solicitud de Cotización / Compra</h2><p>Se ha solicitado reabastecer el siguiente ítem:</p><ul><li><b>Reactivo:</b> {item_nombre}</li><li><b>Último precio referencial:</b> ${precio}</li><li><b>Solicitado por:</b> {operador}</li></ul></body></html>"
-        msg.attach(MIMEText(body, 'html'))
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender, password)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except: return False
+        msg['From'] = st.secrets["EMAIL_SENDER"]
+        msg['To'] = para
+        msg['Subject'] = asunto
+        msg.attach(MIMEText(cuerpo_html, 'html'))
+        id_msg = bandeja_correo().encolar(msg, (lab_actual.get(), pestana_actual.get()))
+    except (KeyError, FileNotFoundError, ValueError, OSError, RuntimeError) as e:
+        fallidos = st.session_state.setdefault('correos_fallidos', {})
+        id_msg = f"fallido-{len(fallidos)}"
+        fallidos[id_msg] = {"id": id_msg, "para": para, "asunto": asunto, "estado": "error", "intentos": 0, "error": f"{type(e).__name__}: {e}"}
+        st.error(f"📧 No se pudo encolar el correo '{asunto}': {e}")
+    st.session_state.setdefault('correos_encolados', []).append(id_msg)
+    return id_msg
+
+def mostrar_estado_correos(n=3):
+    ids = st.session_state.get('correos_encolados', [])[-n:]
+    fallidos = st.session_state.get('correos_fallidos', {})
+    iconos = {"pendiente": "⏳", "enviando": "📤", "reintentando": "🔁", "enviado": "✅", "error": "❌"}
+    for id_msg in reversed(ids):
+        est = fallidos.get(id_msg) or bandeja_correo().estado(id_msg)
+        st.caption(f"{iconos.get(est['estado'], '❔')} 📧 {est.get('asunto', '')} → {est.get('para', '')}: {est['estado']}" + (f" ({est['error']})" if est.get('error') else ""))
+
+def enviar_correo_reserva(equipo_nombre, fecha_str, hora_ini, hora_fin, usuario_reserva, admin_email, usuario_email):
+    ids = [encolar_correo(usuario_email, f"✅ Reserva Confirmada: {equipo_nombre} - Stck", f"<html><body><h3>Reserva Exitosa</h3><p>Hola, has reservado exitosamente el equipo <b>{equipo_nombre}</b> para el <b>{fecha_str}</b> en el horario de <b>{hora_ini}</b> a <b>{hora_fin}</b>.</p></body></html>")]
+    if admin_email and admin_email != usuario_email:
+        ids.append(encolar_correo(admin_email, f"📅 Nueva Reserva de Equipo: {equipo_nombre} - Stck", f"<html><body><h3>Notificación de Laboratorio</h3><p>El usuario <b>{usuario_reserva}</b> ({usuario_email}) ha agendado el uso de <b>{equipo_nombre}</b> para el <b>{fecha_str}</b> desde las <b>{hora_ini}</b> hasta las <b>{hora_fin}</b>.</p></body></html>"))
+    return ids
+
+def enviar_correo_compras(item_nombre, precio, operador):
+    receiver = st.secrets.get("EMAIL_RECEIVER", st.secrets.get("EMAIL_SENDER"))
+    body = f"<html><body><h2>Solicitud de Cotización / Compra</h2><p>Se ha solicitado reabastecer el siguiente ítem:</p><ul><li><b>Reactivo:</b> {item_nombre}</li><li><b>Último precio referencial:</b> ${precio}</li><li><b>Solicitado por:</b> {operador}</li></ul></body></html>"
+    return encolar_correo(receiver, f"🛒 SOLICITUD DE COMPRA: {item_nombre} - Stck", body)
 
 def generar_link_gcal(titulo, inicio, fin, descripcion=""):
     fmt = "%Y%m%dT%H%M%SZ"
@@ -307,54 +397,34 @@ def generar_link_gcal(titulo, inicio, fin, descripcion=""):
     return url
 
 # --- CARGA DE DATOS ---
-res_items = supabase.table("items").select("*").eq("lab_id", lab_id).execute()
-df = pd.DataFrame(res_items.data)
-for col in ['id', 'nombre', 'categoria', 'ubicacion', 'posicion_caja', 'unidad', 'fecha_vencimiento', 'fecha_cotizacion']:
-    if col not in df.columns: df[col] = ""
-    df[col] = df[col].astype(str).replace(["nan", "None", "NaT"], "")
-for col in ['cantidad_actual', 'umbral_minimo', 'precio']:
-    if col not in df.columns: df[col] = 0
-    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-df['categoria'] = df['categoria'].replace("", "GENERAL")
-
-try: res_prot = supabase.table("protocolos").select("*").eq("lab_id", lab_id).execute(); df_prot = pd.DataFrame(res_prot.data)
-except: df_prot = pd.DataFrame(columns=["id", "nombre", "materiales_base"])
+# Tablas y primera página de la bitácora en paralelo; lo que falle o no responda se muestra vacío con aviso.
+def cargar(tabla): return cargar_tabla(tabla, lab_id, versiones.version(lab_id, tabla))
 
-try:
-    res_equipos = supabase.table("equipos_lab").select("*").eq("lab_id", lab_id).execute()
-    df_equipos = pd.DataFrame(res_equipos.data)
-    for col in ['descripcion', 'visibilidad', 'requisitos']:
-        if col not in df_equipos.columns: df_equipos[col] = ""
-        df_equipos[col] = df_equipos[col].astype(str).replace(["nan", "None"], "")
-    res_reservas = supabase.table("reservas").select("*").eq("lab_id", lab_id).execute()
-    df_reservas = pd.DataFrame(res_reservas.data)
-except:
-    df_equipos = pd.DataFrame(columns=["id", "nombre", "descripcion", "visibilidad", "requisitos"])
-    df_reservas = pd.DataFrame(columns=["id", "equipo_id", "usuario", "fecha_inicio", "fecha_fin"])
+ctx_script = get_script_run_ctx()
+tareas_carga = {tabla: (lambda t=tabla: cargar(t)) for tabla in LECTORES}
+tareas_carga["bitacora"] = lambda: cargar_pagina_bitacora(lab_id, versiones.version(lab_id, "bitacora"), None if rol_actual == "admin" else usuario_actual, None)
+with tel.seccion("Carga de datos"):
+    datos_lab, fallas_carga = cargar_en_paralelo(tareas_carga, float(st.secrets.get("TIMEOUT_CARGA_S", TIMEOUT_CARGA_S)), lambda: add_script_run_ctx(threading.current_thread(), ctx_script))
+if "items" in fallas_carga:
+    st.error(f"❌ No se pudo cargar el inventario ({fallas_carga['items']}). Recarga la página para reintentar.")
+    st.stop()
+for tabla in fallas_carga.keys() & TABLAS_VACIAS.keys(): datos_lab[tabla] = TABLAS_VACIAS[tabla]()
+df, df_prot, df_equipos, df_reservas = datos_lab["items"], datos_lab["protocolos"], datos_lab["equipos_lab"], datos_lab["reservas"]
+nombres_equipo = [usuario_actual] if "equipo" in fallas_carga else datos_lab["equipo"]
+if fallas_carga:
+    st.warning("⚠️ No se pudo cargar: " + ", ".join(f"{t} ({e})" for t, e in fallas_carga.items()) + ". Se muestra lo disponible; recarga la página para reintentar.")
 
-try:
-    res_bitacora = supabase.table("bitacora").select("*").eq("lab_id", lab_id).order("created_at", desc=True).execute()
-    df_bitacora = pd.DataFrame(res_bitacora.data)
-    for col in ['contenido', 'resultado', 'link_adjunto', 'created_at', 'id']:
-        if col not in df_bitacora.columns: df_bitacora[col] = ""
-except Exception as e: 
-    try: 
-        res_bitacora = supabase.table("bitacora").select("*").eq("lab_id", lab_id).order("fecha", desc=True).execute()
-        df_bitacora = pd.DataFrame(res_bitacora.data)
-    except:
-        df_bitacora = pd.DataFrame(columns=["id", "usuario", "fecha", "contenido", "resultado", "link_adjunto", "created_at"])
+ESTILO_SIN_STOCK = 'background-color: #ffeaea; color: #a00'
+ESTILO_BAJO_UMBRAL = 'background-color: #fff8e6; color: #850'
 
-try:
-    res_equipo_lab = supabase.table("equipo").select("nombre").eq("lab_id", lab_id).execute()
-    nombres_equipo = [row['nombre'] for row in res_equipo_lab.data]
-except: nombres_equipo = [usuario_actual]
+def css_inventario(df_items):
+    a = calcular_alertas(df_items)
+    return pd.Series(np.where(a['sin_stock'], ESTILO_SIN_STOCK, np.where(a['bajo_umbral'], ESTILO_BAJO_UMBRAL, '')), index=df_items.index)
 
-def aplicar_estilos_inv(row):
-    cant = row.get('cantidad_actual', 0)
-    umb = row.get('umbral_minimo', 0)
-    if cant <= 0: return ['background-color: #ffeaea; color: #a00'] * len(row)
-    if umb > 0 and cant <= umb: return ['background-color: #fff8e6; color: #850'] * len(row)
-    return [''] * len(row)
+def estilo_tabla_inv(tabla, css):
+    # Un solo apply sobre toda la tabla con el CSS ya calculado por fila
+    estilos = lambda d: pd.DataFrame(np.repeat(css.reindex(d.index).fillna('').to_numpy()[:, None], d.shape[1], axis=1), index=d.index, columns=d.columns)
+    return tabla.style.format({'cantidad_actual': lambda x: f"{x:g}" if pd.notnull(x) else ""}).apply(estilos, axis=None)
 
 # --- CABECERA PRINCIPAL ---
 col_logo, col_user = st.columns([3, 1])
@@ -377,16 +447,21 @@ if rol_actual == "proveedor":
         else: st.dataframe(df[['nombre', 'categoria', 'precio', 'unidad']], use_container_width=True, hide_index=True)
     with tab_prov_carga:
         archivo_excel = st.file_uploader("Sube tu Excel de Catálogo", type=["xlsx", "csv"])
+        st.caption("Columnas reconocidas: Nombre/Producto, Precio, Categoría, Unidad y Código/SKU. Volver a subir la lista actualiza los productos existentes en vez de duplicarlos.")
         if archivo_excel and st.button("🚀 Cargar Productos a la Red"):
-            df_n = pd.read_csv(archivo_excel) if archivo_excel.name.endswith('.csv') else pd.read_excel(archivo_excel, engine='openpyxl')
-            df_s = df_n.rename(columns={"Nombre": "nombre", "Precio": "precio", "Categoria": "categoria", "Unidad": "unidad"})
-            for c in ["ubicacion", "posicion_caja", "lote"]: df_s[c] = "Bodega Proveedor"
-            df_s['cantidad_actual'] = 9999 
-            df_s['lab_id'] = lab_id 
-            cols_guardar = [c for c in df_s.columns if c in ['nombre', 'precio', 'categoria', 'unidad', 'ubicacion', 'posicion_caja', 'lote', 'cantidad_actual', 'lab_id']]
-            supabase.table("items").insert(df_s[cols_guardar].replace({np.nan: None}).to_dict(orient="records")).execute()
-            st.success("¡Catálogo actualizado con éxito!")
-            st.rerun()
+            total_filas = contar_filas(archivo_excel, archivo_excel.name)
+            barra = st.progress(0.0, text="Leyendo archivo...")
+            def avance_import(r):
+                barra.progress(min(r["leidas"] / total_filas, 1.0) if total_filas else 0.0, text=f"{r['leidas']:,} filas leídas · {r['guardadas']:,} guardadas · {r['con_error']:,} con error")
+            try:
+                res_imp = importar_catalogo(supabase, archivo_excel, archivo_excel.name, lab_id, avance_import)
+                barra.progress(1.0, text="Importación terminada")
+                invalidar("items")
+                st.success(f"¡Catálogo actualizado! {res_imp['guardadas']:,} productos guardados de {res_imp['leidas']:,} filas ({res_imp['repetidas']:,} repetidas en el archivo).")
+                if res_imp["errores"]:
+                    st.warning(f"{res_imp['con_error']:,} filas no se cargaron.")
+                    st.dataframe(pd.DataFrame(res_imp["errores"], columns=["Fila", "Motivo"]), hide_index=True, use_container_width=True)
+            except Exception as e: st.error(f"❌ Error al importar: {e}")
     st.stop()
 
 # =====================================================================
@@ -395,65 +470,83 @@ if rol_actual == "proveedor":
 col_chat, col_mon = st.columns([1, 1.6], gap="large")
 
 with col_mon:
-    # ORDEN PRIORITARIO: Inventario -> Bitácora -> Protocolos -> Equipos -> Analítica -> Usuarios
+    # ORDEN PRIORITARIO: Inventario -> Bitácora -> Protocolos -> Equipos -> Analítica -> Rendimiento -> Usuarios
     if rol_actual == "admin": 
-        tab_inv, tab_bitacora, tab_prot, tab_equipos, tab_analisis, tab_usuarios = st.tabs(["📦 Inventario", "📔 Bitácora", "🧪 Protocolos", "📅 Equipos", "📊 Analítica", "👥 Usuarios"])
+        tab_inv, tab_bitacora, tab_prot, tab_equipos, tab_analisis, tab_rendimiento, tab_usuarios = st.tabs(["📦 Inventario", "📔 Bitácora", "🧪 Protocolos", "📅 Equipos", "📊 Analítica", "⏱️ Rendimiento", "👥 Usuarios"])
     else: 
         tab_inv, tab_bitacora, tab_prot, tab_equipos = st.tabs(["📦 Inventario", "📔 Bitácora", "🧪 Protocolos", "📅 Equipos"])
     
-    with tab_inv:
+    with tab_inv, tel.seccion("Inventario"):
         if not df.empty:
-            df['vence_pronto'] = False
-            hoy = pd.to_datetime(date.today())
-            for idx, row in df.iterrows():
-                try:
-                    if row['fecha_vencimiento'] and str(row['fecha_vencimiento']).strip():
-                        fv = pd.to_datetime(row['fecha_vencimiento'])
-                        if (fv - hoy).days <= 30: df.at[idx, 'vence_pronto'] = True
-                except: pass
+            dias_alerta = st.session_state.get('dias_alerta', int(st.secrets.get("DIAS_ALERTA_VENCIMIENTO", DIAS_VENCIMIENTO)))
+            alertas = alertas_lab(lab_id, versiones.version(lab_id, "items"), date.today().isoformat(), dias_alerta)
+            df_criticos, df_vencidos, df_por_vencer = alertas['criticos'], alertas['vencidos'], alertas['por_vencer']
             
-            df_criticos = df[(df['cantidad_actual'] <= df['umbral_minimo']) & (df['umbral_minimo'] > 0) | (df['cantidad_actual'] <= 0)]
-            df_vencidos = df[df['vence_pronto'] == True]
-            
-            if not df_criticos.empty or not df_vencidos.empty:
+            if not df_criticos.empty or not df_vencidos.empty or not df_por_vencer.empty:
                 st.error("🚨 **Alertas del Laboratorio**")
                 if not df_criticos.empty: 
                     with st.expander(f"⚠️ **{len(df_criticos)} Reactivos Críticos / Fuera de Stock** (Haz clic para ver)"):
                         df_crit_show = df_criticos[['nombre', 'cantidad_actual', 'umbral_minimo', 'ubicacion', 'unidad']].copy()
                         st.dataframe(df_crit_show.style.format({'cantidad_actual': lambda x: f"{x:g}", 'umbral_minimo': lambda x: f"{x:g}"}), hide_index=True, use_container_width=True)
                 if not df_vencidos.empty: 
-                    with st.expander(f"📅 **{len(df_vencidos)} Reactivos Vencen en < 30 días** (Haz clic para ver)"):
+                    with st.expander(f"⛔ **{len(df_vencidos)} Reactivos Vencidos** (Haz clic para ver)"):
                         df_venc_show = df_vencidos[['nombre', 'fecha_vencimiento', 'cantidad_actual', 'ubicacion']].copy()
                         st.dataframe(df_venc_show.style.format({'cantidad_actual': lambda x: f"{x:g}"}), hide_index=True, use_container_width=True)
+                if not df_por_vencer.empty: 
+                    with st.expander(f"📅 **{len(df_por_vencer)} Reactivos Vencen en < {dias_alerta} días** (Haz clic para ver)"):
+                        df_pv_show = df_por_vencer[['nombre', 'fecha_vencimiento', 'cantidad_actual', 'ubicacion']].copy()
+                        st.dataframe(df_pv_show.style.format({'cantidad_actual': lambda x: f"{x:g}"}), hide_index=True, use_container_width=True)
+            with st.popover("⚙️ Configurar alertas"):
+                st.number_input("Avisar vencimientos con cuántos días de anticipación:", min_value=1, max_value=365, value=dias_alerta, key='dias_alerta')
         
         subtab_cat, subtab_edit = st.tabs(["🗂️ Catálogo Rápido", "✍️ Gestionar Inventario (Edición)"])
         
         with subtab_cat:
             st.markdown("### Buscador de Reactivos")
-            busqueda = st.text_input("🔍 Buscar reactivo...", value=st.session_state.auto_search)
-            df_show = df[df['nombre'].str.contains(busqueda, case=False)] if busqueda else df
-            categorias = sorted(list(set([str(c).strip() for c in df_show['categoria'].unique() if str(c).strip() not in ["", "nan", "None"]])))
+            busqueda = st.text_input("🔍 Buscar reactivo...", value=st.session_state.auto_search, placeholder="Nombre, categoría, ubicación, caja o sigla (pbs, etoh...)")
+            df_show = df.iloc[indice_catalogo_lab(lab_id, versiones.version(lab_id, "items")).buscar(busqueda)] if busqueda.strip() else df
+            cols_cat = ['nombre', 'cantidad_actual', 'unidad', 'ubicacion', 'posicion_caja', 'fecha_vencimiento']
             
             if df.empty: st.info("Inventario vacío.")
             else:
-                for cat in categorias:
-                    with st.expander(f"📁 {cat}", expanded=False):
-                        subset_cat = df_show[df_show['categoria'].astype(str).str.strip() == cat].sort_values(by='nombre', key=lambda col: col.str.lower())
-                        st.dataframe(
-                            subset_cat[['nombre', 'cantidad_actual', 'unidad', 'ubicacion', 'posicion_caja', 'fecha_vencimiento']]
-                            .style.format({'cantidad_actual': lambda x: f"{x:g}" if pd.notnull(x) else ""})
-                            .apply(aplicar_estilos_inv, axis=1), 
-                            use_container_width=True, hide_index=True
-                        )
+                grupos_cat, css_inv = catalogo_lab(lab_id, versiones.version(lab_id, "items"))
+                if busqueda.strip():
+                    st.caption(f"{len(df_show)} resultados, del más al menos relevante")
+                    st.dataframe(estilo_tabla_inv(df_show[['nombre', 'categoria'] + cols_cat[1:]], css_inv), use_container_width=True, hide_index=True)
+                else:
+                    # El cuerpo de un expander corre aunque esté cerrado: la tabla se arma recién
+                    # cuando se pide ver la categoría por primera vez
+                    for cat, subset_cat in grupos_cat.items():
+                        abierta = st.session_state.get(f"cat_abierta_{cat}", False)
+                        with st.expander(f"📁 {cat}", expanded=abierta):
+                            if abierta: st.dataframe(estilo_tabla_inv(subset_cat[cols_cat], css_inv), use_container_width=True, hide_index=True)
+                            elif st.button(f"Ver {len(subset_cat)} reactivo(s)", key=f"ver_cat_{cat}"):
+                                st.session_state[f"cat_abierta_{cat}"] = True
+                                st.rerun()
 
                 st.markdown("---")
                 with st.expander("🖨️ Generar Etiquetas Físicas (QR)"):
-                    st.write("Selecciona un reactivo para generar su Código QR.")
-                    item_qr = st.selectbox("Reactivo para Etiqueta:", df['nombre'].tolist())
-                    if st.button("Generar Código QR"):
-                        qr_img_bytes = generar_qr(item_qr)
-                        st.image(qr_img_bytes, caption=f"Código QR para: {item_qr}", width=200)
-                        st.download_button(label="Descargar Imagen QR", data=qr_img_bytes, file_name=f"QR_{item_qr}.png", mime="image/png")
+                    modo_qr = st.radio("Modo:", ["Un reactivo", "Hoja de etiquetas (PDF)"], horizontal=True)
+                    if modo_qr == "Un reactivo":
+                        st.write("Selecciona un reactivo para generar su Código QR.")
+                        item_qr = st.selectbox("Reactivo para Etiqueta:", df['nombre'].tolist())
+                        if st.button("Generar Código QR"):
+                            qr_img_bytes = generar_qr(item_qr)
+                            st.image(qr_img_bytes, caption=f"Código QR para: {item_qr}", width=200)
+                            st.download_button(label="Descargar Imagen QR", data=qr_img_bytes, file_name=f"QR_{item_qr}.png", mime="image/png")
+                    else:
+                        st.write(f"Hoja A4 de {COLUMNAS * FILAS} etiquetas por página con QR, nombre, ubicación y caja.")
+                        alcance_qr = st.radio("Reactivos:", ["Resultado de la búsqueda", "Inventario completo"], horizontal=True)
+                        base_qr = df_show if alcance_qr == "Resultado de la búsqueda" else df
+                        cats_qr = st.multiselect("Filtrar por categoría (opcional):", sorted(base_qr['categoria'].dropna().astype(str).str.strip().unique()))
+                        sel_qr = base_qr[base_qr['categoria'].astype(str).str.strip().isin(cats_qr)] if cats_qr else base_qr
+                        sel_qr = sel_qr.sort_values(['ubicacion', 'posicion_caja', 'nombre'], key=lambda col: col.astype(str).str.lower())
+                        st.caption(f"{len(sel_qr)} etiquetas · {-(-len(sel_qr) // (COLUMNAS * FILAS))} páginas")
+                        if st.button("Generar Hoja de Etiquetas", disabled=sel_qr.empty):
+                            with st.spinner("Dibujando etiquetas..."):
+                                with tel.span("pdf", "hoja_etiquetas"): pdf_etiquetas, nuevos_qr = generar_hoja_etiquetas(sel_qr)
+                            st.success(f"Listo: {len(sel_qr)} etiquetas ({nuevos_qr} QR nuevos, el resto desde caché).")
+                            st.download_button(label="📥 Descargar Etiquetas PDF", data=pdf_etiquetas, file_name=f"Etiquetas_{date.today()}.pdf", mime="application/pdf")
 
         with subtab_edit:
             st.markdown("### ✍️ Base de Datos Maestra")
@@ -481,27 +574,8 @@ with col_mon:
                 )
                 
                 if st.button("💾 Guardar Cambios en BD", type="primary"):
-                    for _, row in edited_df.iterrows():
-                        d = row.replace({np.nan: None, pd.NaT: None}).to_dict()
-                        if 'id' in d and str(d['id']).strip() and d['id'] is not None: 
-                            d['lab_id'] = lab_id 
-                            
-                            for num_col in ['cantidad_actual', 'umbral_minimo', 'precio']:
-                                if num_col in d:
-                                    try: d[num_col] = float(d[num_col]) if d[num_col] not in [None, "", "nan", "None"] else 0.0
-                                    except: d[num_col] = 0.0
-                                        
-                            for date_col in ['fecha_vencimiento', 'fecha_cotizacion']:
-                                if date_col in d and str(d[date_col]).strip() in ["", "nan", "NaT", "None"]:
-                                    d[date_col] = None 
-                                    
-                            for str_col in ['categoria', 'ubicacion', 'posicion_caja', 'unidad']:
-                                if str_col in d and str(d[str_col]).strip() in ["nan", "None"]:
-                                    d[str_col] = ""
-
-                            supabase.table("items").upsert(d).execute()
-                    st.success("Inventario actualizado correctamente.")
-                    st.rerun()
+                    guardar_editor("items", df[cols_edit], edited_df, limpiar_item)
+                mostrar_aviso("items")
 
             if rol_actual == "admin" and not df.empty:
                 st.markdown("---")
@@ -522,8 +596,9 @@ with col_mon:
                             enviar_correo_compras(item_compra, precio_ref, usuario_actual)
                             st.session_state.confirmar_compra = None
                             st.rerun()
+                    mostrar_estado_correos(1)
 
-    with tab_bitacora:
+    with tab_bitacora, tel.seccion("Bitácora"):
         st.markdown("### 📔 Cuaderno de Laboratorio")
         
         c_filt, c_btn = st.columns([2, 1])
@@ -543,32 +618,34 @@ with col_mon:
                         "link_adjunto": link_evidencia,
                         "resultado": ""
                     }).execute()
+                    invalidar("bitacora")
                     st.rerun()
                 else: st.warning("No puedes guardar una hoja en blanco.")
                     
         st.markdown("<br>", unsafe_allow_html=True)
         
-        if df_bitacora.empty: 
+        # Paginación keyset: cada página se pide a Supabase ya filtrada y se cachea por cursor
+        usuario_filtro = None if filtro_usuario == "Todos" else filtro_usuario
+        if st.session_state.get('bitacora_filtro', "") != usuario_filtro:
+            st.session_state.bitacora_filtro = usuario_filtro
+            st.session_state.bitacora_paginas = 1
+        paginas_b, cursor_b = [], None
+        for _ in range(st.session_state.get('bitacora_paginas', 1)):
+            df_pag, cursor_b = cargar_pagina_bitacora(lab_id, versiones.version(lab_id, "bitacora"), usuario_filtro, cursor_b)
+            paginas_b.append(df_pag)
+            if cursor_b is None: break
+        df_b_show = pd.concat(paginas_b, ignore_index=True)
+        
+        if df_b_show.empty: 
             st.info("El cuaderno está vacío. ¡Escribe o háblale a la IA!")
         else:
-            df_b_show = df_bitacora if filtro_usuario == "Todos" else df_bitacora[df_bitacora['usuario'] == filtro_usuario]
-            chile_tz = pytz.timezone('America/Santiago')
-            
             st.markdown("<div style='font-family: \"Inter\", sans-serif; max-width: 850px;'>", unsafe_allow_html=True)
             
+            try: consumos_por_entrada = consumos_bitacora_lab(lab_id, versiones.version(lab_id, "bitacora"), tuple(df_b_show['id'].astype(str))).groupby('bitacora_id').size()
+            except Exception: consumos_por_entrada = pd.Series(dtype=int)
             for _, row in df_b_show.iterrows():
                 fecha_str = row.get('fecha', '')
-                hora_str = ""
-                
-                if 'created_at' in row and pd.notna(row['created_at']) and str(row['created_at']).strip():
-                    try:
-                        dt_obj = pd.to_datetime(row['created_at'])
-                        if dt_obj.tzinfo is None:
-                            dt_obj = dt_obj.tz_localize('UTC') 
-                        dt_local = dt_obj.tz_convert(chile_tz)
-                        hora_str = dt_local.strftime('%H:%M')
-                    except Exception as e: 
-                        pass
+                hora_str = row['hora_local']
                 
                 contenido_esc = html_lib.escape(str(row.get('contenido', '')).strip())
                 res_ia = str(row.get('resultado', '')).strip()
@@ -597,43 +674,21 @@ with col_mon:
                 
                 with col_del:
                     st.markdown("<div style='margin-top: 5px;'></div>", unsafe_allow_html=True)
-                    if st.button("🗑️", key=f"del_{row['id']}", help="Eliminar nota y restaurar reactivos"):
-                        res_ia_str = str(row.get('resultado', ''))
-                        
-                        # Extrae usando el data-id oficial HTML
-                        pattern_new = r"📉\s*([0-9.]+).*?data-id='([^']+)'"
-                        matches_new = re.findall(pattern_new, res_ia_str)
-                        
-                        for m in matches_new:
-                            cant_revertir = float(m[0])
-                            item_id = m[1].strip()
-                            
-                            res_item = supabase.table("items").select("id, cantidad_actual, nombre").eq("id", item_id).execute()
-                            if res_item.data:
-                                stock_actual = float(res_item.data[0]['cantidad_actual'])
-                                stock_nuevo = stock_actual + cant_revertir
-                                nombre_real = res_item.data[0]['nombre']
-                                
-                                val_stock = int(stock_nuevo) if stock_nuevo.is_integer() else stock_nuevo
-                                val_cambio = int(cant_revertir) if cant_revertir.is_integer() else cant_revertir
-                                
-                                supabase.table("items").update({"cantidad_actual": val_stock}).eq("id", item_id).execute()
-                                supabase.table("movimiento").insert({
-                                    "item_id": item_id, 
-                                    "nombre_item": nombre_real, 
-                                    "cantidad_cambio": val_cambio, 
-                                    "tipo": "Reversión (Borrado de Bitácora)", 
-                                    "usuario": usuario_actual, 
-                                    "lab_id": lab_id
-                                }).execute()
-                                
-                        supabase.table("bitacora").delete().eq("id", row['id']).execute()
-                        st.rerun()
+                    n_consumos = int(consumos_por_entrada.get(str(row['id']), 0))
+                    if st.button("🗑️", key=f"del_{row['id']}", help=f"Eliminar nota y restaurar {n_consumos} reactivo(s)" if n_consumos else "Eliminar nota"):
+                        try:
+                            revertir_entrada_bitacora(supabase, lab_id, usuario_actual, row['id'])
+                            invalidar("bitacora", "items", "movimiento")
+                            st.rerun()
+                        except Exception as e: st.error(f"No se pudo borrar la entrada: {e}")
                 
                 st.markdown("<hr style='margin: 10px 0; border: 0; border-top: 1px dashed #eee;'>", unsafe_allow_html=True)
             st.markdown("</div>", unsafe_allow_html=True)
+            if cursor_b is not None and st.button("⬇️ Cargar entradas anteriores", use_container_width=True):
+                st.session_state.bitacora_paginas = st.session_state.get('bitacora_paginas', 1) + 1
+                st.rerun()
 
-    with tab_prot:
+    with tab_prot, tel.seccion("Protocolos"):
         tab_lista, tab_crear = st.tabs(["📋 Mis Protocolos (Editar)", "📝 Nuevo Protocolo"])
         with tab_lista:
             if df_prot.empty: st.info("No hay protocolos creados.")
@@ -645,22 +700,20 @@ with col_mon:
                     column_config={"id": st.column_config.TextColumn("ID", disabled=True), "nombre": "Nombre del Protocolo", "materiales_base": "Receta Libre (Ej: Usa 2 ml de DMEM...)"}, 
                     use_container_width=True, hide_index=True)
                 if st.button("💾 Guardar Cambios en Protocolos", type="secondary"):
-                    for _, row in edited_p_df.iterrows():
-                        d = row.replace({np.nan: None}).to_dict()
-                        if 'id' in d and str(d['id']).strip(): 
-                            d['lab_id'] = lab_id 
-                            supabase.table("protocolos").upsert(d).execute()
-                    st.rerun()
+                    patron_items = patron_nombres(df)
+                    guardar_editor("protocolos", df_prot[cols_ed_p], edited_p_df, lambda d, _: {**d, "materiales_parseados": parsear_receta(d.get('materiales_base'), df, patron_items)})
+                mostrar_aviso("protocolos")
                     
         with tab_crear:
             with st.form("form_nuevo_prot"):
                 n_prot = st.text_input("Nombre (Ej: Ensayo DNAzimas)")
                 mat_base = st.text_area("Receta (Escribe libremente, ej: 'Usa 2 ml de DMEM y 1 placa')")
                 if st.form_submit_button("💾 Guardar"):
-                    supabase.table("protocolos").insert({"nombre": n_prot, "materiales_base": mat_base, "lab_id": lab_id}).execute()
+                    supabase.table("protocolos").insert({"nombre": n_prot, "materiales_base": mat_base, "materiales_parseados": parsear_receta(mat_base, df), "lab_id": lab_id}).execute()
+                    invalidar("protocolos")
                     st.rerun()
                     
-    with tab_equipos:
+    with tab_equipos, tel.seccion("Equipos"):
         st.markdown("### 🗓️ Gestión y Booking de Equipos")
         opciones_eq = ["📅 Agendar", "📊 Calendario"]
         if rol_actual == "admin": opciones_eq.append("⚙️ Mis Equipos")
@@ -684,8 +737,10 @@ with col_mon:
                     calendar_events.append({"title": f"{nom_eq} ({row['usuario']})", "start": t_ini.isoformat(), "end": t_fin.isoformat(), "color": color_map.get(nom_eq, "#4285F4")})
                 
                 calendar_options = {"headerToolbar": {"left": "prev,next today", "center": "title", "right": "timeGridDay,timeGridWeek,dayGridMonth"}, "initialView": "timeGridWeek", "slotMinTime": "07:00:00", "slotMaxTime": "22:00:00", "allDaySlot": False, "height": 600}
-                try: calendar(events=calendar_events, options=calendar_options, key="lab_calendar_view")
-                except NameError: st.warning("Por favor, asegúrate de haber instalado 'streamlit-calendar' en tus requerimientos.")
+                try:
+                    from streamlit_calendar import calendar
+                    calendar(events=calendar_events, options=calendar_options, key="lab_calendar_view")
+                except ImportError: st.warning("Por favor, asegúrate de haber instalado 'streamlit-calendar' en tus requerimientos.")
             else: st.info("La agenda del laboratorio está completamente libre.")
 
         elif modo_eq == "📅 Agendar":
@@ -697,39 +752,56 @@ with col_mon:
                     datos_eq = df_equipos[df_equipos['nombre'] == eq_seleccionado].iloc[0]
                     st.caption(f"👀 Visibilidad: **{datos_eq.get('visibilidad', 'Privado')}**")
                     
+                    indice_res = indice_reservas_lab(lab_id, versiones.version(lab_id, "reservas"))
+                    
                     fecha_res = st.date_input("Fecha de reserva:")
                     col_h1, col_h2 = st.columns(2)
                     with col_h1: t_ini = st.time_input("Hora Inicio:", value=time(9, 0))
                     with col_h2: t_fin = st.time_input("Hora Fin:", value=time(10, 0))
+                    col_r1, col_r2 = st.columns(2)
+                    with col_r1: frecuencia = st.selectbox("Repetir:", list(FRECUENCIAS))
+                    with col_r2: repeticiones = st.number_input("Nº de sesiones:", min_value=1, max_value=52, value=4, disabled=FRECUENCIAS[frecuencia] is None)
+                    
+                    with st.popover("🔎 Buscar próximo hueco libre"):
+                        horas_hueco = st.number_input("Duración (horas):", min_value=0.5, max_value=15.0, value=2.0, step=0.5)
+                        # El cuerpo del popover corre en cada rerun aunque esté cerrado: sólo se busca al pedirlo
+                        if st.button("Buscar", key="buscar_hueco", use_container_width=True):
+                            st.session_state.hueco_libre = (str(datos_eq['id']), horas_hueco, indice_res.proximo_libre(datos_eq['id'], timedelta(hours=horas_hueco), max(datetime.combine(fecha_res, t_ini), datetime.now())))
+                        busqueda_hueco = st.session_state.get('hueco_libre')
+                        if busqueda_hueco and busqueda_hueco[:2] == (str(datos_eq['id']), horas_hueco):
+                            hueco = busqueda_hueco[2]
+                            if hueco: st.success(f"Libre desde el {hueco.strftime('%d/%m/%Y %H:%M')} hasta las {(hueco + timedelta(hours=horas_hueco)).strftime('%H:%M')}")
+                            else: st.warning("No hay huecos libres en los próximos 60 días.")
                     
                     if st.button("Confirmar Reserva", type="primary", use_container_width=True):
                         dt_ini = datetime.combine(fecha_res, t_ini)
                         dt_fin = datetime.combine(fecha_res, t_fin)
                         if dt_ini >= dt_fin: st.error("La hora de inicio debe ser anterior.")
                         else:
-                            solapamiento = False
-                            if not df_reservas.empty:
-                                df_r_eq = df_reservas[df_reservas['equipo_id'] == str(datos_eq['id'])].copy()
-                                if not df_r_eq.empty:
-                                    df_r_eq['fecha_inicio'] = pd.to_datetime(df_r_eq['fecha_inicio']).apply(lambda x: x.tz_localize(None) if x.tzinfo else x)
-                                    df_r_eq['fecha_fin'] = pd.to_datetime(df_r_eq['fecha_fin']).apply(lambda x: x.tz_localize(None) if x.tzinfo else x)
-                                    for _, r in df_r_eq.iterrows():
-                                        if dt_ini < r['fecha_fin'] and dt_fin > r['fecha_inicio']: solapamiento = True; break
-                            if solapamiento: st.error("❌ El horario choca con otra reserva.")
+                            sesiones = ocurrencias(dt_ini, dt_fin, frecuencia, repeticiones)
+                            # Aviso rápido con el índice local y confirmación con Supabase sólo en la ventana pedida
+                            choques = [s for s in sesiones if indice_res.choca(datos_eq['id'], *s)]
+                            if not choques:
+                                indice_ventana = IndiceReservas(pd.DataFrame(reservas_en_ventana(supabase, datos_eq['id'], sesiones[0][0], sesiones[-1][1]), columns=["id", "fecha_inicio", "fecha_fin", "usuario"]).assign(equipo_id=str(datos_eq['id'])))
+                                choques = [s for s in sesiones if indice_ventana.choca(datos_eq['id'], *s)]
+                            if choques: st.error(f"❌ El horario choca con otra reserva ({', '.join(c[0].strftime('%d/%m %H:%M') for c in choques[:5])}).")
                             else:
                                 try:
-                                    supabase.table("reservas").insert({"equipo_id": str(datos_eq['id']), "usuario": usuario_actual, "fecha_inicio": dt_ini.isoformat(), "fecha_fin": dt_fin.isoformat(), "lab_id": lab_id}).execute()
+                                    supabase.table("reservas").insert([{"equipo_id": str(datos_eq['id']), "usuario": usuario_actual, "fecha_inicio": a.isoformat(), "fecha_fin": b.isoformat(), "lab_id": lab_id} for a, b in sesiones]).execute()
+                                    invalidar("reservas")
                                     admin_email = obtener_admin_email(lab_id)
-                                    enviar_correo_reserva(datos_eq['nombre'], fecha_res.strftime('%d/%m/%Y'), t_ini.strftime('%H:%M'), t_fin.strftime('%H:%M'), usuario_actual, admin_email, st.session_state.usuario_autenticado)
+                                    fecha_txt = fecha_res.strftime('%d/%m/%Y') + (f" ({frecuencia.lower()}, {len(sesiones)} sesiones)" if len(sesiones) > 1 else "")
+                                    enviar_correo_reserva(datos_eq['nombre'], fecha_txt, t_ini.strftime('%H:%M'), t_fin.strftime('%H:%M'), usuario_actual, admin_email, st.session_state.usuario_autenticado)
                                     st.success("✅ Reserva guardada.")
                                     st.rerun()
-                                except Exception as e: st.error(f"Error al reservar: {e}")
+                                except Exception as e:
+                                    if es_error_solape(e): invalidar("reservas"); st.error("❌ Alguien acaba de reservar ese horario. Intenta con otro.")
+                                    else: st.error(f"Error al reservar: {e}")
             with c_eq_agenda:
+                mostrar_estado_correos(2)
                 st.write("**Tus Próximas Reservas:**")
                 if not df_reservas.empty and not df_equipos.empty:
-                    df_r = pd.merge(df_reservas, df_equipos[['id', 'nombre']], left_on='equipo_id', right_on='id', how='inner', suffixes=('', '_eq'))
-                    df_r['fecha_inicio'] = pd.to_datetime(df_r['fecha_inicio']).apply(lambda x: x.tz_localize(None) if x.tzinfo else x)
-                    df_r['fecha_fin'] = pd.to_datetime(df_r['fecha_fin']).apply(lambda x: x.tz_localize(None) if x.tzinfo else x)
+                    df_r = pd.merge(normalizar_reservas(df_reservas), df_equipos[['id', 'nombre']].astype({'id': str}), left_on='equipo_id', right_on='id', how='inner', suffixes=('', '_eq'))
                     df_futuras = df_r[(df_r['fecha_fin'] >= pd.to_datetime('today').tz_localize(None)) & (df_r['usuario'] == usuario_actual)].sort_values(by='fecha_inicio')
                     if df_futuras.empty: st.info("No tienes reservas activas.")
                     else:
@@ -746,12 +818,8 @@ with col_mon:
                 cols_ed_eq = ['nombre', 'descripcion', 'visibilidad', 'requisitos', 'id']
                 edited_eq_df = st.data_editor(df_equipos[cols_ed_eq].copy(), column_config={"id": st.column_config.TextColumn("ID", disabled=True), "visibilidad": st.column_config.SelectboxColumn("Visibilidad", options=["Solo mi Laboratorio", "Mi Instituto", "Toda la Sede", "Público General"])}, use_container_width=True, hide_index=True)
                 if st.button("💾 Guardar Cambios en Equipos", type="secondary"):
-                    for _, row in edited_eq_df.iterrows():
-                        d = row.replace({np.nan: None}).to_dict()
-                        if 'id' in d and str(d['id']).strip(): 
-                            d['lab_id'] = lab_id 
-                            supabase.table("equipos_lab").upsert(d).execute()
-                    st.rerun()
+                    guardar_editor("equipos_lab", df_equipos[cols_ed_eq], edited_eq_df)
+                mostrar_aviso("equipos_lab")
             st.markdown("---")
             with st.expander("➕ Registrar Nuevo Equipo", expanded=df_equipos.empty):
                 with st.form("form_nuevo_equipo"):
@@ -762,88 +830,93 @@ with col_mon:
                     if st.form_submit_button("Crear Equipo", type="primary"):
                         try:
                             supabase.table("equipos_lab").insert({"nombre": n_eq, "descripcion": d_eq, "visibilidad": v_eq, "requisitos": req_eq, "lab_id": lab_id}).execute()
+                            invalidar("equipos_lab")
                             st.success("Equipo registrado.")
                             st.rerun()
                         except Exception as e: st.error(f"Error: {e}")
 
     if rol_actual == "admin":
-        with tab_analisis:
+        with tab_analisis, tel.seccion("Analítica"):
             st.markdown("### 📈 Predicción de Consumo (Burn Rate)")
+            c_ventana, c_recalc = st.columns([4, 1])
+            dias_br = c_ventana.radio("Ventana de consumo:", VENTANAS_DIAS, index=VENTANAS_DIAS.index(30), format_func=lambda d: f"{d} días", horizontal=True)
+            recalcular_br = c_recalc.button("🔄 Recalcular", use_container_width=True, help="Incluye los movimientos registrados desde otras sesiones.")
             with st.spinner("Analizando..."):
-                res_mov = supabase.table("movimiento").select("*").eq("lab_id", lab_id).execute()
-                df_mov = pd.DataFrame(res_mov.data)
-                
-                if not df_mov.empty and not df.empty:
-                    df_mov['created_at'] = pd.to_datetime(df_mov['created_at']).dt.tz_localize(None)
-                    df_consumos = df_mov[df_mov['cantidad_cambio'] < 0].copy()
-                    df_consumos['cantidad_cambio'] = df_consumos['cantidad_cambio'].abs()
-                    hace_30_dias = pd.to_datetime(date.today()) - timedelta(days=30)
-                    df_ultimos_30 = df_consumos[df_consumos['created_at'] >= hace_30_dias]
-                    
-                    if not df_ultimos_30.empty:
-                        resumen = df_ultimos_30.groupby('nombre_item')['cantidad_cambio'].sum().reset_index()
-                        resumen = resumen.rename(columns={'cantidad_cambio': 'consumo_30d'})
-                        df_pred = pd.merge(df[['nombre', 'cantidad_actual', 'unidad']], resumen, left_on='nombre', right_on='nombre_item', how='inner')
-                        df_pred['tasa_diaria'] = df_pred['consumo_30d'] / 30
-                        df_pred['dias_restantes'] = np.where(df_pred['tasa_diaria'] > 0, df_pred['cantidad_actual'] / df_pred['tasa_diaria'], 9999)
-                        df_pred['dias_restantes_num'] = df_pred['dias_restantes']
-                        df_pred['dias_restantes'] = df_pred['dias_restantes'].apply(lambda x: "🚨 Se agota hoy/mañana" if x <= 1.5 else f"Aprox {int(x)} días")
-                        
-                        df_pred['tasa_diaria'] = df_pred['tasa_diaria'].apply(lambda x: f"{x:g}" if pd.notnull(x) else "")
-                        df_pred['cantidad_actual'] = df_pred['cantidad_actual'].apply(lambda x: f"{x:g}" if pd.notnull(x) else "")
-                        df_pred['consumo_30d'] = df_pred['consumo_30d'].apply(lambda x: f"{x:g}" if pd.notnull(x) else "")
-                        
-                        df_mostrar = df_pred.sort_values(by='dias_restantes_num', ascending=True)[['nombre', 'cantidad_actual', 'unidad', 'consumo_30d', 'tasa_diaria', 'dias_restantes']]
-                        st.dataframe(df_mostrar, use_container_width=True, hide_index=True)
-                    else: st.info("Aún no hay suficientes retiros para proyectar matemáticas.")
-                else: st.info("Registra movimientos para que la IA aprenda el consumo.")
+                if df.empty: st.info("Registra movimientos para que la IA aprenda el consumo.")
+                else:
+                    try: df_pred = burn_rate_lab(lab_id, refrescar_consumo_lab(recalcular_br), versiones.version(lab_id, "items"), date.today().isoformat(), dias_br)
+                    except Exception as e: df_pred = None; st.error(f"No se pudo leer el rollup de consumo: {e}")
+                    if df_pred is not None and not df_pred.empty:
+                        df_mostrar = df_pred[['nombre', 'cantidad_actual', 'unidad', 'consumo', 'tasa_diaria']].copy()
+                        df_mostrar['dias_restantes'] = np.where(df_pred['dias_restantes_num'] <= 1.5, "🚨 Se agota hoy/mañana", "Aprox " + df_pred['dias_restantes_num'].astype(int).astype(str) + " días")
+                        for col in ['cantidad_actual', 'consumo', 'tasa_diaria']: df_mostrar[col] = df_mostrar[col].map(lambda x: f"{x:g}")
+                        st.dataframe(df_mostrar.rename(columns={'consumo': f'consumo_{dias_br}d'}), use_container_width=True, hide_index=True)
+                    elif df_pred is not None: st.info("Aún no hay suficientes retiros para proyectar matemáticas.")
 
             st.markdown("---")
             st.markdown("### 💰 Costeo y Simulación de Protocolos")
             if df_prot.empty: st.info("Sin protocolos para evaluar.")
             else:
+                bom = bom_lab(lab_id, versiones.version(lab_id, "protocolos"), versiones.version(lab_id, "items"))
                 p_sel = st.selectbox("Seleccionar protocolo para evaluar costo:", df_prot['nombre'].tolist())
                 n_muestras = st.number_input("Cantidad de Muestras proyectadas:", min_value=1, value=1)
                 
                 if st.button("🔍 Calcular Impacto Financiero", type="secondary"):
-                    info_p = df_prot[df_prot['nombre'] == p_sel]['materiales_base'].values[0]
-                    descuentos = []
-                    costo_total_exp = 0
-                    
-                    for linea in info_p.split('\n'):
-                        if "," in linea or ":" in linea or "de" in linea:
-                            partes = re.split(r'[,:]', linea)
-                            for p in partes:
-                                match_num = re.search(r'[\d.]+', p)
-                                if match_num:
-                                    cant_base = float(match_num.group())
-                                    cant_total = cant_base * n_muestras
-                                    for idx, row_item in df.iterrows():
-                                        if row_item['nombre'].lower() in p.lower():
-                                            if row_item['precio'] > 0 and row_item['cantidad_actual'] > 0:
-                                                costo_item = (cant_total / row_item['cantidad_actual']) * row_item['precio']
-                                                costo_total_exp += costo_item
-                                            descuentos.append({"Reactivo": row_item['nombre'], "Stock": row_item['cantidad_actual'], "Requerido": cant_total, "Unidad": row_item['unidad']})
-                                            break
-                                            
-                    if descuentos:
-                        st.dataframe(pd.DataFrame(descuentos), hide_index=True)
+                    df_det = detalle_protocolo(bom, df, p_sel, n_muestras)
+                    if not df_det.empty:
+                        st.dataframe(df_det, hide_index=True)
+                        costo_total_exp = df_det['Costo'].sum()
                         if costo_total_exp > 0: 
                             st.markdown(f"<div class='badge-costo'>💰 Presupuesto estimado: ${int(costo_total_exp):,} CLP</div>", unsafe_allow_html=True)
                         else:
                             st.info("No hay precios registrados para los reactivos de este protocolo. Agrégalos en Edición Masiva.")
 
+                with st.expander("📊 Barrido de presupuesto (varios protocolos × muestras)"):
+                    prots_sim = st.multiselect("Protocolos:", bom.index.tolist(), default=bom.index.tolist())
+                    muestras_txt = st.text_input("Cantidades de muestras (separadas por coma):", value="1, 24, 96")
+                    muestras_sim = sorted({int(m) for m in re.findall(r'\d+', muestras_txt) if int(m) > 0})
+                    if prots_sim and muestras_sim:
+                        df_sim = simular_costos(bom.loc[prots_sim], df, muestras_sim)
+                        df_sim.loc["TOTAL"] = df_sim.sum()
+                        st.dataframe(df_sim.rename(columns=lambda m: f"{m} muestras").style.format(lambda x: f"${int(x):,}"), use_container_width=True)
+
             st.markdown("---")
             st.markdown("### 📄 Generador de Reportes (ISO/GLP)")
             st.write("Descarga un PDF inmutable con la foto actual de tu inventario.")
+            from reportes import AGRUPACIONES
+            agrupar_pdf = st.radio("Agrupar:", list(AGRUPACIONES), horizontal=True)
             if st.button("Generar Reporte PDF", type="secondary"):
                 if not df.empty:
-                    pdf_bytes = generar_pdf_inventario(df, st.session_state.nombre_usuario)
+                    with st.spinner("Armando el reporte..."):
+                        pdf_bytes = reporte_pdf_lab(lab_id, versiones.version(lab_id, "items"), AGRUPACIONES[agrupar_pdf], st.session_state.nombre_usuario, str(date.today()))
                     st.success("PDF generado exitosamente.")
                     st.download_button(label="📥 Descargar Reporte Físico", data=pdf_bytes, file_name=f"Reporte_Inventario_{date.today()}.pdf", mime="application/pdf")
                 else: st.warning("El inventario está vacío.")
 
-        with tab_usuarios:
+        with tab_rendimiento:
+            st.markdown("### ⏱️ Latencias del Laboratorio")
+            st.caption("Tiempos de Supabase, Gemini, correo, PDF y secciones de la interfaz desde que arrancó el servidor (últimas muestras por operación).")
+            filas_tel = tel.resumen(lab_id)
+            if not filas_tel: st.info("Aún no hay mediciones.")
+            else:
+                df_tel = pd.DataFrame(filas_tel).drop(columns=["lab"])
+                tipos_tel = st.multiselect("Tipo:", sorted(df_tel['tipo'].unique()), default=sorted(df_tel['tipo'].unique()))
+                df_tel = df_tel[df_tel['tipo'].isin(tipos_tel)].sort_values("p95_ms", ascending=False)
+                st.dataframe(df_tel.drop(columns=["histograma"]), hide_index=True, use_container_width=True,
+                             column_config={"pestana": "Pestaña", "p50_ms": st.column_config.NumberColumn("p50 (ms)"), "p95_ms": st.column_config.NumberColumn("p95 (ms)"), "max_ms": st.column_config.NumberColumn("Máx (ms)")})
+                if not df_tel.empty:
+                    etiquetas_tel = (df_tel['pestana'] + " · " + df_tel['tipo'] + " · " + df_tel['nombre']).tolist()
+                    op_tel = st.selectbox("Histograma de:", range(len(etiquetas_tel)), format_func=lambda i: etiquetas_tel[i])
+                    st.dataframe(pd.DataFrame([df_tel.iloc[op_tel]['histograma']]), hide_index=True, use_container_width=True)
+                lentos_tel = tel.lentos(lab_id)
+                if lentos_tel:
+                    st.markdown(f"**🐢 Operaciones lentas ({len(lentos_tel)}):**")
+                    st.dataframe(pd.DataFrame(lentos_tel[::-1]).drop(columns=["lab"]), hide_index=True, use_container_width=True)
+                c_json, c_csv = st.columns(2)
+                c_json.download_button("📥 Exportar JSON", tel.exportar_json(lab_id), file_name=f"latencias_{date.today()}.json", mime="application/json", use_container_width=True)
+                c_csv.download_button("📥 Exportar CSV", tel.exportar_csv(lab_id), file_name=f"latencias_{date.today()}.csv", mime="text/csv", use_container_width=True)
+
+        with tab_usuarios, tel.seccion("Usuarios"):
             st.markdown("### 🤝 Gestión de Accesos")
             with st.container(border=True):
                 nuevo_email = st.text_input("Correo a invitar:").strip().lower()
@@ -854,6 +927,7 @@ with col_mon:
                             res_check = supabase.table("equipo").select("*").eq("email", nuevo_email).execute()
                             if res_check.data: supabase.table("equipo").update({"lab_id": lab_id, "rol": rol_nuevo}).eq("email", nuevo_email).execute()
                             else: supabase.table("equipo").insert({"email": nuevo_email, "lab_id": lab_id, "rol": rol_nuevo, "nombre": "Invitado"}).execute()
+                            invalidar("equipo")
                             st.success(f"Acceso otorgado a {nuevo_email}.")
                             st.rerun() 
                         except Exception as e: st.error(f"❌ Error exacto al guardar en BD: {e}")
@@ -864,7 +938,7 @@ with col_mon:
             except Exception as e: st.error(f"❌ Error al cargar la lista: {e}")
 
 # --- PANEL IA ORQUESTADOR CON LECTOR NATURAL Y MARCADORES INMORTALES ---
-with col_chat:
+with col_chat, tel.seccion("Secretario IA"):
     st.markdown("### 💬 Secretario IA")
     chat_box = st.container(height=400, border=False)
     
@@ -873,7 +947,13 @@ with col_chat:
     
     for m in st.session_state.messages:
         with chat_box: st.chat_message(m["role"]).markdown(m["content"])
+    if st.session_state.get('origen_ia', "🧠 Gemini") != "🧠 Gemini":
+        st.caption(f"Última respuesta: {st.session_state.origen_ia} (sin llamar a la IA)")
+    elif st.session_state.get('contexto_ia_stats'):
+        ctx = st.session_state.contexto_ia_stats
+        st.caption(f"🔍 Contexto IA: {ctx['items_enviados']}/{ctx['items_total']} reactivos, {ctx['protocolos_enviados']}/{ctx['protocolos_total']} protocolos · ~{ctx['tokens_enviados']:,} de ~{ctx['tokens_completo']:,} tokens")
 
+    from streamlit_mic_recorder import speech_to_text
     v_in = speech_to_text(language='es-CL', start_prompt="🎙️ Hablar", stop_prompt="⏹️ Enviar", just_once=True, key='voice_input')
     prompt = v_in if v_in else st.chat_input("Ej: Hoy hice un pasaje celular...")
 
@@ -883,8 +963,26 @@ with col_chat:
         if accion_foto == "🔄 Actualizar Reactivo" and not df.empty: item_a_actualizar = st.selectbox("Selecciona reactivo:", df['nombre'].tolist())
         foto_chat = st.camera_input("Capturar Imagen / Escanear QR", label_visibility="collapsed")
         
-        if foto_chat and st.button("🧠 Procesar Foto", type="primary", use_container_width=True):
-            img = Image.open(foto_chat).convert('RGB')
+        # Etiquetas propias (QR con el nombre del reactivo): se resuelven localmente, sin IA
+        item_qr_foto = None
+        if foto_chat and not df.empty:
+            texto_qr = leer_qr(foto_chat.getvalue())
+            if texto_qr and (df['nombre'] == texto_qr).any(): item_qr_foto = df[df['nombre'] == texto_qr].iloc[0]
+        
+        if item_qr_foto is not None:
+            st.session_state.auto_search = item_qr_foto['nombre']
+            st.success(f"🏷️ QR reconocido: **{item_qr_foto['nombre']}** · Stock actual: {item_qr_foto['cantidad_actual']:g} {item_qr_foto['unidad']}")
+            nueva_cant_qr = st.number_input("Nuevo stock:", min_value=0.0, value=float(item_qr_foto['cantidad_actual']), key=f"qr_cant_{item_qr_foto['id']}")
+            if st.button("✅ Actualizar Stock", type="primary", use_container_width=True):
+                ajustar_stock(supabase, lab_id, usuario_actual, [{"item_id": str(item_qr_foto['id']), "fijar": nueva_cant_qr, "tipo": "Actualizado (QR)"}])
+                invalidar("items", "movimiento")
+                st.session_state.messages.append({"role": "assistant", "content": f"🏷️ **Actualizado por QR:** {item_qr_foto['nombre']} ahora tiene {num_limpio(nueva_cant_qr)} en stock."})
+                st.rerun()
+        
+        elif foto_chat and st.button("🧠 Procesar Foto", type="primary", use_container_width=True):
+            from PIL import Image
+            img, bytes_ia = preparar_para_ia(Image.open(foto_chat))
+            st.caption(f"📦 Imagen enviada: {len(bytes_ia) / 1024:.0f} KB (original {len(foto_chat.getvalue()) / 1024:.0f} KB)")
             st.session_state.messages.append({"role": "user", "content": "📸 *Foto enviada.*"})
             with chat_box: st.chat_message("user").markdown("📸 *Foto enviada.*")
             with st.chat_message("assistant"):
@@ -892,7 +990,7 @@ with col_chat:
                     try:
                         if accion_foto == "➕ Agregar Reactivo Nuevo":
                             prompt_vision = "Extrae los datos de esta etiqueta química. Responde SOLO JSON: {\"nombre\": \"\", \"categoria\": \"\", \"cantidad_actual\": 0, \"unidad\": \"\"}"
-                            res_ai = model.generate_content([prompt_vision, img]).text
+                            res_ai = modelo_ia().generate_content([prompt_vision, img]).text
                             data = json.loads(re.search(r'\{.*\}', res_ai, re.DOTALL).group())
                             res_ins = supabase.table("items").insert({"nombre": data.get('nombre', 'Desconocido'), "cantidad_actual": data.get('cantidad_actual', 0), "unidad": data.get('unidad', 'unidades'), "categoria": data.get('categoria', 'GENERAL'), "lab_id": lab_id}).execute()
                             itm = res_ins.data[0]
@@ -901,68 +999,86 @@ with col_chat:
                         
                         elif accion_foto == "🔄 Actualizar Reactivo":
                             prompt_vision = f"Lee la etiqueta o el Código QR de esta imagen. Es del reactivo '{item_a_actualizar}'. Extrae la cantidad física que ves. Responde SOLO JSON: {{\"{item_a_actualizar}\": true, \"cantidad_actual\": 0}}"
-                            res_ai = model.generate_content([prompt_vision, img]).text
+                            res_ai = modelo_ia().generate_content([prompt_vision, img]).text
                             data = json.loads(re.search(r'\{.*\}', res_ai, re.DOTALL).group())
                             nueva_cant = data.get('cantidad_actual', 0)
                             id_ac = str(df[df['nombre'] == item_a_actualizar].iloc[0]['id'])
-                            supabase.table("items").update({"cantidad_actual": nueva_cant}).eq("id", id_ac).execute()
-                            supabase.table("movimiento").insert({"item_id": id_ac, "nombre_item": item_a_actualizar, "cantidad_cambio": nueva_cant, "tipo": "Actualizado IA (Foto/QR)", "usuario": usuario_actual, "lab_id": lab_id}).execute()
+                            ajustar_stock(supabase, lab_id, usuario_actual, [{"item_id": id_ac, "fijar": nueva_cant, "tipo": "Actualizado IA (Foto/QR)"}])
                             msg = f"📸 **Actualizado:** {item_a_actualizar} ahora tiene {nueva_cant} en stock."
 
+                        invalidar("items", "movimiento")
                         st.markdown(msg); st.session_state.messages.append({"role": "assistant", "content": msg}); st.rerun()
                     except Exception as e: st.error("Error al procesar la imagen.")
 
     if prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
         with chat_box: st.chat_message("user").markdown(prompt)
-        with st.chat_message("assistant"):
+        with chat_box, st.chat_message("assistant"):
+            salida_ia = st.empty()
             with st.spinner("Leyendo receta e inventario..."):
                 try:
-                    d_ia = df[['id', 'nombre', 'cantidad_actual']].to_json(orient='records') if not df.empty else "[]"
-                    d_prot = df_prot[['nombre', 'materiales_base']].to_json(orient='records') if not df_prot.empty else "[]"
-                    hoy_str = date.today().isoformat()
+                    # Atajos locales (respuestas cortas, protocolo exacto) y caché por sesión antes de llamar a Gemini
+                    v_items, v_prot = versiones.version(lab_id, "items"), versiones.version(lab_id, "protocolos")
+                    if 'cache_ia' not in st.session_state: st.session_state.cache_ia = CacheRespuestas()
+                    ultima_ia = next((m['content'] for m in reversed(st.session_state.messages[:-1]) if m['role'] == 'assistant'), "")
+                    clave_ia = clave_cache(prompt, ultima_ia, v_items, huella_catalogo_lab(lab_id, v_items), v_prot)
+                    data = resolver_local(prompt, df_prot, bom_lab(lab_id, v_prot, v_items), ultima_ia) if not df.empty else None
+                    st.session_state.origen_ia = "⚡ atajo local"
+                    if data is None: data = st.session_state.cache_ia.obtener(clave_ia); st.session_state.origen_ia = "♻️ caché"
                     
-                    historial_str = "\n".join([f"{'Usuario' if m['role']=='user' else 'IA'}: {m['content']}" for m in st.session_state.messages[-8:-1]])
+                    if data is None:
+                        # Sólo los items y protocolos relevantes para el mensaje y el historial reciente
+                        indice_ctx = indice_contexto_lab(lab_id, v_items, v_prot)
+                        historial_msgs = [m['content'] for m in st.session_state.messages[-8:-1]]
+                        df_ctx, df_prot_ctx = indice_ctx.seleccionar(prompt, historial_msgs)
+                        st.session_state.contexto_ia_stats = indice_ctx.estadisticas(df_ctx, df_prot_ctx)
+                        st.session_state.origen_ia = "🧠 Gemini"
+                        d_ia = df_ctx[['id', 'nombre', 'cantidad_actual']].to_json(orient='records') if not df_ctx.empty else "[]"
+                        d_prot = df_prot_ctx[['nombre', 'materiales_base']].to_json(orient='records') if not df_prot_ctx.empty else "[]"
+                        hoy_str = date.today().isoformat()
                     
-                    prompt_sistema = f"""
-                    Eres la Inteligencia Artificial del LIMS Stck. Hoy es {hoy_str}.
-                    Inventario Disponible (ID, Nombre, Stock): {d_ia}
-                    Protocolos: {d_prot}
-                    Historial: {historial_str}
-
-                    El usuario dice: "{prompt}"
-
-                    Devuelve ÚNICAMENTE un JSON con esta estructura:
-                    {{
-                        "respuesta_chat": "Si es un pasaje celular, confirma y pregunta SOLO: '¿Usaste alguna placa o frasco nuevo (sí/no)?'. Si ya responde a esa pregunta (ej 'no', 'usé 1'), responde 'Entendido y descontado.'",
-                        "entrada_cuaderno": "Copia EXACTAMENTE sus palabras (ej: 'Hoy hice pasaje...'). Si es una respuesta a tu pregunta (ej 'sí', 'no', '1 placa'), DEBE QUEDAR VACÍO.",
-                        "protocolo_detectado": {{"nombre": "Nombre EXACTO del protocolo", "muestras": 1}},
-                        "descuentos_protocolo": [{{"id_item": "ID_EXACTO_DEL_INVENTARIO", "cantidad_total_a_restar": 0.0}}],
-                        "descuentos_extra": [{{"id_item": "ID_EXACTO_DEL_INVENTARIO", "cantidad_a_restar": 0.0}}]
-                    }}
-
-                    REGLAS INFLEXIBLES:
-                    1. PRECISIÓN DE ID: Al aplicar un protocolo, lee su receta. Busca en el Inventario el reactivo correspondiente y extrae su "id". Si hay varios parecidos (ej: PBS vs D-PBS), elige el que MEJOR calce con la receta. ¡Usa siempre el ID, nunca el nombre!
-                    2. MULTIPLICACIÓN: Extrae el primer número de la receta, multiplícalo por las muestras y ponlo en 'cantidad_total_a_restar'.
-                    3. ANTI-BUCLES: Si el usuario responde 'no' o 'nada', "entrada_cuaderno" DEBE SER VACÍO, no ejecutes protocolos de nuevo.
-                    """
+                        historial_str = "\n".join([f"{'Usuario' if m['role']=='user' else 'IA'}: {m['content']}" for m in st.session_state.messages[-8:-1]])
                     
-                    res_ai = model.generate_content(prompt_sistema).text
-                    match = re.search(r'\{.*\}', res_ai, re.DOTALL)
+                        prompt_sistema = f"""
+                        Eres la Inteligencia Artificial del LIMS Stck. Hoy es {hoy_str}.
+                        Inventario Disponible (ID, Nombre, Stock): {d_ia}
+                        Protocolos: {d_prot}
+                        Historial: {historial_str}
+
+                        El usuario dice: "{prompt}"
+
+                        Devuelve ÚNICAMENTE un JSON con esta estructura:
+                        {{
+                            "respuesta_chat": "Si es un pasaje celular, confirma y pregunta SOLO: '¿Usaste alguna placa o frasco nuevo (sí/no)?'. Si ya responde a esa pregunta (ej 'no', 'usé 1'), responde 'Entendido y descontado.'",
+                            "entrada_cuaderno": "Copia EXACTAMENTE sus palabras (ej: 'Hoy hice pasaje...'). Si es una respuesta a tu pregunta (ej 'sí', 'no', '1 placa'), DEBE QUEDAR VACÍO.",
+                            "protocolo_detectado": {{"nombre": "Nombre EXACTO del protocolo", "muestras": 1}},
+                            "descuentos_protocolo": [{{"id_item": "ID_EXACTO_DEL_INVENTARIO", "cantidad_total_a_restar": 0.0}}],
+                            "descuentos_extra": [{{"id_item": "ID_EXACTO_DEL_INVENTARIO", "cantidad_a_restar": 0.0}}]
+                        }}
+
+                        REGLAS INFLEXIBLES:
+                        1. PRECISIÓN DE ID: Al aplicar un protocolo, lee su receta. Busca en el Inventario el reactivo correspondiente y extrae su "id". Si hay varios parecidos (ej: PBS vs D-PBS), elige el que MEJOR calce con la receta. ¡Usa siempre el ID, nunca el nombre!
+                        2. MULTIPLICACIÓN: Extrae el primer número de la receta, multiplícalo por las muestras y ponlo en 'cantidad_total_a_restar'.
+                        3. ANTI-BUCLES: Si el usuario responde 'no' o 'nada', "entrada_cuaderno" DEBE SER VACÍO, no ejecutes protocolos de nuevo.
+                        """
+                        
+                        # La respuesta_chat se muestra a medida que llegan los tokens; el JSON se parsea al final
+                        res_ai, data = generar_en_streaming(modelo_ia(), prompt_sistema, lambda parcial: salida_ia.markdown(parcial + " ▌"))
+                        if data is not None: st.session_state.cache_ia.guardar(clave_ia, data)
                     
-                    if match:
-                        data = json.loads(match.group())
+                    if data is not None:
                         log_ia_acciones = []
                         lista_descuentos = []
                         
-                        texto_minuscula = prompt.lower().strip()
-                        es_respuesta_corta = len(texto_minuscula.split()) <= 5 and any(w in texto_minuscula for w in ['no', 'nada', 'ninguno', 'ninguna', 'listo', 'ya', 'si', 'sí', 'ok'])
+                        es_respuesta_corta = es_respuesta_corta_ia(prompt)
                         if es_respuesta_corta:
                             data['entrada_cuaderno'] = ""
 
                         # 1. PROTOCOLOS (MATEMÁTICA PURA CON IDs)
                         p_dict = data.get('protocolo_detectado', {})
                         d_prot = data.get('descuentos_protocolo', [])
+                        ids_inv = set(df['id'].astype(str))
+                        lineas_ajuste = []
                         
                         if p_dict and p_dict.get('nombre') and not es_respuesta_corta:
                             p_nombre = p_dict.get('nombre')
@@ -974,24 +1090,8 @@ with col_chat:
                                 cant_total = desc.get('cantidad_total_a_restar', 0)
                                 
                                 if id_item and cant_total > 0:
-                                    item_db = df[df['id'].astype(str) == id_item]
-                                    if not item_db.empty:
-                                        stock_actual = float(item_db.iloc[0]['cantidad_actual'])
-                                        stock_nuevo = stock_actual - float(cant_total)
-                                        
-                                        val_stock = int(stock_nuevo) if float(stock_nuevo).is_integer() else float(stock_nuevo)
-                                        val_cambio = int(-cant_total) if float(-cant_total).is_integer() else float(-cant_total)
-                                        val_mostrar = int(cant_total) if float(cant_total).is_integer() else float(cant_total)
-                                        
-                                        unidad_item = item_db.iloc[0]['unidad']
-                                        nombre_real = item_db.iloc[0]['nombre']
-                                        
-                                        supabase.table("items").update({"cantidad_actual": val_stock}).eq("id", id_item).execute()
-                                        supabase.table("movimiento").insert({"item_id": id_item, "nombre_item": nombre_real, "cantidad_cambio": val_cambio, "tipo": f"Uso IA: {p_nombre}", "usuario": usuario_actual, "lab_id": lab_id}).execute()
-                                        
-                                        lista_descuentos.append(f"&nbsp;&nbsp;&nbsp; - 📉 {val_mostrar} {unidad_item} de {nombre_real} <span data-id='{id_item}' style='display:none'></span> <i>(Protocolo)</i>")
-                                    else:
-                                        lista_descuentos.append(f"&nbsp;&nbsp;&nbsp; - ⚠️ Error: ID '{id_item}' no hallado.")
+                                    if id_item in ids_inv: lineas_ajuste.append({"item_id": id_item, "delta": -float(cant_total), "tipo": f"Uso IA: {p_nombre}", "origen": "Protocolo"})
+                                    else: lista_descuentos.append(f"&nbsp;&nbsp;&nbsp; - ⚠️ Error: ID '{id_item}' no hallado.")
 
                         # 2. AJUSTES EXTRA (Placas, con IDs)
                         ajustes = data.get('descuentos_extra', [])
@@ -999,27 +1099,18 @@ with col_chat:
                             id_ac = str(aj.get('id_item', '')).strip()
                             cant_man = aj.get('cantidad_a_restar', 0)
                             
-                            if id_ac and float(cant_man) > 0:
-                                item_db = df[df['id'].astype(str) == id_ac]
-                                if not item_db.empty:
-                                    stock_actual = float(item_db.iloc[0]['cantidad_actual'])
-                                    stock_nuevo = stock_actual - float(cant_man)
-                                    
-                                    val_stock = int(stock_nuevo) if float(stock_nuevo).is_integer() else float(stock_nuevo)
-                                    val_cambio = int(-cant_man) if float(-cant_man).is_integer() else float(-cant_man)
-                                    val_mostrar = int(cant_man) if float(cant_man).is_integer() else float(cant_man)
-                                    
-                                    nombre_item = item_db.iloc[0]['nombre']
-                                    unidad_item = item_db.iloc[0]['unidad']
-                                    
-                                    supabase.table("items").update({"cantidad_actual": val_stock}).eq("id", id_ac).execute()
-                                    supabase.table("movimiento").insert({"item_id": id_ac, "nombre_item": nombre_item, "cantidad_cambio": val_cambio, "tipo": "Ajuste Conversacional IA", "usuario": usuario_actual, "lab_id": lab_id}).execute()
-                                    
-                                    if es_respuesta_corta:
-                                        st.session_state.messages.append({"role": "assistant", "content": f"✅ Descontado extra: -{val_mostrar} {unidad_item} de {nombre_item}"})
-                                        st.rerun()
-                                    else:
-                                        lista_descuentos.append(f"&nbsp;&nbsp;&nbsp; - 📉 {val_mostrar} {unidad_item} de {nombre_item} <span data-id='{id_ac}' style='display:none'></span> <i>(Extra)</i>")
+                            if id_ac and float(cant_man) > 0 and id_ac in ids_inv:
+                                lineas_ajuste.append({"item_id": id_ac, "delta": -float(cant_man), "tipo": "Ajuste Conversacional IA", "origen": "Extra"})
+
+                        # 3. RESUMEN DE DESCUENTOS
+                        hubo_escrituras = bool(lineas_ajuste)
+                        ajustes_rpc = [{k: l[k] for k in ("item_id", "delta", "tipo")} for l in lineas_ajuste]
+                        info_items = items_por_id(df)
+                        for l in lineas_ajuste:
+                            val_mostrar = num_limpio(-l['delta'])
+                            nombre_item, unidad_item = info_items.at[l['item_id'], 'nombre'], info_items.at[l['item_id'], 'unidad']
+                            if es_respuesta_corta: st.session_state.messages.append({"role": "assistant", "content": f"✅ Descontado extra: -{val_mostrar} {unidad_item} de {nombre_item}"})
+                            else: lista_descuentos.append(f"&nbsp;&nbsp;&nbsp; - 📉 {val_mostrar} {unidad_item} de {nombre_item} <i>({l['origen']})</i>")
 
                         # ENSAMBLAJE FINAL DEL HTML
                         if lista_descuentos:
@@ -1028,23 +1119,23 @@ with col_chat:
 
                         metadatos_ia = "<br>".join(log_ia_acciones)
 
-                        # 3. GUARDAR EN BITÁCORA
+                        # 4. ENTRADA + DESCUENTOS EN UNA SOLA TRANSACCIÓN (el consumo queda ligado a la entrada)
                         texto_cuaderno = data.get('entrada_cuaderno', "").strip()
                         if texto_cuaderno and not es_respuesta_corta:
-                            supabase.table("bitacora").insert({
-                                "lab_id": lab_id, 
-                                "usuario": usuario_actual, 
-                                "fecha": date.today().isoformat(),
-                                "contenido": texto_cuaderno,
-                                "resultado": metadatos_ia 
-                            }).execute()
-
-                        # 4. CHAT
+                            registrar_entrada_bitacora(supabase, lab_id, usuario_actual, texto_cuaderno, metadatos_ia, ajustes_rpc, date.today())
+                            invalidar("bitacora", "items", "movimiento")
+                            hubo_escrituras = True
+                        elif ajustes_rpc:
+                            ajustar_stock(supabase, lab_id, usuario_actual, ajustes_rpc)
+                            invalidar("items", "movimiento")
+                        if es_respuesta_corta and hubo_escrituras: st.rerun()
+
+                        # 5. CHAT (sólo se recarga la página si cambió el inventario o la bitácora)
                         msg_final = data.get('respuesta_chat', 'Entendido.')
-                        st.markdown(msg_final)
+                        salida_ia.markdown(msg_final)
                         st.session_state.messages.append({"role": "assistant", "content": msg_final})
-                        st.rerun()
+                        if hubo_escrituras: st.rerun()
 
                     else:
-                        st.markdown("Comando procesado.")
+                        salida_ia.markdown("Comando procesado.")
                 except Exception as e: st.error(f"Error IA: {e}")
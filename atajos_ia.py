@@ -0,0 +1,91 @@
+# --- ATAJOS DETERMINISTAS Y CACHÉ DE RESPUESTAS DEL SECRETARIO IA ---
+# Resuelve sin llamar al modelo las respuestas cortas ("no", "listo") que no contestan una
+# pregunta abierta de la IA y las invocaciones exactas de un protocolo ("hice pasaje celular
+# x3"). Lo demás pasa por una caché de respuestas por sesión, con la misma estructura JSON
+# que devuelve Gemini.
+import copy
+import hashlib
+import re
+from collections import OrderedDict
+from texto import normalizar
+
+PALABRAS_CORTAS = ['no', 'nada', 'ninguno', 'ninguna', 'listo', 'ya', 'si', 'sí', 'ok']
+CIERRES = {"no", "nada", "ninguno", "ninguna", "listo", "ok", "ya", "gracias", "nop", "tampoco"}
+NEGATIVAS = {"no", "nada", "ninguno", "ninguna", "nop", "tampoco"}
+RESPUESTA_CIERRE = "Entendido y descontado."
+PREGUNTA_EXTRA = "¿Usaste alguna placa o frasco nuevo (sí/no)?"
+RELLENO = {"hoy", "hice", "hize", "hicimos", "realice", "termine", "un", "una", "el", "la", "de", "del", "protocolo", "con", "para", "y", "ya"}
+PATRON_MUESTRAS = re.compile(r'\bx\s*(\d+)\b|\b(\d+)\s*(?:x|veces|muestras?|placas?|pocillos?)\b')
+MAX_CACHE = 100
+
+
+def es_respuesta_corta(texto):
+    # Palabras completas: "lisis" o "inmuno" no son un "si" o un "no"
+    palabras = re.findall(r'\w+', normalizar(texto))
+    return len(palabras) <= 5 and any(normalizar(w) in palabras for w in PALABRAS_CORTAS)
+
+
+def respuesta_vacia(respuesta_chat, entrada_cuaderno=""):
+    return {"respuesta_chat": respuesta_chat, "entrada_cuaderno": entrada_cuaderno, "protocolo_detectado": {}, "descuentos_protocolo": [], "descuentos_extra": []}
+
+
+def resolver_local(texto, df_prot, bom, ultima_ia=""):
+    """JSON equivalente al del modelo si el mensaje se puede resolver sin él; si no, None.
+    `ultima_ia` es el último mensaje del asistente: si preguntó algo, el cierre es su respuesta."""
+    palabras = re.findall(r'\w+', normalizar(texto))
+    if palabras and len(palabras) <= 3 and all(p in CIERRES for p in palabras):
+        # Tras una pregunta sólo se cierra localmente un "no" a PREGUNTA_EXTRA: no queda nada por descontar
+        if "?" not in (ultima_ia or "") or (PREGUNTA_EXTRA in ultima_ia and all(p in NEGATIVAS for p in palabras)):
+            return respuesta_vacia(RESPUESTA_CIERRE)
+        return None
+
+    norm = normalizar(texto)
+    candidatos = [n for n in df_prot['nombre'].dropna().astype(str) if normalizar(n).strip() and re.search(rf'\b{re.escape(normalizar(n).strip())}\b', norm)] if not df_prot.empty else []
+    if len(candidatos) != 1 or bom is None or candidatos[0] not in bom.index: return None
+    fila = bom.loc[candidatos[0]]
+    fila = fila[fila > 0]
+    if fila.empty: return None
+    resto = norm.replace(normalizar(candidatos[0]).strip(), " ")
+    m = PATRON_MUESTRAS.search(resto)
+    muestras = int(m.group(1) or m.group(2)) if m else 1
+    # Sólo es una invocación exacta si no queda nada más que relleno y el multiplicador
+    if any(p not in RELLENO for p in re.findall(r'\w+', PATRON_MUESTRAS.sub(" ", resto))): return None
+    data = respuesta_vacia(f"Registrado: {candidatos[0]} (x{muestras}). {PREGUNTA_EXTRA}", texto.strip())
+    data['protocolo_detectado'] = {"nombre": candidatos[0], "muestras": muestras}
+    data['descuentos_protocolo'] = [{"id_item": str(i), "cantidad_total_a_restar": float(c) * muestras} for i, c in fila.items()]
+    return data
+
+
+def huella_catalogo(df_items):
+    """Cambia cuando cambian los ids, nombres o stock del inventario: cubre también los cambios
+    de otras sesiones que llegan al recargar la tabla, sin subir la versión local."""
+    if df_items.empty: return ""
+    base = "\n".join(sorted(df_items['id'].astype(str) + "|" + df_items['nombre'].astype(str) + "|" + df_items['cantidad_actual'].astype(str)))
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def clave_cache(texto, ultima_respuesta_ia, version_items, huella, version_prot):
+    """Las respuestas leen el stock ("¿cuánto etanol queda?"): la clave lleva la versión del
+    inventario para que una escritura las deje obsoletas."""
+    return (" ".join(re.findall(r'\w+', normalizar(texto))), " ".join(re.findall(r'\w+', normalizar(ultima_respuesta_ia or ""))), version_items, huella, version_prot)
+
+
+class CacheRespuestas:
+    def __init__(self, maximo=MAX_CACHE):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        if clave in self._datos:
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return copy.deepcopy(self._datos[clave])
+        self.fallos += 1
+        return None
+
+    def guardar(self, clave, data):
+        self._datos[clave] = copy.deepcopy(data)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maximo: self._datos.popitem(last=False)
@@ -0,0 +1,91 @@
+# --- BENCHMARK DE ARRANQUE EN FRÍO ---
+# Cada escenario corre en un proceso nuevo (sys.modules vacío) y mide la primera ejecución
+# de app.py: ahí se pagan los imports. También revisa que las dependencias pesadas que la
+# app carga en el primer uso (Gemini, qrcode, fpdf, OpenCV) no se hayan importado.
+# Uso:  python -m bench.arranque --repeticiones 3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Presupuesto de la primera ejecución de app.py (ms), sin contar el import de Streamlit ni
+# la búsqueda de componentes que el servidor hace al iniciar
+PRESUPUESTO_MS = {"login": 1200, "catalogo": 2000, "admin": 2200}
+DIFERIDOS = ["google.generativeai", "qrcode", "fpdf", "cv2"]
+N_ITEMS = 200
+
+
+def _escenario(nombre):
+    """Corre dentro del proceso hijo e imprime el resultado como JSON."""
+    import logging
+    from unittest import mock
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    base = (time.perf_counter() - t0) * 1000
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from bench.falsos import SupabaseFalso
+    from bench.sintetico import LAB_BENCH, generar_lab
+
+    with mock.patch("supabase.create_client", return_value=SupabaseFalso(generar_lab(N_ITEMS))):
+        at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=300)
+        for clave in ("SUPABASE_URL", "SUPABASE_KEY", "GENAI_KEY", "EMAIL_SENDER", "EMAIL_PASSWORD"): at.secrets[clave] = "bench"
+        # El servidor busca los componentes instalados una vez al iniciar, no en la primera
+        # ejecución; AppTest lo hace dentro de run() y el costo crece con los paquetes instalados
+        if hasattr(at, "_bidi_component_manager"):
+            from streamlit.components.v2.component_manager import BidiComponentManager
+            t0 = time.perf_counter()
+            at._bidi_component_manager = BidiComponentManager()
+            at._bidi_component_manager.discover_and_register_components(start_file_watching=False)
+            base += (time.perf_counter() - t0) * 1000
+        if nombre in ("catalogo", "admin"):
+            # El admin además recorre la pestaña de análisis (reportes, equipo)
+            rol = "admin" if nombre == "admin" else "miembro"
+            for clave, valor in {"usuario_autenticado": "bruno@lab.cl", "user_uid": LAB_BENCH, "lab_id": LAB_BENCH, "rol": rol, "nombre_usuario": "Bruno"}.items():
+                at.session_state[clave] = valor
+        t0 = time.perf_counter()
+        at.run()
+        primera = (time.perf_counter() - t0) * 1000
+    print(json.dumps({"base_streamlit_ms": round(base, 1), "primera_ejecucion_ms": round(primera, 1),
+                      "diferidos_cargados": [m for m in DIFERIDOS if m in sys.modules], "errores": [str(e.value) for e in at.exception]}))
+
+
+def medir_arranque(repeticiones=3, escenarios=tuple(PRESUPUESTO_MS)):
+    resultados = {}
+    for nombre in escenarios:
+        corridas = []
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, "-m", "bench.arranque", "--escenario", nombre], cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+            corridas.append(json.loads(salida.strip().splitlines()[-1]))
+        tiempos = [c["primera_ejecucion_ms"] for c in corridas]
+        resultados[nombre] = {"mediana_ms": round(statistics.median(tiempos), 1), "min_ms": min(tiempos), "max_ms": max(tiempos),
+                              "base_streamlit_ms": round(statistics.median(c["base_streamlit_ms"] for c in corridas), 1),
+                              "presupuesto_ms": PRESUPUESTO_MS[nombre], "diferidos_cargados": corridas[-1]["diferidos_cargados"], "errores": corridas[-1]["errores"]}
+    return resultados
+
+
+def dentro_de_presupuesto(resultados):
+    return all(r["mediana_ms"] <= r["presupuesto_ms"] and not r["diferidos_cargados"] and not r["errores"] for r in resultados.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío de Stck.")
+    parser.add_argument("--escenario", choices=list(PRESUPUESTO_MS), help=argparse.SUPPRESS)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+    if args.escenario:
+        _escenario(args.escenario)
+        return
+
+    resultados = medir_arranque(args.repeticiones)
+    for nombre, r in resultados.items():
+        print(f"{nombre:<9} primera ejecución {r['mediana_ms']:>7.0f} ms (presupuesto {r['presupuesto_ms']} ms) · import Streamlit {r['base_streamlit_ms']:.0f} ms"
+              + (f" · cargó {', '.join(r['diferidos_cargados'])}" if r["diferidos_cargados"] else "") + (f" · {len(r['errores'])} errores" if r["errores"] else ""))
+    sys.exit(0 if dentro_de_presupuesto(resultados) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# --- BENCHMARK DE LA APP CON DATOS SINTÉTICOS ---
+# Mide los caminos calientes (alertas, catálogo, analítica, PDF, descuentos de la IA) y una
+# re-ejecución completa de app.py (todas las pestañas) sobre los dobles de bench/falsos.py,
+# más el arranque en frío de bench/arranque.py.
+# Uso:  python -m bench.benchmark --tamanos 1k,10k --salida bench/resultados.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime
+from unittest import mock
+import pandas as pd
+from bench.arranque import medir_arranque
+from bench.falsos import ModeloFalso, SupabaseFalso
+from bench.sintetico import LAB_BENCH, TAMANOS, generar_lab
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAMANO_MAX_PDF = 20_000
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return {"mediana_ms": round(statistics.median(tiempos), 2), "min_ms": round(min(tiempos), 2), "max_ms": round(max(tiempos), 2), "n": repeticiones}
+
+
+def caminos_calientes(tablas, repeticiones):
+    from alertas import calcular_alertas, resumen_alertas
+    from atajos_ia import resolver_local
+    from busqueda import IndiceCatalogo
+    from consumo import calcular_burn_rate, consumo_ventana, refrescar_rollup
+    from contexto_ia import IndiceContexto
+    from costeo import matriz_bom, simular_costos
+    from datos import LECTORES, NORMALIZADORES, registrar_entrada_bitacora
+    from espejo import EspejoLocal
+    from reportes import generar_reporte_inventario
+
+    cliente = SupabaseFalso(tablas)
+    df = LECTORES["items"](cliente, LAB_BENCH)
+    df_prot = LECTORES["protocolos"](cliente, LAB_BENCH)
+    bom = matriz_bom(df_prot, df)
+    indice = IndiceCatalogo(df)
+    hoy = date.today()
+    refrescar_rollup(cliente, LAB_BENCH)
+    prot = df_prot['nombre'].iloc[0]
+    espejo = EspejoLocal(os.path.join(tempfile.mkdtemp(prefix="stck_bench_"), "espejo.db"))
+    espejo.sincronizar(cliente, LAB_BENCH, "items")
+
+    def descuento_ia():
+        data = resolver_local(f"hice {prot} x3", df_prot, bom)
+        ajustes = [{"item_id": d["id_item"], "delta": -d["cantidad_total_a_restar"], "tipo": f"Uso IA: {prot}"} for d in data["descuentos_protocolo"]]
+        registrar_entrada_bitacora(cliente, LAB_BENCH, "bench", data["entrada_cuaderno"], "", ajustes, hoy)
+
+    def catalogo():
+        ordenado = df.assign(_cat=df['categoria'].astype(str).str.strip(), _nombre=df['nombre'].astype(str).str.lower()).sort_values(['_cat', '_nombre'], kind='stable')
+        {cat: g for cat, g in ordenado.groupby('_cat', sort=False)}
+
+    resultados = {
+        "carga_items": medir(lambda: LECTORES["items"](cliente, LAB_BENCH), repeticiones),
+        "carga_items_espejo": medir(lambda: NORMALIZADORES["items"](espejo.leer_sincronizado(cliente, LAB_BENCH, "items")), repeticiones),
+        "alertas": medir(lambda: resumen_alertas(df, calcular_alertas(df, hoy)), repeticiones),
+        "catalogo_agrupar": medir(catalogo, repeticiones),
+        "catalogo_indice": medir(lambda: IndiceCatalogo(df), max(repeticiones // 2, 1)),
+        "catalogo_buscar": medir(lambda: [indice.buscar(q) for q in ("acido", "pbs", "refri 1", "caja 12", "anticuerpo cd4", "etnaol")], repeticiones),
+        "contexto_ia": medir(lambda: IndiceContexto(df, df_prot, bom).seleccionar("hice pbs y etanol"), max(repeticiones // 2, 1)),
+        "analitica_burn_rate": medir(lambda: calcular_burn_rate(df, consumo_ventana(cliente, LAB_BENCH, 30, hoy), 30), repeticiones),
+        "analitica_bom": medir(lambda: matriz_bom(df_prot, df), repeticiones),
+        "analitica_simulacion": medir(lambda: simular_costos(bom, df, [1, 24, 96]), repeticiones),
+        "ia_descuento": medir(descuento_ia, repeticiones),
+    }
+    if len(df) <= TAMANO_MAX_PDF:
+        resultados["pdf_reporte"] = medir(lambda: generar_reporte_inventario(df, "bench", "categoria"), 1)
+    return resultados
+
+
+def rerun_completo(tablas, repeticiones, rol="admin", espejo=None, latencia=0.0):
+    """Tiempo de app.py con cachés vacías (fría) y de las re-ejecuciones siguientes (tibia).
+    Con `espejo` (ruta de un SQLite), la app lee desde el espejo local."""
+    import logging
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    cliente, modelo = SupabaseFalso(tablas, latencia), ModeloFalso()
+    with mock.patch("supabase.create_client", return_value=cliente), \
+         mock.patch("google.generativeai.configure"), \
+         mock.patch("google.generativeai.GenerativeModel", return_value=modelo):
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=600)
+        for clave in ("SUPABASE_URL", "SUPABASE_KEY", "GENAI_KEY", "EMAIL_SENDER", "EMAIL_PASSWORD"): at.secrets[clave] = "bench"
+        if espejo: at.secrets["ESPEJO_SQLITE"] = espejo
+        for clave, valor in {"usuario_autenticado": "ana@lab.cl", "user_uid": LAB_BENCH, "lab_id": LAB_BENCH, "rol": rol, "nombre_usuario": "Ana"}.items():
+            at.session_state[clave] = valor
+        t0 = time.perf_counter()
+        at.run()
+        fria = (time.perf_counter() - t0) * 1000
+        tibia = medir(at.run, repeticiones)
+        # Un mensaje al Secretario IA que se resuelve localmente (descuento + entrada de bitácora)
+        prot = tablas["protocolos"][0]["nombre"]
+        t0 = time.perf_counter()
+        at.chat_input[0].set_value(f"hice {prot} x2").run()
+        chat = (time.perf_counter() - t0) * 1000
+    errores = [str(e.value) for e in at.exception]
+    return {"fria_ms": round(fria, 2), "tibia": tibia, "chat_ia_ms": round(chat, 2), "llamadas_supabase": dict(cliente.llamadas), "llamadas_gemini": modelo.llamadas, "errores": errores}
+
+
+def version_codigo():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception: return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de Stck con datos sintéticos.")
+    parser.add_argument("--tamanos", default="1k,10k", help=f"Lista separada por coma de {', '.join(TAMANOS)} o números de items.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--sin-rerun", action="store_true", help="Sólo caminos calientes, sin ejecutar app.py.")
+    parser.add_argument("--espejo", action="store_true", help="Repite el rerun leyendo desde un espejo SQLite (una vez para llenarlo y otra ya lleno).")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos simulados por consulta a Supabase en el rerun.")
+    parser.add_argument("--sin-arranque", action="store_true", help="No medir el arranque en frío.")
+    parser.add_argument("--salida", default=os.path.join(RAIZ, "bench", "resultados.json"))
+    args = parser.parse_args()
+
+    salida = {"version": version_codigo(), "fecha": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+              "pandas": pd.__version__, "maquina": platform.machine(), "tamanos": {}}
+    if not args.sin_arranque:
+        salida["arranque"] = medir_arranque(max(args.repeticiones // 2, 1))
+        for nombre, r in salida["arranque"].items(): print(f"[arranque] {nombre:<9} {r['mediana_ms']:>8.0f} ms (presupuesto {r['presupuesto_ms']} ms)")
+    for etiqueta in args.tamanos.split(","):
+        etiqueta = etiqueta.strip()
+        n = TAMANOS.get(etiqueta) or int(etiqueta)
+        t0 = time.perf_counter()
+        tablas = generar_lab(n)
+        print(f"[{etiqueta}] datos sintéticos: {sum(map(len, tablas.values())):,} filas en {time.perf_counter() - t0:.1f} s")
+        res = {"items": n, "caminos": caminos_calientes(tablas, args.repeticiones)}
+        for nombre, r in res["caminos"].items(): print(f"[{etiqueta}] {nombre:<22} {r['mediana_ms']:>10.2f} ms")
+        if not args.sin_rerun:
+            res["rerun"] = rerun_completo(tablas, max(args.repeticiones // 2, 1), latencia=args.latencia)
+            print(f"[{etiqueta}] rerun app.py: fría {res['rerun']['fria_ms']:.0f} ms · tibia {res['rerun']['tibia']['mediana_ms']:.0f} ms · chat IA {res['rerun']['chat_ia_ms']:.0f} ms · errores {len(res['rerun']['errores'])}")
+            if args.espejo:
+                ruta = os.path.join(tempfile.mkdtemp(prefix="stck_bench_"), "espejo.db")
+                for fase in ("espejo_vacio", "espejo_lleno"):
+                    res[f"rerun_{fase}"] = r = rerun_completo(tablas, max(args.repeticiones // 2, 1), espejo=ruta, latencia=args.latencia)
+                    print(f"[{etiqueta}] rerun {fase}: fría {r['fria_ms']:.0f} ms · tibia {r['tibia']['mediana_ms']:.0f} ms · errores {len(r['errores'])}")
+        salida["tamanos"][etiqueta] = res
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    with open(args.salida, "w", encoding="utf-8") as f: json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# --- DOBLES EN MEMORIA DE SUPABASE Y GEMINI ---
+# SupabaseFalso implementa el subconjunto de la API de tablas de supabase-py que usa la app
+# (select/eq/gt/lt/in_/or_/order/limit, insert/upsert/update/delete) y las funciones rpc de sql/.
+# Como los triggers de sql/007, mantiene updated_at y deja lápidas en filas_eliminadas (al
+# borrar y al mover una fila a otro lab).
+# `latencia` simula el viaje de red de cada execute() y `max_filas` el tope de filas por
+# respuesta de PostgREST (max-rows).
+import itertools
+import json
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+SANTIAGO = ZoneInfo("America/Santiago")
+MARGEN_ROLLUP = timedelta(hours=1)
+
+
+def _comparable(valor):
+    if isinstance(valor, (int, float)): return (0, float(valor), "")
+    try: return (0, float(valor), "")
+    except (TypeError, ValueError): return (1, 0.0, "" if valor is None else str(valor))
+
+
+def _cumple(fila, col, op, valor):
+    v = fila.get(col)
+    if op == "eq": return v is not None and str(v) == str(valor)
+    if op == "neq": return str(v) != str(valor)
+    if op == "in": return str(v) in valor
+    if v is None: return False
+    a, b = _comparable(v), _comparable(valor)
+    return {"lt": a < b, "lte": a <= b, "gt": a > b, "gte": a >= b}[op]
+
+
+def _dia_local(momento):
+    """Fecha en hora de Santiago de un timestamptz (str ISO o datetime; sin zona se toma UTC)."""
+    if isinstance(momento, str): momento = datetime.fromisoformat(momento)
+    if momento.tzinfo is None: momento = momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(SANTIAGO).date()
+
+
+def _partes(texto):
+    """Separa por comas de primer nivel: 'a.eq.1,and(b.lt.2,c.eq.3)'."""
+    nivel, actual, partes = 0, "", []
+    for c in texto:
+        if c == "," and nivel == 0: partes.append(actual); actual = ""; continue
+        nivel += (c == "(") - (c == ")")
+        actual += c
+    return partes + [actual] if actual else partes
+
+
+def _filtro_logico(expr, modo="or"):
+    """Compila la sintaxis PostgREST de .or_() a un predicado sobre una fila."""
+    subs = []
+    for p in _partes(expr):
+        m = re.fullmatch(r'(and|or)\((.*)\)', p.strip())
+        if m: subs.append(_filtro_logico(m.group(2), m.group(1))); continue
+        col, op, valor = p.strip().split(".", 2)
+        subs.append(lambda f, col=col, op=op, valor=valor.strip('"'): _cumple(f, col, op, valor))
+    return (lambda f: any(s(f) for s in subs)) if modo == "or" else (lambda f: all(s(f) for s in subs))
+
+
+class Consulta:
+    def __init__(self, cliente, tabla):
+        self.cliente, self.tabla = cliente, tabla
+        self.filtros, self.orden = [], []
+        self.columnas, self.limite, self.accion, self.payload, self.on_conflict = None, None, "select", None, None
+        self.desde = 0
+
+    # --- filtros ---
+    def select(self, columnas="*", **_):
+        self.columnas = None if columnas.strip() == "*" else [c.strip() for c in columnas.split(",")]
+        return self
+
+    def _filtro(self, col, op, valor):
+        self.filtros.append(lambda f: _cumple(f, col, op, valor))
+        return self
+
+    def eq(self, col, valor): return self._filtro(col, "eq", valor)
+    def neq(self, col, valor): return self._filtro(col, "neq", valor)
+    def lt(self, col, valor): return self._filtro(col, "lt", valor)
+    def lte(self, col, valor): return self._filtro(col, "lte", valor)
+    def gt(self, col, valor): return self._filtro(col, "gt", valor)
+    def gte(self, col, valor): return self._filtro(col, "gte", valor)
+    def in_(self, col, valores): return self._filtro(col, "in", {str(v) for v in valores})
+
+    def or_(self, expr):
+        self.filtros.append(_filtro_logico(expr))
+        return self
+
+    def order(self, col, desc=False):
+        self.orden.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    def range(self, desde, hasta):
+        self.desde, self.limite = desde, hasta - desde + 1
+        return self
+
+    # --- escrituras ---
+    def insert(self, filas): self.accion, self.payload = "insert", filas; return self
+    def update(self, cambios): self.accion, self.payload = "update", cambios; return self
+    def delete(self): self.accion = "delete"; return self
+
+    def upsert(self, filas, on_conflict=None, **_):
+        self.accion, self.payload, self.on_conflict = "upsert", filas, on_conflict
+        return self
+
+    def execute(self):
+        self.cliente._llamada(self.tabla, self.accion)
+        return SimpleNamespace(data=getattr(self, f"_{self.accion}")())
+
+    def _filas(self):
+        return [f for f in self.cliente.tablas[self.tabla] if all(p(f) for p in self.filtros)]
+
+    def _select(self):
+        filas = self._filas()
+        for col, desc in reversed(self.orden): filas.sort(key=lambda f: _comparable(f.get(col)), reverse=desc)
+        if self.limite is not None or self.desde: filas = filas[self.desde:None if self.limite is None else self.desde + self.limite]
+        if self.cliente.max_filas is not None: filas = filas[:self.cliente.max_filas]
+        return [dict(f) if self.columnas is None else {c: f.get(c) for c in self.columnas} for f in filas]
+
+    def _insert(self):
+        filas = self.payload if isinstance(self.payload, list) else [self.payload]
+        nuevas = [self.cliente.nueva_fila(self.tabla, f) for f in filas]
+        self.cliente.tablas[self.tabla].extend(nuevas)
+        return [dict(f) for f in nuevas]
+
+    def _upsert(self):
+        filas = self.payload if isinstance(self.payload, list) else [self.payload]
+        claves = [c.strip() for c in (self.on_conflict or "id").split(",")]
+        existentes = {tuple(str(f.get(c)) for c in claves): f for f in self.cliente.tablas[self.tabla]}
+        salida = []
+        for f in filas:
+            previa = existentes.get(tuple(str(f.get(c)) for c in claves))
+            if previa is not None and all(f.get(c) is not None for c in claves): self.cliente.cambiar(self.tabla, previa, f); salida.append(dict(previa))
+            else: salida.extend(Consulta(self.cliente, self.tabla).insert(f)._insert())
+        return salida
+
+    def _update(self):
+        filas = self._filas()
+        for f in filas: self.cliente.cambiar(self.tabla, f, self.payload)
+        return [dict(f) for f in filas]
+
+    def _delete(self):
+        borrar = self._filas()
+        ids = {id(f) for f in borrar}
+        self.cliente.tablas[self.tabla][:] = [f for f in self.cliente.tablas[self.tabla] if id(f) not in ids]
+        for f in borrar: self.cliente.lapida(self.tabla, f)
+        return [dict(f) for f in borrar]
+
+
+class SupabaseFalso:
+    def __init__(self, tablas=None, latencia=0.0, max_filas=None):
+        self.tablas = defaultdict(list, {k: [dict(f) for f in v] for k, v in (tablas or {}).items()})
+        for filas in self.tablas.values():
+            for f in filas: f.setdefault("updated_at", f.get("created_at") or "2024-01-01T00:00:00+00:00")
+        self.latencia = latencia
+        self.max_filas = max_filas
+        self.llamadas = defaultdict(int)
+        self._ids = defaultdict(lambda: itertools.count(1_000_000))
+        self.auth = SimpleNamespace(sign_in_with_password=self._sign_in, sign_up=self._sign_in)
+
+    def _llamada(self, tabla, accion):
+        self.llamadas[f"{tabla}.{accion}"] += 1
+        if self.latencia: time.sleep(self.latencia)
+
+    def _sign_in(self, credenciales):
+        return SimpleNamespace(user=SimpleNamespace(email=credenciales["email"], id=credenciales["email"]))
+
+    def nueva_fila(self, tabla, fila):
+        f = dict(fila)
+        f.setdefault("id", str(next(self._ids[tabla])))
+        f.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        f.setdefault("updated_at", f["created_at"])
+        return f
+
+    def tocar(self, fila):
+        fila["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+    def cambiar(self, tabla, fila, cambios):
+        # Como el trigger de traslado de sql/007: cambiar lab_id o la clave deja lápida de la fila anterior
+        clave = "email" if tabla == "equipo" else "id"
+        if any(c in cambios and str(cambios[c]) != str(fila.get(c)) for c in ("lab_id", clave)): self.lapida(tabla, dict(fila))
+        fila.update(cambios)
+        self.tocar(fila)
+
+    def lapida(self, tabla, fila):
+        if tabla == "filas_eliminadas": return
+        self.tablas["filas_eliminadas"].append(self.nueva_fila("filas_eliminadas", {"tabla": tabla, "lab_id": fila.get("lab_id"), "fila_id": str(fila.get("email") if tabla == "equipo" else fila.get("id")),
+                                                                                    "eliminado_en": datetime.now(timezone.utc).isoformat()}))
+
+    def table(self, nombre): return Consulta(self, nombre)
+
+    def rpc(self, nombre, params=None):
+        return SimpleNamespace(execute=lambda: (self._llamada(nombre, "rpc"), SimpleNamespace(data=getattr(self, f"_rpc_{nombre}")(**(params or {}))))[1])
+
+    # --- funciones de sql/ ---
+    def _rpc_ajustar_stock(self, p_lab_id, p_usuario, p_ajustes, p_bitacora_id=None):
+        items = {str(f["id"]): f for f in self.tablas["items"] if str(f.get("lab_id")) == str(p_lab_id)}
+        salida = []
+        for linea in sorted(p_ajustes, key=lambda l: str(l["item_id"])):
+            it = items.get(str(linea["item_id"]))
+            if it is None: continue
+            previo = float(it.get("cantidad_actual") or 0)
+            nuevo = float(linea["fijar"]) if linea.get("fijar") is not None else previo + float(linea.get("delta") or 0)
+            it["cantidad_actual"] = nuevo
+            self.tocar(it)
+            mov = self.nueva_fila("movimiento", {"item_id": str(it["id"]), "nombre_item": it["nombre"], "cantidad_cambio": nuevo - previo, "tipo": linea.get("tipo"), "usuario": p_usuario, "lab_id": p_lab_id})
+            self.tablas["movimiento"].append(mov)
+            if p_bitacora_id is not None and nuevo < previo:
+                self.tablas["consumo_bitacora"].append(self.nueva_fila("consumo_bitacora", {"bitacora_id": str(p_bitacora_id), "lab_id": p_lab_id, "item_id": str(it["id"]), "movimiento_id": mov["id"], "cantidad": previo - nuevo, "tipo": linea.get("tipo")}))
+            salida.append({"item_id": str(it["id"]), "nombre": it["nombre"], "cantidad_actual": nuevo, "cantidad_cambio": nuevo - previo})
+        return salida
+
+    def _rpc_registrar_entrada_bitacora(self, p_lab_id, p_usuario, p_fecha, p_contenido, p_resultado, p_ajustes):
+        entrada = self.nueva_fila("bitacora", {"lab_id": p_lab_id, "usuario": p_usuario, "fecha": p_fecha, "contenido": p_contenido, "resultado": p_resultado})
+        self.tablas["bitacora"].append(entrada)
+        self._rpc_ajustar_stock(p_lab_id, p_usuario, p_ajustes or [], entrada["id"])
+        return entrada["id"]
+
+    def _rpc_revertir_entrada_bitacora(self, p_lab_id, p_usuario, p_bitacora_id):
+        consumos = [c for c in self.tablas["consumo_bitacora"] if c["lab_id"] == p_lab_id and c["bitacora_id"] == str(p_bitacora_id)]
+        self._rpc_ajustar_stock(p_lab_id, p_usuario, [{"item_id": c["item_id"], "delta": c["cantidad"], "tipo": "Reversión (Borrado de Bitácora)"} for c in consumos])
+        self.tablas["consumo_bitacora"][:] = [c for c in self.tablas["consumo_bitacora"] if c not in consumos]
+        self.tablas["bitacora"][:] = [b for b in self.tablas["bitacora"] if not (str(b["id"]) == str(p_bitacora_id) and b["lab_id"] == p_lab_id)]
+        return len(consumos)
+
+    def _rpc_refrescar_consumo_diario(self, p_lab_id, p_margen=None):
+        # Como sql/001: recalcula completos los días (hora de Santiago) desde el del refresco anterior menos el margen
+        marca = next((w for w in self.tablas["consumo_watermark"] if w["lab_id"] == p_lab_id), None)
+        if marca is None:
+            marca = {"lab_id": p_lab_id, "refrescado_en": "1970-01-01T00:00:00+00:00"}
+            self.tablas["consumo_watermark"].append(marca)
+        desde = _dia_local(datetime.fromisoformat(marca["refrescado_en"]) - (p_margen or MARGEN_ROLLUP)).isoformat()
+        por_dia = defaultdict(float)
+        for m in self.tablas["movimiento"]:
+            if m.get("lab_id") != p_lab_id or float(m.get("cantidad_cambio") or 0) >= 0: continue
+            dia = _dia_local(m["created_at"]).isoformat()
+            if dia >= desde: por_dia[(str(m["item_id"]), dia)] += -float(m["cantidad_cambio"])
+        self.tablas["consumo_diario"][:] = [f for f in self.tablas["consumo_diario"] if f["lab_id"] != p_lab_id or f["dia"] < desde] + \
+                                           [{"lab_id": p_lab_id, "item_id": i, "dia": d, "cantidad": c} for (i, d), c in por_dia.items()]
+        marca["refrescado_en"] = datetime.now(timezone.utc).isoformat()
+        return marca["refrescado_en"]
+
+    def _rpc_refrescar_consumo_diario_todos(self):
+        labs = sorted({f["lab_id"] for f in self.tablas["equipo"] if f.get("lab_id")} | {w["lab_id"] for w in self.tablas["consumo_watermark"]})
+        for lab in labs: self._rpc_refrescar_consumo_diario(lab)
+        return len(labs)
+
+    def _rpc_reemplazar_alertas(self, p_labs, p_calculado_en, p_alertas):
+        labs = set(p_labs)
+        self.tablas["alertas_lab"][:] = [f for f in self.tablas["alertas_lab"] if f["lab_id"] not in labs]
+        self.tablas["alertas_lab"].extend(self.nueva_fila("alertas_lab", {**a, "calculado_en": p_calculado_en}) for a in p_alertas or [])
+        return len(p_alertas or [])
+
+
+class SMTPFalso:
+    """Reemplazo de smtplib.SMTP: cuenta conexiones y guarda lo enviado en `SMTPFalso.enviados`."""
+    conexiones = 0
+    enviados = []
+
+    def __init__(self, host, puerto, timeout=None):
+        SMTPFalso.conexiones += 1
+
+    def starttls(self): pass
+    def login(self, usuario, clave): pass
+    def send_message(self, mensaje): SMTPFalso.enviados.append(mensaje)
+    def quit(self): pass
+
+
+class ModeloFalso:
+    """generate_content de Gemini con una respuesta JSON fija, en bloque o en trozos."""
+
+    def __init__(self, respuesta=None, latencia=0.0, trozo=40):
+        self.respuesta = respuesta or {"respuesta_chat": "Entendido.", "entrada_cuaderno": "", "protocolo_detectado": {}, "descuentos_protocolo": [], "descuentos_extra": []}
+        self.latencia, self.trozo = latencia, trozo
+        self.llamadas = 0
+
+    def generate_content(self, prompt, stream=False, **_):
+        self.llamadas += 1
+        texto = json.dumps(self.respuesta, ensure_ascii=False)
+        if self.latencia: time.sleep(self.latencia)
+        if not stream: return SimpleNamespace(text=texto)
+        return iter([SimpleNamespace(text=texto[i:i + self.trozo]) for i in range(0, len(texto), self.trozo)])
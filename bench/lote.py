@@ -0,0 +1,47 @@
+# --- LOTE DE ALERTAS CONTRA LOS DOBLES LOCALES ---
+# Corre alertas_lote.ejecutar_lote sobre varios laboratorios sintéticos en SupabaseFalso, con
+# SMTPFalso en lugar de smtplib.SMTP, y reporta tiempos. Lo que el lote debe cumplir (un
+# resumen por administrador, reemplazo de alertas, lectura paginada de todos los labs) se
+# prueba en tests/test_alertas_lote.py.
+# Uso:  python -m bench.lote --labs 20 --items 500
+import argparse
+import json
+import time
+from collections import defaultdict
+from unittest import mock
+from bench.falsos import SMTPFalso, SupabaseFalso
+from bench.sintetico import generar_lab
+
+
+def tablas_varios_labs(n_labs, n_items):
+    tablas = defaultdict(list)
+    for k in range(n_labs):
+        for tabla, filas in generar_lab(n_items, lab_id=f"lab-{k:03d}", semilla=k, prefijo_id=f"L{k:03d}-").items():
+            tablas[tabla].extend(filas)
+    return tablas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lote de alertas sobre laboratorios sintéticos.")
+    parser.add_argument("--labs", type=int, default=20)
+    parser.add_argument("--items", type=int, default=500)
+    args = parser.parse_args()
+
+    from alertas_lote import ejecutar_lote
+    from correo import BandejaSalida
+    t0 = time.perf_counter()
+    cliente = SupabaseFalso(tablas_varios_labs(args.labs, args.items))
+    print(f"{args.labs} labs × {args.items} items generados en {time.perf_counter() - t0:.1f} s")
+    with mock.patch("correo.smtplib.SMTP", SMTPFalso):
+        bandeja = BandejaSalida("localhost", 25, "bench", "bench")
+        t0 = time.perf_counter()
+        res = ejecutar_lote(cliente, bandeja, "stck@lab.cl")
+        total = (time.perf_counter() - t0) * 1000
+        bandeja.cerrar()
+    res.update(total_ms=round(total, 1), sesiones_smtp=SMTPFalso.conexiones, mensajes_smtp=len(SMTPFalso.enviados),
+               alertas_guardadas=len(cliente.tablas["alertas_lab"]), llamadas_supabase=dict(cliente.llamadas))
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
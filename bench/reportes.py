@@ -0,0 +1,64 @@
+# --- BENCHMARK DEL REPORTE PDF DE INVENTARIO ---
+# Genera el reporte de reportes.py para un catálogo sintético, con nombres que usan µ y α para
+# ejercitar la fuente TrueType, en cada agrupación. Mide tiempo por item y pico de memoria de
+# Python (tracemalloc) y sale con código 1 si alguno excede el presupuesto.
+# Uso:  python -m bench.reportes --items 10000
+import argparse
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+PRESUPUESTO_MS_ITEM = 1.5
+PRESUPUESTO_MIB = 64
+
+
+def catalogo(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        'nombre': [f"Anticuerpo α-{i} µg/ml lote {i % 97}" for i in range(n)],
+        'categoria': rng.choice(["ANTICUERPOS", "BUFFERS", "ENZIMAS", "PLÁSTICOS", "MEDIOS"], n),
+        'ubicacion': rng.choice(["Refri 1", "Refri 2", "-80 °C", "Estante A", "Estante B"], n),
+        'cantidad_actual': rng.integers(0, 500, n).astype(float), 'umbral_minimo': 10.0, 'unidad': "ml",
+        'fecha_vencimiento': pd.to_datetime("2026-01-01") + pd.to_timedelta(rng.integers(0, 900, n), unit="D"), 'precio': rng.integers(0, 90000, n).astype(float),
+    })
+    df['vencimiento_dt'] = df['fecha_vencimiento']
+    df['fecha_vencimiento'] = df['fecha_vencimiento'].dt.strftime("%Y-%m-%d")
+    return df
+
+
+def medir_reportes(n):
+    """Por agrupación: segundos, ms por item, pico de memoria y tamaño del PDF."""
+    from reportes import AGRUPACIONES, generar_reporte_inventario
+    df = catalogo(n)
+    resultados = {}
+    for etiqueta, agrupar in AGRUPACIONES.items():
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        pdf = generar_reporte_inventario(df, "benchmark", agrupar)
+        segundos = time.perf_counter() - t0
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultados[etiqueta] = {"segundos": round(segundos, 2), "ms_item": round(segundos * 1000 / n, 3), "pico_mib": round(pico / 2**20, 1), "pdf_mib": round(len(pdf) / 2**20, 1)}
+    return resultados
+
+
+def dentro_de_presupuesto(resultados):
+    return all(r["ms_item"] <= PRESUPUESTO_MS_ITEM and r["pico_mib"] <= PRESUPUESTO_MIB for r in resultados.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte PDF de inventario sobre un catálogo sintético.")
+    parser.add_argument("--items", type=int, default=10_000)
+    args = parser.parse_args()
+
+    resultados = medir_reportes(args.items)
+    for etiqueta, r in resultados.items():
+        fuera = r["ms_item"] > PRESUPUESTO_MS_ITEM or r["pico_mib"] > PRESUPUESTO_MIB
+        print(f"{args.items} items · {etiqueta}: {r['segundos']:.2f} s · pico {r['pico_mib']:.1f} MiB · {r['pdf_mib']:.1f} MiB PDF{' · FUERA DE PRESUPUESTO' if fuera else ''}")
+    sys.exit(0 if dentro_de_presupuesto(resultados) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# --- DATOS SINTÉTICOS DE UN LABORATORIO ---
+# Tablas con la misma forma que las de Supabase, en tamaños configurables, para medir la app
+# sin tocar la base real. Todo es determinista dada la semilla.
+from datetime import datetime, timedelta
+import numpy as np
+
+TAMANOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+LAB_BENCH = "lab-bench"
+CATEGORIAS = ["ANTICUERPOS", "BUFFERS", "ENZIMAS", "PLÁSTICOS", "MEDIOS", "SOLVENTES", "KITS", "SALES", "VIDRIERÍA", "CULTIVO"]
+BASES = ["Ácido clorhídrico", "Etanol absoluto", "Anticuerpo anti-CD4", "PBS 10x", "Tubo falcon 15 ml", "Punta de pipeta 200 µl",
+         "Suero fetal bovino", "Cloruro de sodio", "Agarosa", "Tris base", "Placa de Petri", "Metanol", "Taq polimerasa", "DMSO",
+         "Kit extracción ARN", "Tripsina-EDTA", "β-mercaptoetanol", "Medio DMEM", "Placa 96 pocillos", "Criovial 2 ml"]
+UNIDADES = ["ml", "un", "g", "µl", "mg"]
+UBICACIONES = ["Refri 1", "Refri 2", "-20 °C", "-80 °C", "Estante A", "Estante B", "Gabinete químico", "Bodega"]
+USUARIOS = ["Ana", "Bruno", "Carla", "Diego", "Elena"]
+
+
+def generar_lab(n_items, lab_id=LAB_BENCH, semilla=0, hoy=None, prefijo_id=""):
+    """{tabla: [registros]} para items, protocolos, movimiento, bitacora, reservas, equipos_lab y equipo.
+    Los demás tamaños escalan con `n_items`. `prefijo_id` separa los ids de items al juntar varios labs."""
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or datetime.now().replace(microsecond=0)
+    ids = [f"{prefijo_id}{i + 1}" for i in range(n_items)]
+
+    nombres = [f"{BASES[i % len(BASES)]} {['Sigma', 'Merck', 'Thermo', 'Gibco', 'Corning'][i // len(BASES) % 5]} #{i // (len(BASES) * 5)}" for i in range(n_items)]
+    cantidades = rng.integers(0, 500, n_items).astype(float)
+    umbrales = rng.choice([0, 5, 10, 20], n_items).astype(float)
+    vence = [(hoy + timedelta(days=int(d))).date().isoformat() if d < 800 else "" for d in rng.integers(-60, 1000, n_items)]
+    items = [{"id": ids[i], "lab_id": lab_id, "nombre": nombres[i], "categoria": CATEGORIAS[i % len(CATEGORIAS)], "cantidad_actual": cantidades[i],
+              "unidad": UNIDADES[i % len(UNIDADES)], "umbral_minimo": umbrales[i], "ubicacion": UBICACIONES[int(rng.integers(len(UBICACIONES)))],
+              "posicion_caja": f"Caja {int(rng.integers(1, 200))}", "fecha_vencimiento": vence[i], "precio": float(rng.integers(0, 200_000)),
+              "fecha_cotizacion": "", "lote": f"L{i:06d}", "clave_importacion": None} for i in range(n_items)]
+
+    n_prot = max(n_items // 100, 5)
+    protocolos = []
+    for p in range(n_prot):
+        elegidos = rng.choice(n_items, size=min(6, n_items), replace=False)
+        lineas = [{"item_id": ids[k], "cantidad": float(rng.integers(1, 20)), "unidad": UNIDADES[k % len(UNIDADES)]} for k in elegidos]
+        texto = "\n".join(f"{nombres[k]}: {int(l['cantidad'])} {l['unidad']}" for k, l in zip(elegidos, lineas))
+        protocolos.append({"id": str(p + 1), "lab_id": lab_id, "nombre": f"Protocolo {p + 1}", "materiales_base": texto, "materiales_parseados": lineas})
+
+    n_mov = n_items * 5
+    momentos = [hoy - timedelta(seconds=int(s)) for s in rng.integers(0, 90 * 86400, n_mov)]
+    sel = rng.integers(0, n_items, n_mov)
+    movimiento = [{"id": str(m + 1), "lab_id": lab_id, "item_id": ids[k], "nombre_item": nombres[k], "cantidad_cambio": -float(rng.integers(1, 10)),
+                   "tipo": "Uso IA: Protocolo 1", "usuario": USUARIOS[m % len(USUARIOS)], "created_at": momentos[m].isoformat() + "+00:00"} for m, k in enumerate(sel)]
+
+    n_bit = max(n_items // 10, 10)
+    bitacora = [{"id": str(b + 1), "lab_id": lab_id, "usuario": USUARIOS[b % len(USUARIOS)], "fecha": (hoy - timedelta(hours=b)).date().isoformat(),
+                 "created_at": (hoy - timedelta(hours=b)).isoformat() + "+00:00", "contenido": f"Hice protocolo {b % n_prot + 1} con {b % 24 + 1} muestras",
+                 "resultado": f"🔗 <b>Protocolo:</b> Protocolo {b % n_prot + 1}", "link_adjunto": ""} for b in range(n_bit)]
+
+    equipos_lab = [{"id": str(e + 1), "lab_id": lab_id, "nombre": f"Equipo {e + 1}", "descripcion": "", "visibilidad": "Solo mi Laboratorio", "requisitos": ""} for e in range(10)]
+    n_res = max(n_items // 20, 10)
+    reservas = []
+    for r in range(n_res):
+        inicio = (hoy - timedelta(days=30)).replace(hour=8, minute=0, second=0) + timedelta(hours=int(r // 10) * 2)
+        reservas.append({"id": str(r + 1), "lab_id": lab_id, "equipo_id": str(r % 10 + 1), "usuario": USUARIOS[r % len(USUARIOS)],
+                         "fecha_inicio": inicio.isoformat(), "fecha_fin": (inicio + timedelta(hours=1, minutes=30)).isoformat()})
+
+    equipo = [{"email": f"{u.lower()}@{lab_id}.cl" if prefijo_id else f"{u.lower()}@lab.cl", "nombre": u, "lab_id": lab_id, "rol": "admin" if k == 0 else "miembro"} for k, u in enumerate(USUARIOS)]
+    return {"items": items, "protocolos": protocolos, "movimiento": movimiento, "bitacora": bitacora, "reservas": reservas,
+            "equipos_lab": equipos_lab, "equipo": equipo, "consumo_bitacora": [], "consumo_diario": [], "consumo_watermark": []}
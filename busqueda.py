@@ -0,0 +1,93 @@
+# --- ÍNDICE DE BÚSQUEDA DEL CATÁLOGO ---
+# Se construye una vez por versión del inventario. Busca en nombre, categoría, ubicación,
+# caja y sinónimos de laboratorio, sin tildes ni mayúsculas, con coincidencia exacta, por
+# prefijo (mientras se escribe) y difusa por trigramas (errores de tipeo). Devuelve las
+# posiciones de las filas ordenadas por relevancia: primero las que calzan con más palabras,
+# luego las que tienen más pares de palabras seguidas de la consulta juntas en un mismo campo
+# ("caja 12" en la caja, "refri 1" en la ubicación) y después por puntaje. Normalización y
+# expansión en texto.py.
+import math
+from collections import defaultdict
+import numpy as np
+from texto import Vocabulario, normalizar, palabras
+
+# Peso de cada campo en el puntaje
+CAMPOS_BUSQUEDA = {"nombre": 3.0, "categoria": 1.0, "ubicacion": 1.0, "posicion_caja": 1.0}
+PESO_SINONIMO = 0.8
+SINONIMOS = {
+    "pbs": "buffer fosfato salino", "etoh": "etanol", "meoh": "metanol", "h2o": "agua", "ddh2o": "agua destilada",
+    "nacl": "cloruro sodio", "kcl": "cloruro potasio", "hcl": "acido clorhidrico", "naoh": "hidroxido sodio",
+    "bsa": "albumina suero bovino", "fbs": "suero fetal bovino", "sfb": "suero fetal bovino", "ab": "anticuerpo",
+    "dmso": "dimetilsulfoxido", "sds": "dodecilsulfato sodio", "edta": "etilendiaminotetraacetico", "pfa": "paraformaldehido",
+    "tae": "buffer tris acetato edta", "tbe": "buffer tris borato edta", "dntp": "nucleotidos", "taq": "polimerasa",
+}
+
+
+class IndiceCatalogo:
+    def __init__(self, df_items, sinonimos=SINONIMOS):
+        self.n = len(df_items)
+        self.sinonimos = {normalizar(k): palabras(v) for k, v in sinonimos.items()}
+        # Inverso: cada palabra del sinónimo apunta a la abreviatura
+        for abrev, equivalente in list(self.sinonimos.items()):
+            if len(equivalente) == 1: self.sinonimos.setdefault(equivalente[0], []).append(abrev)
+
+        pesos = defaultdict(dict)
+        # seguidas[a][b] = filas donde b viene justo después de a en algún campo
+        seguidas = defaultdict(lambda: defaultdict(set))
+        for campo, peso in CAMPOS_BUSQUEDA.items():
+            if campo not in df_items.columns: continue
+            for k, texto in enumerate(df_items[campo].astype(str).tolist()):
+                toks = palabras(texto)
+                for tok in set(toks):
+                    if pesos[tok].get(k, 0.0) < peso: pesos[tok][k] = peso
+                for a, b in zip(toks, toks[1:]): seguidas[a][b].add(k)
+        self._seguidas = {a: {b: np.fromiter(filas, dtype=np.int64, count=len(filas)) for b, filas in d.items()} for a, d in seguidas.items()}
+        # postings[tok] = (filas, peso de campo) como arreglos numpy
+        self._postings = {tok: (np.fromiter(d.keys(), dtype=np.int64, count=len(d)), np.fromiter(d.values(), dtype=np.float64, count=len(d))) for tok, d in pesos.items()}
+        self._idf = {tok: math.log(1 + self.n / len(d)) for tok, d in pesos.items()}
+        self._vocab = Vocabulario(self._postings)
+        self._nombres = df_items['nombre'].astype(str).map(normalizar).to_numpy() if 'nombre' in df_items.columns else np.array([""] * self.n)
+
+    def _expandir(self, q, ultimo):
+        """Calces de `q` (prefijos sólo para la palabra que se está escribiendo, difusos si no hubo
+        otro calce) más sus sinónimos."""
+        calces = self._vocab.expandir(q, prefijo=ultimo, difuso_siempre=False)
+        for sin in self.sinonimos.get(q, ()):
+            if sin in self._postings: calces.setdefault(sin, PESO_SINONIMO)
+        return calces
+
+    def _pares_seguidos(self, calces_a, calces_b):
+        """Por fila, el mejor peso (exacto > prefijo > difuso) de un calce de a seguido de uno
+        de b en el mismo campo; 0 si no hay ninguno."""
+        mejor = np.zeros(self.n)
+        for a, peso_a in calces_a.items():
+            siguientes = self._seguidas.get(a, {})
+            for b in (calces_b if len(calces_b) < len(siguientes) else [b for b in siguientes if b in calces_b]):
+                if b in siguientes: np.maximum.at(mejor, siguientes[b], peso_a * calces_b[b])
+        return mejor
+
+    def buscar(self, consulta, limite=None):
+        """Posiciones (iloc) de las filas que calzan, de la más a la menos relevante."""
+        qs = palabras(consulta)
+        if not qs or not self.n: return np.arange(self.n) if not qs else np.array([], dtype=np.int64)
+        puntos = np.zeros(self.n)
+        cobertura = np.zeros(self.n, dtype=np.int32)
+        pares = np.zeros(self.n)
+        anteriores = {}
+        for j, q in enumerate(qs):
+            mejor = np.zeros(self.n)
+            calces = self._expandir(q, j == len(qs) - 1)
+            if anteriores and calces: pares += self._pares_seguidos(anteriores, calces)
+            anteriores = calces
+            if calces:
+                filas = np.concatenate([self._postings[tok][0] for tok in calces])
+                valores = np.concatenate([self._postings[tok][1] * (peso * self._idf[tok]) for tok, peso in calces.items()])
+                np.maximum.at(mejor, filas, valores)
+            puntos += mejor
+            cobertura += mejor > 0
+        # Primero las filas que calzan con más palabras de la consulta; después por puntaje
+        candidatos = np.flatnonzero(cobertura == cobertura.max()) if cobertura.max() > 0 else np.array([], dtype=np.int64)
+        frase = normalizar(consulta).strip()
+        bono = np.char.startswith(self._nombres[candidatos].astype(str), frase) * 2.0 if len(candidatos) else 0.0
+        orden = candidatos[np.lexsort((-(puntos[candidatos] + bono), -pares[candidatos]))]
+        return orden[:limite] if limite else orden
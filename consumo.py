@@ -0,0 +1,32 @@
+# --- ROLLUP DE CONSUMO (BURN RATE) ---
+# Lee sólo el rollup consumo_diario (ver sql/001_consumo_diario.sql), nunca el ledger completo.
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from datos import leer_todo
+
+VENTANAS_DIAS = [7, 30, 90]
+
+
+def refrescar_rollup(cliente, lab_id):
+    return cliente.rpc("refrescar_consumo_diario", {"p_lab_id": lab_id}).execute().data
+
+
+def consumo_ventana(cliente, lab_id, dias=30, hoy=None):
+    """Consumo total por item_id en los últimos `dias` días. Lee por páginas: una fila por
+    (item, día) pasa rápido el tope de filas por respuesta de PostgREST."""
+    desde = (hoy or date.today()) - timedelta(days=dias)
+    filas = leer_todo(lambda: cliente.table("consumo_diario").select("item_id, dia, cantidad").eq("lab_id", lab_id).gte("dia", desde.isoformat()), ["item_id", "dia"])
+    df_c = pd.DataFrame(filas, columns=["item_id", "cantidad"])
+    df_c['cantidad'] = pd.to_numeric(df_c['cantidad'], errors='coerce').fillna(0)
+    return df_c.groupby(df_c['item_id'].astype(str))['cantidad'].sum()
+
+
+def calcular_burn_rate(df_items, consumo, dias=30):
+    """Une el consumo por id al inventario y proyecta los días de stock restantes."""
+    df_pred = df_items[['id', 'nombre', 'cantidad_actual', 'unidad']].copy()
+    df_pred['consumo'] = df_pred['id'].astype(str).map(consumo)
+    df_pred = df_pred[df_pred['consumo'] > 0]
+    df_pred['tasa_diaria'] = df_pred['consumo'] / dias
+    df_pred['dias_restantes_num'] = np.where(df_pred['tasa_diaria'] > 0, df_pred['cantidad_actual'] / df_pred['tasa_diaria'], 9999)
+    return df_pred.sort_values(by='dias_restantes_num', ascending=True)
@@ -0,0 +1,95 @@
+# --- SELECCIÓN DE CONTEXTO PARA EL SECRETARIO IA ---
+# En vez de mandar el inventario completo en cada mensaje, se recuperan localmente los
+# items y protocolos relevantes para lo que dijo el usuario (y su historial reciente).
+# Coincidencia exacta, por prefijo y difusa por trigramas (texto.py), sin tildes ni mayúsculas.
+# Si nada calza (un saludo, una pregunta general) se mandan los items más recientes o con más
+# stock, para que la IA nunca responda sin ver el inventario.
+import math
+from collections import defaultdict
+from texto import Vocabulario, palabras
+
+K_ITEMS = 40
+K_PROTOCOLOS = 5
+K_RESPALDO = 20
+PESO_HISTORIAL = 0.5
+STOPWORDS = {"de", "del", "la", "las", "el", "los", "un", "una", "unos", "unas", "y", "o", "con", "en", "por", "para", "al", "lo",
+             "hoy", "hice", "hize", "use", "usamos", "ocupe", "que", "se", "me", "mi", "mis", "su", "sus", "es", "fue", "ya", "si", "no"}
+
+
+def tokenizar(texto):
+    return [t for t in palabras(texto) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def estimar_tokens(n_caracteres):
+    # Aproximación habitual de ~4 caracteres por token
+    return n_caracteres // 4
+
+
+class IndiceContexto:
+    def __init__(self, df_items, df_prot, bom=None):
+        self.df_items = df_items.reset_index(drop=True)
+        self.df_prot = df_prot.reset_index(drop=True)
+        self.bom = bom
+        self.chars_completo = (len(df_items[['id', 'nombre', 'cantidad_actual']].to_json(orient='records')) if not df_items.empty else 2) + \
+                              (len(df_prot[['nombre', 'materiales_base']].to_json(orient='records')) if not df_prot.empty else 2)
+
+        # Documentos: ("i", fila) para items y ("p", fila) para protocolos
+        self._postings = defaultdict(set)
+        docs = [("i", k, f"{r.get('nombre', '')} {r.get('categoria', '')}") for k, r in self.df_items.iterrows()]
+        docs += [("p", k, f"{r.get('nombre', '')} {r.get('nombre', '')} {r.get('materiales_base', '')}") for k, r in self.df_prot.iterrows()]
+        for tipo, k, texto in docs:
+            for tok in set(tokenizar(texto)): self._postings[tok].add((tipo, k))
+        n = max(len(docs), 1)
+        self._idf = {tok: math.log(1 + n / len(p)) for tok, p in self._postings.items()}
+        self._vocab = Vocabulario(self._postings)
+        self._nombres_prot = [set(tokenizar(n)) for n in self.df_prot['nombre'].astype(str)] if 'nombre' in self.df_prot.columns else []
+        orden = 'updated_at' if 'updated_at' in self.df_items.columns else 'cantidad_actual'
+        self._respaldo = self.df_items.sort_values(orden, ascending=False, kind='stable').index.tolist() if orden in self.df_items.columns else self.df_items.index.tolist()
+
+    def puntajes(self, mensaje, historial=()):
+        puntos = defaultdict(float)
+        consulta = [(q, 1.0) for q in tokenizar(mensaje)] + [(q, PESO_HISTORIAL) for h in historial for q in tokenizar(h)]
+        for q, peso_q in consulta:
+            mejor = {}
+            for tok, peso in self._vocab.expandir(q).items():
+                for doc in self._postings[tok]:
+                    mejor[doc] = max(mejor.get(doc, 0.0), peso * self._idf[tok])
+            for doc, p in mejor.items(): puntos[doc] += peso_q * p
+        return puntos
+
+    def seleccionar(self, mensaje, historial=(), k_items=K_ITEMS, k_prot=K_PROTOCOLOS):
+        """(df_items, df_prot) relevantes. Los reactivos de la receta de cada protocolo elegido
+        y nombrado en el mensaje se incluyen primero, para que la IA tenga sus IDs."""
+        if len(self.df_items) <= k_items and len(self.df_prot) <= k_prot: return self.df_items, self.df_prot
+        puntos = self.puntajes(mensaje, historial)
+        prots = [k for (t, k), _ in sorted(puntos.items(), key=lambda x: -x[1]) if t == "p"][:k_prot]
+        items = []
+        if self.bom is not None:
+            ids = self.df_items['id'].astype(str)
+            # Sólo las recetas de protocolos nombrados en el mensaje: nombrar reactivos también calza
+            # con los protocolos que los usan, y sus recetas desplazarían a esos mismos reactivos.
+            calces = {tok for q in tokenizar(mensaje) for tok in self._vocab.expandir(q)}
+            for k in (k for k in prots if self._nombres_prot[k] & calces):
+                nombre = self.df_prot.at[k, 'nombre']
+                if nombre in self.bom.index:
+                    fila = self.bom.loc[nombre]
+                    items += ids[ids.isin(fila[fila > 0].index)].index.tolist()
+        items += [k for (t, k), _ in sorted(puntos.items(), key=lambda x: -x[1]) if t == "i"]
+        items = list(dict.fromkeys(items))[:k_items] or self._respaldo[:min(K_RESPALDO, k_items)]
+        return self.df_items.loc[items], self.df_prot.loc[prots]
+
+    def estadisticas(self, df_items_sel, df_prot_sel):
+        chars = (len(df_items_sel[['id', 'nombre', 'cantidad_actual']].to_json(orient='records')) if not df_items_sel.empty else 2) + \
+                (len(df_prot_sel[['nombre', 'materiales_base']].to_json(orient='records')) if not df_prot_sel.empty else 2)
+        return {"items_total": len(self.df_items), "items_enviados": len(df_items_sel), "protocolos_total": len(self.df_prot), "protocolos_enviados": len(df_prot_sel),
+                "tokens_completo": estimar_tokens(self.chars_completo), "tokens_enviados": estimar_tokens(chars)}
+
+
+def evaluar_recall(indice, casos, k_items=K_ITEMS):
+    """Recall medio de items esperados en la selección. `casos` = [(mensaje, [ids esperados]), ...]."""
+    if not casos: return 1.0
+    total = 0.0
+    for mensaje, esperados in casos:
+        sel, _ = indice.seleccionar(mensaje, k_items=k_items)
+        total += len(set(map(str, esperados)) & set(sel['id'].astype(str))) / max(len(esperados), 1)
+    return total / len(casos)
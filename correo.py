@@ -0,0 +1,153 @@
+# --- BANDEJA DE SALIDA DE CORREOS ---
+# Los correos se encolan y vuelven al instante; un hilo de fondo los envía reutilizando
+# una sola sesión SMTP (se reconecta si el servidor la cerró y se suelta tras un rato
+# sin uso). Los fallos se reintentan con backoff exponencial y el estado de cada
+# mensaje queda consultable por id; los ya enviados o fallidos se olvidan pasado
+# `retener_s` o al superar `max_retenidos` (None: sin tope).
+import heapq
+import itertools
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class BandejaSalida:
+    def __init__(self, host, puerto, usuario=None, clave=None, starttls=True, reintentos=3, espera_base=2.0, inactividad=60.0, timeout=20.0, medir=None,
+                 retener_s=3600.0, max_retenidos=1000):
+        self.host, self.puerto = host, puerto
+        self.usuario, self.clave = usuario, clave
+        self.starttls = starttls
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.inactividad = inactividad
+        self.timeout = timeout
+        self.retener_s = retener_s
+        self.max_retenidos = max_retenidos
+        # medir(ms, contexto) se llama tras cada intento de envío, con el contexto dado al encolar
+        self.medir = medir
+
+        self._cola = []
+        self._secuencia = itertools.count()
+        self._mensajes = {}
+        self._estados = {}
+        self._finales = deque()  # (momento, id) de los que ya no cambian de estado, del más viejo al más nuevo
+        self._enviando = 0
+        self._cond = threading.Condition()
+        self._detener = False
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self._hilo = threading.Thread(target=self._trabajar, name="bandeja-correo", daemon=True)
+        self._hilo.start()
+
+    # --- API pública ---
+    def encolar(self, mensaje, contexto=None):
+        id_msg = uuid.uuid4().hex
+        with self._cond:
+            self._mensajes[id_msg] = (mensaje, contexto)
+            self._estados[id_msg] = {"id": id_msg, "para": mensaje['To'], "asunto": mensaje['Subject'], "estado": "pendiente", "intentos": 0, "error": None, "enviado_en": None}
+            heapq.heappush(self._cola, (time.monotonic(), next(self._secuencia), id_msg))
+            self._cond.notify()
+        return id_msg
+
+    def estado(self, id_msg):
+        with self._cond:
+            return dict(self._estados.get(id_msg, {"id": id_msg, "estado": "desconocido"}))
+
+    def estados(self):
+        with self._cond:
+            return [dict(e) for e in self._estados.values()]
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que no queden mensajes pendientes. Devuelve False si se agotó el tiempo."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._cola or self._enviando:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0: return False
+                self._cond.wait(restante)
+        return True
+
+    def cerrar(self, timeout=5.0):
+        with self._cond:
+            self._detener = True
+            self._cond.notify_all()
+        self._hilo.join(timeout)
+        self._soltar_conexion()
+
+    # --- Trabajador ---
+    def _conexion(self):
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.puerto, timeout=self.timeout)
+            if self.starttls: smtp.starttls()
+            if self.usuario and self.clave: smtp.login(self.usuario, self.clave)
+            self._smtp = smtp
+        return self._smtp
+
+    def _soltar_conexion(self):
+        if self._smtp is not None:
+            try: self._smtp.quit()
+            except Exception: pass
+            self._smtp = None
+
+    def _enviar(self, mensaje):
+        try:
+            self._conexion().send_message(mensaje)
+        except smtplib.SMTPServerDisconnected:
+            # La sesión reutilizada expiró en el servidor: se reabre una vez sin contar intento
+            self._soltar_conexion()
+            self._conexion().send_message(mensaje)
+        self._ultimo_uso = time.monotonic()
+
+    def _siguiente(self):
+        with self._cond:
+            while not self._detener:
+                ahora = time.monotonic()
+                if self._cola and self._cola[0][0] <= ahora:
+                    _, _, id_msg = heapq.heappop(self._cola)
+                    self._estados[id_msg]['estado'] = "enviando"
+                    self._enviando += 1
+                    return (id_msg, *self._mensajes[id_msg])
+                if not self._cola and self._smtp is not None and ahora - self._ultimo_uso >= self.inactividad:
+                    self._soltar_conexion()
+                espera = self._cola[0][0] - ahora if self._cola else self.inactividad
+                self._cond.wait(max(espera, 0.01))
+            return None, None, None
+
+    def _trabajar(self):
+        while True:
+            id_msg, mensaje, contexto = self._siguiente()
+            if id_msg is None: return
+            t0 = time.perf_counter()
+            try:
+                self._enviar(mensaje)
+                error = None
+            except Exception as e:
+                self._soltar_conexion()
+                error = f"{type(e).__name__}: {e}"
+            if self.medir:
+                try: self.medir((time.perf_counter() - t0) * 1000, contexto)
+                except Exception: pass
+            with self._cond:
+                self._enviando -= 1
+                est = self._estados[id_msg]
+                est['intentos'] += 1
+                if error is None:
+                    est.update(estado="enviado", error=None, enviado_en=time.time())
+                    del self._mensajes[id_msg]
+                elif est['intentos'] < self.reintentos:
+                    est.update(estado="reintentando", error=error)
+                    heapq.heappush(self._cola, (time.monotonic() + self.espera_base * 2 ** (est['intentos'] - 1), next(self._secuencia), id_msg))
+                else:
+                    est.update(estado="error", error=error)
+                    del self._mensajes[id_msg]
+                if id_msg not in self._mensajes:
+                    self._finales.append((time.monotonic(), id_msg))
+                    self._podar()
+                self._cond.notify_all()
+
+    def _podar(self):
+        limite = time.monotonic() - self.retener_s
+        while self._finales and (self._finales[0][0] < limite or (self.max_retenidos is not None and len(self._finales) > self.max_retenidos)):
+            del self._estados[self._finales.popleft()[1]]
@@ -0,0 +1,77 @@
+# --- COSTEO DE PROTOCOLOS (LISTA DE MATERIALES PRE-PARSEADA) ---
+# Cada receta se parsea una vez al guardarse en líneas {item_id, cantidad, unidad};
+# el costeo es álgebra matricial sobre protocolos × items.
+import re
+import numpy as np
+import pandas as pd
+
+PATRON_NUMERO = re.compile(r'\d+(?:[.,]\d+)?')
+PATRON_UNIDAD = re.compile(r'\s*(µl|ul|ml|l|mg|ug|µg|g|kg|un|unidades|placas?|frascos?|tubos?|puntas?)\b', re.IGNORECASE)
+
+
+def patron_nombres(df_items):
+    """Alternancia de nombres de items, los más largos primero (D-PBS gana sobre PBS), como
+    palabras completas: "agua" no calza dentro de "aguas" ni "PBS" dentro de "DPBS"."""
+    nombres = sorted({str(n).strip().lower() for n in df_items['nombre'] if str(n).strip()}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(n) for n in nombres) + r")(?!\w)") if nombres else None
+
+
+def parsear_receta(texto, df_items, patron=None):
+    patron = patron or patron_nombres(df_items)
+    if not texto or patron is None: return []
+    id_por_nombre = dict(zip(df_items['nombre'].astype(str).str.strip().str.lower(), df_items['id'].astype(str)))
+    unidad_por_id = dict(zip(df_items['id'].astype(str), df_items['unidad']))
+    lineas = []
+    for linea in str(texto).split('\n'):
+        if not ("," in linea or ":" in linea or "de" in linea): continue
+        # La coma separa materiales sólo si la sigue un espacio: "2,5 ml" es un decimal
+        for parte in re.split(r',\s|:', linea):
+            num = PATRON_NUMERO.search(parte)
+            nombre = patron.search(parte.lower())
+            if not num or not nombre: continue
+            item_id = id_por_nombre[nombre.group()]
+            unidad = PATRON_UNIDAD.match(parte[num.end():])
+            lineas.append({"item_id": item_id, "cantidad": float(num.group().replace(",", ".")), "unidad": unidad.group(1) if unidad else unidad_por_id.get(item_id, "")})
+    return lineas
+
+
+def matriz_bom(df_prot, df_items):
+    """Cantidades por muestra: filas = protocolos, columnas = id de item."""
+    patron = patron_nombres(df_items)
+    ids = df_items['id'].astype(str)
+    filas = []
+    for _, p in df_prot.iterrows():
+        lineas = p.get('materiales_parseados')
+        if not isinstance(lineas, list): lineas = parsear_receta(p.get('materiales_base', ''), df_items, patron)
+        for ln in lineas: filas.append((p['nombre'], str(ln['item_id']), float(ln['cantidad'])))
+    df_l = pd.DataFrame(filas, columns=['protocolo', 'item_id', 'cantidad'])
+    df_l = df_l[df_l['item_id'].isin(ids)]
+    return df_l.pivot_table(index='protocolo', columns='item_id', values='cantidad', aggfunc='sum', fill_value=0.0).reindex(index=df_prot['nombre'].unique(), columns=ids.unique(), fill_value=0.0)
+
+
+def items_por_id(df_items):
+    d = df_items.drop_duplicates(subset='id')
+    return d.set_index(d['id'].astype(str))
+
+
+def costo_unitario(df_items, columnas):
+    # Mismo criterio que siempre: precio referencial repartido sobre el stock actual
+    d = items_por_id(df_items).reindex(columnas)
+    return np.where((d['precio'] > 0) & (d['cantidad_actual'] > 0), d['precio'] / d['cantidad_actual'].where(d['cantidad_actual'] > 0, 1), 0.0)
+
+
+def simular_costos(bom, df_items, muestras):
+    """Costo total de cada protocolo para cada cantidad de muestras (protocolos × muestras)."""
+    por_muestra = bom.values @ costo_unitario(df_items, bom.columns)
+    return pd.DataFrame(np.outer(por_muestra, np.asarray(muestras, dtype=float)), index=bom.index, columns=list(muestras))
+
+
+def detalle_protocolo(bom, df_items, protocolo, n_muestras):
+    fila = bom.loc[protocolo]
+    fila = fila[fila > 0]
+    d = items_por_id(df_items).loc[fila.index]
+    requerido = fila.values * n_muestras
+    return pd.DataFrame({
+        "Reactivo": d['nombre'].values, "Stock": d['cantidad_actual'].values, "Requerido": requerido, "Unidad": d['unidad'].values,
+        "Costo": requerido * costo_unitario(df_items, fila.index), "Alcanza": d['cantidad_actual'].values >= requerido,
+    })
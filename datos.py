@@ -0,0 +1,279 @@
+# --- CAPA DE ACCESO A DATOS DEL LABORATORIO ---
+# Lecturas normalizadas de Supabase por lab_id. No depende de Streamlit para poder
+# reutilizarse fuera de la app; el cacheo y la invalidación viven en app.py.
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import pandas as pd
+
+TABLAS_LAB = ["items", "protocolos", "equipos_lab", "reservas", "bitacora", "equipo"]
+
+TAMANO_PAGINA = 1000
+
+COLS_TEXTO_ITEMS = ['id', 'nombre', 'categoria', 'ubicacion', 'posicion_caja', 'unidad', 'fecha_vencimiento', 'fecha_cotizacion']
+COLS_NUM_ITEMS = ['cantidad_actual', 'umbral_minimo', 'precio']
+
+
+def normalizar_items(registros):
+    df = pd.DataFrame(registros)
+    for col in COLS_TEXTO_ITEMS:
+        if col not in df.columns: df[col] = ""
+        df[col] = df[col].astype(str).replace(["nan", "None", "NaT"], "")
+    for col in COLS_NUM_ITEMS:
+        if col not in df.columns: df[col] = 0
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['categoria'] = df['categoria'].replace("", "GENERAL")
+    df['vencimiento_dt'] = pd.to_datetime(df['fecha_vencimiento'], errors='coerce', format='mixed')
+    return df
+
+
+def leer_todo(consulta, orden, tamano=TAMANO_PAGINA):
+    """Todas las filas de `consulta()` en páginas de `tamano` (PostgREST limita cada respuesta)."""
+    filas, desde = [], 0
+    while True:
+        q = consulta()
+        for col in orden: q = q.order(col)
+        pagina = q.range(desde, desde + tamano - 1).execute().data
+        filas.extend(pagina)
+        if len(pagina) < tamano: return filas
+        desde += tamano
+
+
+def leer_items(cliente, lab_id):
+    return normalizar_items(leer_todo(lambda: cliente.table("items").select("*").eq("lab_id", lab_id), ["id"]))
+
+
+def leer_protocolos(cliente, lab_id):
+    try:
+        return pd.DataFrame(leer_todo(lambda: cliente.table("protocolos").select("*").eq("lab_id", lab_id), ["id"]))
+    except Exception: return pd.DataFrame(columns=["id", "nombre", "materiales_base"])
+
+
+def normalizar_equipos(registros):
+    df = pd.DataFrame(registros)
+    for col in ['descripcion', 'visibilidad', 'requisitos']:
+        if col not in df.columns: df[col] = ""
+        df[col] = df[col].astype(str).replace(["nan", "None"], "")
+    return df
+
+
+def leer_equipos(cliente, lab_id):
+    try:
+        return normalizar_equipos(leer_todo(lambda: cliente.table("equipos_lab").select("*").eq("lab_id", lab_id), ["id"]))
+    except Exception: return pd.DataFrame(columns=["id", "nombre", "descripcion", "visibilidad", "requisitos"])
+
+
+def leer_reservas(cliente, lab_id):
+    try:
+        return pd.DataFrame(leer_todo(lambda: cliente.table("reservas").select("*").eq("lab_id", lab_id), ["id"]))
+    except Exception: return pd.DataFrame(columns=["id", "equipo_id", "usuario", "fecha_inicio", "fecha_fin"])
+
+
+# --- BITÁCORA PAGINADA (KEYSET SOBRE created_at, id) ---
+TAMANO_PAGINA_BITACORA = 25
+ZONA_HORARIA = 'America/Santiago'
+
+
+def normalizar_bitacora(registros):
+    df = pd.DataFrame(registros)
+    for col in ['id', 'usuario', 'fecha', 'contenido', 'resultado', 'link_adjunto', 'created_at']:
+        if col not in df.columns: df[col] = ""
+    df['hora_local'] = pd.to_datetime(df['created_at'], errors='coerce', utc=True, format='mixed').dt.tz_convert(ZONA_HORARIA).dt.strftime('%H:%M').fillna("")
+    return df
+
+
+def leer_pagina_bitacora(cliente, lab_id, usuario=None, cursor=None, limite=TAMANO_PAGINA_BITACORA):
+    """Una página de la bitácora, más reciente primero. `cursor` es el (created_at, id) de la
+    última fila ya mostrada. Devuelve (df, cursor_siguiente); el cursor es None si no hay más."""
+    try:
+        q = cliente.table("bitacora").select("*").eq("lab_id", lab_id)
+        if usuario: q = q.eq("usuario", usuario)
+        if cursor:
+            creado, id_ = cursor
+            q = q.or_(f'created_at.lt."{creado}",and(created_at.eq."{creado}",id.lt."{id_}")')
+        filas = q.order("created_at", desc=True).order("id", desc=True).limit(limite + 1).execute().data
+    except Exception:
+        if cursor: return normalizar_bitacora([]), None
+        try:
+            q = cliente.table("bitacora").select("*").eq("lab_id", lab_id)
+            if usuario: q = q.eq("usuario", usuario)
+            return normalizar_bitacora(q.order("fecha", desc=True).limit(limite).execute().data), None
+        except Exception: return normalizar_bitacora([]), None
+    siguiente = (filas[limite - 1]['created_at'], filas[limite - 1]['id']) if len(filas) > limite else None
+    return normalizar_bitacora(filas[:limite]), siguiente
+
+
+def leer_equipo(cliente, lab_id):
+    res = cliente.table("equipo").select("nombre").eq("lab_id", lab_id).execute()
+    return [row['nombre'] for row in res.data]
+
+
+# --- GUARDADO POR DIFERENCIAS ---
+TAMANO_LOTE = 500
+
+
+def filas_modificadas(original, editado, clave="id"):
+    """Filas de `editado` que difieren de `original` (comparando por `clave`)."""
+    if editado.empty: return editado
+    ed = editado[~editado[clave].astype(str).str.strip().isin(["", "nan", "None"])]
+    orig = original.drop_duplicates(subset=clave).set_index(clave)
+    base = orig.reindex(ed[clave])[[c for c in ed.columns if c != clave]]
+    nuevo = ed.set_index(clave)[base.columns]
+    iguales = (base == nuevo) | (base.isna() & nuevo.isna())
+    return ed[~iguales.all(axis=1).values]
+
+
+def limpiar_item(d, lab_id):
+    d['lab_id'] = lab_id
+    for num_col in COLS_NUM_ITEMS:
+        if num_col in d:
+            try: d[num_col] = float(d[num_col]) if d[num_col] not in [None, "", "nan", "None"] else 0.0
+            except Exception: d[num_col] = 0.0
+    for date_col in ['fecha_vencimiento', 'fecha_cotizacion']:
+        if date_col in d and str(d[date_col]).strip() in ["", "nan", "NaT", "None"]:
+            d[date_col] = None
+    for str_col in ['categoria', 'ubicacion', 'posicion_caja', 'unidad']:
+        if str_col in d and str(d[str_col]).strip() in ["nan", "None"]:
+            d[str_col] = ""
+    return d
+
+
+def upsert_en_lotes(cliente, tabla, registros, tamano=TAMANO_LOTE):
+    for i in range(0, len(registros), tamano):
+        cliente.table(tabla).upsert(registros[i:i + tamano]).execute()
+    return len(registros)
+
+
+def guardar_cambios(cliente, tabla, original, editado, lab_id, limpiar=None):
+    """Envía sólo las filas editadas en un upsert masivo por lotes. Devuelve cuántas cambiaron."""
+    cambios = filas_modificadas(original, editado)
+    registros = []
+    for d in cambios.astype(object).where(cambios.notna(), None).to_dict(orient="records"):
+        d['lab_id'] = lab_id
+        registros.append(limpiar(d, lab_id) if limpiar else d)
+    return upsert_en_lotes(cliente, tabla, registros)
+
+
+# --- AJUSTES DE STOCK ---
+def ajustar_stock(cliente, lab_id, usuario, ajustes):
+    """Aplica todas las líneas {item_id, delta | fijar, tipo} en una sola llamada atómica
+    (ver sql/003_ajustar_stock.sql). Devuelve {item_id: stock_nuevo}."""
+    if not ajustes: return {}
+    filas = cliente.rpc("ajustar_stock", {"p_lab_id": lab_id, "p_usuario": usuario, "p_ajustes": ajustes}).execute().data or []
+    return {str(f['item_id']): float(f['cantidad_actual']) for f in filas}
+
+
+# --- CONSUMO ESTRUCTURADO POR ENTRADA DE BITÁCORA (sql/006_consumo_bitacora.sql) ---
+def registrar_entrada_bitacora(cliente, lab_id, usuario, contenido, resultado, ajustes, fecha=None):
+    """Inserta la entrada y aplica sus descuentos en una transacción; cada descuento queda en
+    consumo_bitacora ligado a la entrada y a su movimiento. Devuelve el id de la entrada."""
+    return cliente.rpc("registrar_entrada_bitacora", {
+        "p_lab_id": lab_id, "p_usuario": usuario, "p_fecha": (fecha or pd.Timestamp.now(tz=ZONA_HORARIA).date()).isoformat(),
+        "p_contenido": contenido, "p_resultado": resultado, "p_ajustes": ajustes}).execute().data
+
+
+def revertir_entrada_bitacora(cliente, lab_id, usuario, bitacora_id):
+    """Devuelve al stock lo consumido por la entrada y la borra. Devuelve cuántas líneas revirtió."""
+    return cliente.rpc("revertir_entrada_bitacora", {"p_lab_id": lab_id, "p_usuario": usuario, "p_bitacora_id": str(bitacora_id)}).execute().data or 0
+
+
+def leer_consumos_bitacora(cliente, lab_id, bitacora_ids):
+    """Qué consumió cada entrada: bitacora_id, item_id, movimiento_id, cantidad, tipo."""
+    cols = ['bitacora_id', 'item_id', 'movimiento_id', 'cantidad', 'tipo']
+    if not len(bitacora_ids): return pd.DataFrame(columns=cols)
+    res = cliente.table("consumo_bitacora").select(", ".join(cols)).eq("lab_id", lab_id).in_("bitacora_id", [str(b) for b in bitacora_ids]).execute()
+    df = pd.DataFrame(res.data, columns=cols)
+    df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0)
+    return df
+
+
+LECTORES = {
+    "items": leer_items,
+    "protocolos": leer_protocolos,
+    "equipos_lab": leer_equipos,
+    "reservas": leer_reservas,
+    "equipo": leer_equipo,
+}
+
+# Mismo resultado que LECTORES, a partir de registros ya descargados (p. ej. desde espejo.py)
+NORMALIZADORES = {
+    "items": normalizar_items,
+    "protocolos": pd.DataFrame,
+    "equipos_lab": normalizar_equipos,
+    "reservas": pd.DataFrame,
+    "equipo": lambda registros: [row['nombre'] for row in registros],
+}
+
+# Lo que se muestra cuando una tabla secundaria no se pudo cargar (sin items no hay página)
+TABLAS_VACIAS = {
+    "protocolos": lambda: pd.DataFrame(columns=["id", "nombre", "materiales_base"]),
+    "equipos_lab": lambda: pd.DataFrame(columns=["id", "nombre", "descripcion", "visibilidad", "requisitos"]),
+    "reservas": lambda: pd.DataFrame(columns=["id", "equipo_id", "usuario", "fecha_inicio", "fecha_fin"]),
+    "equipo": list,
+}
+
+
+# --- CARGA CONCURRENTE ---
+# Las tablas del laboratorio son independientes: se piden a la vez en un pool compartido
+# y la página espera lo que tarda la más lenta, no la suma. Una tarea que sigue corriendo
+# tras el timeout no se puede cancelar: si las colgadas ocupan la mitad de los hilos, el
+# pool se reemplaza y el viejo termina solo cuando respondan (el cliente HTTP tiene timeout).
+HILOS_CARGA = 8
+TIMEOUT_CARGA_S = 15
+_pool_carga = None
+_colgadas = set()
+_lock_pool = threading.Lock()
+
+
+def pool_carga():
+    global _pool_carga, _colgadas
+    with _lock_pool:
+        if _pool_carga is not None and len(_colgadas) >= HILOS_CARGA // 2:
+            _pool_carga.shutdown(wait=False)
+            _pool_carga, _colgadas = None, set()
+        if _pool_carga is None: _pool_carga = ThreadPoolExecutor(max_workers=HILOS_CARGA, thread_name_prefix="stck-carga")
+        return _pool_carga
+
+
+def _anotar_colgada(futuro):
+    with _lock_pool:
+        colgadas = _colgadas
+        colgadas.add(futuro)
+    # Al terminar sale del conjunto con el que se anotó, aunque el pool ya se haya reemplazado
+    futuro.add_done_callback(lambda f: colgadas.discard(f))
+
+
+def cargar_en_paralelo(tareas, timeout=TIMEOUT_CARGA_S, al_iniciar=None):
+    """Corre {nombre: función sin argumentos} en el pool. Devuelve (resultados, errores): lo que
+    lanzó una excepción o no terminó en `timeout` segundos queda en `errores` como texto.
+    Cada tarea ve las ContextVars del llamador; `al_iniciar()` corre antes en el hilo del pool."""
+    def correr(funcion, contexto):
+        if al_iniciar: al_iniciar()
+        return contexto.run(funcion)
+    futuros = {pool_carga().submit(correr, funcion, contextvars.copy_context()): nombre for nombre, funcion in tareas.items()}
+    hechos, pendientes = wait(futuros, timeout=timeout)
+    resultados, errores = {}, {}
+    for futuro in hechos:
+        try: resultados[futuros[futuro]] = futuro.result()
+        except Exception as e: errores[futuros[futuro]] = f"{type(e).__name__}: {e}"
+    for futuro in pendientes:
+        if not futuro.cancel(): _anotar_colgada(futuro)
+        errores[futuros[futuro]] = f"sin respuesta en {timeout:g} s"
+    return resultados, errores
+
+
+class VersionesLab:
+    """Contador de versión por (lab_id, tabla). Cada escritura sube la versión de las
+    tablas que tocó y así sólo esas lecturas cacheadas quedan obsoletas."""
+
+    def __init__(self):
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def version(self, lab_id, tabla):
+        return self._versiones.get((lab_id, tabla), 0)
+
+    def invalidar(self, lab_id, *tablas):
+        with self._lock:
+            for tabla in tablas:
+                self._versiones[(lab_id, tabla)] = self.version(lab_id, tabla) + 1
@@ -0,0 +1,92 @@
+# --- ESPEJO LOCAL EN SQLITE CON SINCRONIZACIÓN INCREMENTAL ---
+# Copia persistente de las tablas de cada laboratorio. Cada sincronización pide a Supabase sólo
+# las filas con updated_at desde la marca de la anterior y aplica las lápidas de
+# filas_eliminadas (sql/007): borrados y filas que pasaron a otro lab. La marca es el inicio
+# de esa sincronización menos un margen: cubre transacciones que confirmaron tarde y un
+# desfase moderado de reloj con la base, y no depende de que las filas tengan updated_at
+# distintos (tras la migración comparten uno).
+# Las lecturas salen del archivo local; las escrituras siguen yendo a Supabase.
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+TABLAS_ESPEJO = ["items", "protocolos", "equipos_lab", "reservas", "equipo"]
+CLAVES = {"equipo": "email"}
+COLUMNA_MARCA = "updated_at"
+TAMANO_PAGINA = 1000
+SOLAPE_S = 120
+DIAS_LAPIDAS = 30
+
+log = logging.getLogger("stck.espejo")
+
+ESQUEMA = """
+create table if not exists filas (lab_id text not null, tabla text not null, clave text not null, datos text not null, primary key (lab_id, tabla, clave));
+create table if not exists marcas (lab_id text not null, tabla text not null, marca text not null, sincronizado real not null, primary key (lab_id, tabla));
+"""
+
+
+def paginar(consulta, columna, clave, desde=None, tamano=TAMANO_PAGINA):
+    """Recorre `consulta()` ordenado por (columna, clave) con keyset; `desde` filtra columna >= desde."""
+    cursor = None
+    while True:
+        q = consulta()
+        if desde: q = q.gte(columna, desde)
+        if cursor: q = q.or_(f'{columna}.gt."{cursor[0]}",and({columna}.eq."{cursor[0]}",{clave}.gt."{cursor[1]}")')
+        filas = q.order(columna).order(clave).limit(tamano).execute().data
+        yield from filas
+        if len(filas) < tamano: return
+        cursor = (filas[-1][columna], filas[-1][clave])
+
+
+class EspejoLocal:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._con = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._con.execute("pragma journal_mode=wal")
+        self._con.execute("pragma synchronous=normal")
+        self._con.executescript(ESQUEMA)
+        self._lock = threading.Lock()
+
+    def _marca(self, lab_id, tabla):
+        with self._lock:
+            fila = self._con.execute("select marca, sincronizado from marcas where lab_id = ? and tabla = ?", (lab_id, tabla)).fetchone()
+        return fila or (None, None)
+
+    def sincronizar(self, cliente, lab_id, tabla):
+        """Trae lo cambiado desde la última marca. Devuelve (filas_nuevas_o_cambiadas, filas_borradas)."""
+        clave = CLAVES.get(tabla, "id")
+        marca, sincronizado = self._marca(lab_id, tabla)
+        inicio = time.time()
+        nueva_marca = (datetime.fromtimestamp(inicio, timezone.utc) - timedelta(seconds=SOLAPE_S)).isoformat()
+        # Sin marca, o tan vieja que las lápidas pudieron purgarse: copia completa
+        completo = marca is None or inicio - sincronizado > DIAS_LAPIDAS * 86400
+        cambiadas = list(paginar(lambda: cliente.table(tabla).select("*").eq("lab_id", lab_id), COLUMNA_MARCA, clave, None if completo else marca))
+        lapidas = [] if completo else list(paginar(lambda: cliente.table("filas_eliminadas").select("*").eq("lab_id", lab_id).eq("tabla", tabla), "eliminado_en", "id", marca))
+        with self._lock, self._con:
+            if completo: self._con.execute("delete from filas where lab_id = ? and tabla = ?", (lab_id, tabla))
+            # Lápidas antes que cambios: una fila que salió del lab y volvió trae ambas cosas y debe quedar
+            self._con.executemany("delete from filas where lab_id = ? and tabla = ? and clave = ?", [(lab_id, tabla, str(l["fila_id"])) for l in lapidas])
+            self._con.executemany("insert or replace into filas (lab_id, tabla, clave, datos) values (?, ?, ?, ?)",
+                                  [(lab_id, tabla, str(f[clave]), json.dumps(f, ensure_ascii=False, default=str)) for f in cambiadas])
+            self._con.execute("insert or replace into marcas (lab_id, tabla, marca, sincronizado) values (?, ?, ?, ?)", (lab_id, tabla, nueva_marca, inicio))
+        if completo: log.info("Espejo %s/%s: copia completa de %d filas", lab_id, tabla, len(cambiadas))
+        return len(cambiadas), len(lapidas)
+
+    def tiene(self, lab_id, tabla):
+        return self._marca(lab_id, tabla)[0] is not None
+
+    def leer(self, lab_id, tabla):
+        with self._lock:
+            filas = self._con.execute("select datos from filas where lab_id = ? and tabla = ? order by rowid", (lab_id, tabla)).fetchall()
+        return json.loads("[" + ",".join(d for (d,) in filas) + "]")
+
+    def leer_sincronizado(self, cliente, lab_id, tabla):
+        """Sincroniza y lee. Sin conexión, sirve la última copia si existe (y lo deja en el log)."""
+        try: self.sincronizar(cliente, lab_id, tabla)
+        except Exception as e:
+            if not self.tiene(lab_id, tabla): raise
+            log.warning("Espejo %s/%s sin sincronizar, se usa la copia local: %s", lab_id, tabla, e)
+        return self.leer(lab_id, tabla)
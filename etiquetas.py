@@ -0,0 +1,115 @@
+# --- ETIQUETAS QR: RENDER CACHEADO Y HOJAS PDF MASIVAS ---
+# Cada QR se guarda en disco con el hash de su contenido, así que regenerar las etiquetas
+# tras agregar unos pocos reactivos sólo dibuja los nuevos. Los lotes grandes se dibujan
+# en un pool de procesos (forkserver: no se copia el servidor de Streamlit con sus hilos). La
+# caché guarda a lo más MAX_CACHE_QR imágenes y descarta las más antiguas. qrcode y fpdf se
+# importan al generar, no al cargar la app.
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from io import BytesIO
+
+CARPETA_CACHE_QR = os.environ.get("STCK_CACHE_QR", os.path.join(tempfile.gettempdir(), "stck_qr"))
+MAX_CACHE_QR = 5000
+# Windows no tiene forkserver; spawn tampoco hereda los hilos del padre
+INICIO_PROCESOS = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+UMBRAL_PARALELO = 64
+# error_correction 1 = qrcode.constants.ERROR_CORRECT_L (literal para no importar qrcode al cargar)
+PARAMS_QR = {"version": 1, "error_correction": 1, "box_size": 10, "border": 4}
+
+# Hoja A4 de 3 × 8 etiquetas (mm)
+COLUMNAS, FILAS = 3, 8
+MARGEN_X, MARGEN_Y = 7, 10
+ANCHO_ETIQUETA, ALTO_ETIQUETA = 65, 34.6
+LADO_QR = 28
+
+
+def generar_qr(texto, params=None):
+    import qrcode
+    qr = qrcode.QRCode(**(params or PARAMS_QR))
+    qr.add_data(texto)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def ruta_qr(texto):
+    clave = hashlib.sha1(f"{sorted(PARAMS_QR.items())}|{texto}".encode("utf-8")).hexdigest()
+    return os.path.join(CARPETA_CACHE_QR, f"{clave}.png")
+
+
+def _guardar_qr(texto, ruta, params):
+    # Ruta y parámetros llegan como argumentos: el proceso hijo no ve el estado del padre
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: f.write(generar_qr(texto, params))
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def podar_cache(conservar=(), maximo=None):
+    """Borra los PNG más antiguos de la caché hasta dejar `maximo`; nunca los de `conservar`."""
+    maximo = MAX_CACHE_QR if maximo is None else maximo
+    with os.scandir(CARPETA_CACHE_QR) as entradas: pngs = [(e.stat().st_mtime, e.path) for e in entradas if e.name.endswith(".png")]
+    if len(pngs) <= maximo: return 0
+    conservar = set(conservar)
+    sobrantes = [r for _, r in sorted(pngs) if r not in conservar][:len(pngs) - maximo]
+    for ruta in sobrantes:
+        try: os.remove(ruta)
+        except FileNotFoundError: pass
+    return len(sobrantes)
+
+
+def asegurar_qrs(textos, procesos=None):
+    """Ruta PNG de cada texto; sólo se dibujan los que no están en la caché."""
+    os.makedirs(CARPETA_CACHE_QR, exist_ok=True)
+    unicos = list(dict.fromkeys(textos))
+    rutas = {t: ruta_qr(t) for t in unicos}
+    faltantes = [t for t in unicos if not os.path.exists(rutas[t])]
+    if len(faltantes) >= UMBRAL_PARALELO:
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context(INICIO_PROCESOS)) as pool:
+            list(pool.map(_guardar_qr, faltantes, [rutas[t] for t in faltantes], [PARAMS_QR] * len(faltantes),
+                          chunksize=max(len(faltantes) // ((procesos or os.cpu_count() or 1) * 4), 1)))
+    else:
+        for t in faltantes: _guardar_qr(t, rutas[t], PARAMS_QR)
+    if faltantes: podar_cache(rutas.values())
+    return rutas, len(faltantes)
+
+
+def _texto(texto, largo, unicode):
+    texto = str(texto)[:largo]
+    return texto if unicode else texto.encode('latin-1', 'replace').decode('latin-1')
+
+
+def generar_hoja_etiquetas(df_items, procesos=None):
+    """PDF imprimible con una etiqueta (QR + nombre + ubicación + caja) por reactivo.
+    Devuelve (pdf_bytes, qrs_nuevos)."""
+    from fpdf import FPDF
+    from reportes import registrar_fuente
+    rutas, nuevos = asegurar_qrs(df_items['nombre'].astype(str).tolist(), procesos)
+    pdf = FPDF(format='A4')
+    familia, uni = registrar_fuente(pdf)
+    pdf.set_auto_page_break(False)
+    por_hoja = COLUMNAS * FILAS
+    for k, (_, row) in enumerate(df_items.iterrows()):
+        if k % por_hoja == 0: pdf.add_page()
+        col, fila = (k % por_hoja) % COLUMNAS, (k % por_hoja) // COLUMNAS
+        x, y = MARGEN_X + col * ANCHO_ETIQUETA, MARGEN_Y + fila * ALTO_ETIQUETA
+        pdf.rect(x, y, ANCHO_ETIQUETA - 2, ALTO_ETIQUETA - 2)
+        pdf.image(rutas[str(row['nombre'])], x + 1, y + 2, LADO_QR, LADO_QR)
+        tx = x + LADO_QR + 2
+        pdf.set_xy(tx, y + 3)
+        pdf.set_font(familia, 'B', 8)
+        pdf.multi_cell(ANCHO_ETIQUETA - LADO_QR - 5, 3.6, _texto(row['nombre'], 60, uni))
+        pdf.set_font(familia, '', 7)
+        pdf.set_xy(tx, y + 20)
+        pdf.cell(ANCHO_ETIQUETA - LADO_QR - 5, 3.5, _texto(f"Ub: {row.get('ubicacion', '')}", 32, uni))
+        pdf.set_xy(tx, y + 24)
+        pdf.cell(ANCHO_ETIQUETA - LADO_QR - 5, 3.5, _texto(f"Caja: {row.get('posicion_caja', '')}", 32, uni))
+        pdf.set_xy(tx, y + 28)
+        pdf.cell(ANCHO_ETIQUETA - LADO_QR - 5, 3.5, _texto(f"Stck · {date.today()}", 32, uni))
+    return pdf.output(dest='S').encode('latin-1'), nuevos
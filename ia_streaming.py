@@ -0,0 +1,42 @@
+# --- STREAMING DE RESPUESTAS DE GEMINI ---
+# El modelo devuelve un JSON cuyo primer campo es "respuesta_chat"; mientras llegan los
+# tokens se va extrayendo ese texto para mostrarlo, y el JSON completo se parsea al final.
+import json
+import re
+
+PATRON_RESPUESTA = re.compile(r'"respuesta_chat"\s*:\s*"')
+PATRON_JSON = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def respuesta_parcial(buffer):
+    """Texto de "respuesta_chat" recibido hasta ahora (aunque el string no esté cerrado)."""
+    m = PATRON_RESPUESTA.search(buffer)
+    if not m: return ""
+    i = j = m.end()
+    while j < len(buffer):
+        c = buffer[j]
+        if c == '\\':
+            paso = 6 if buffer[j + 1:j + 2] == 'u' else 2
+            if j + paso > len(buffer): break  # escape cortado a la mitad: se espera al siguiente trozo
+            j += paso
+            continue
+        if c == '"': break
+        j += 1
+    crudo = buffer[i:j]
+    try: return json.loads(f'"{crudo}"', strict=False)
+    except ValueError: return crudo
+
+
+def generar_en_streaming(model, prompt, al_avanzar=None):
+    """Llama a Gemini en modo stream, avisando a `al_avanzar(texto_parcial)` con cada trozo.
+    Devuelve (texto_completo, json_o_None)."""
+    texto, mostrado = "", ""
+    for trozo in model.generate_content(prompt, stream=True):
+        try: texto += trozo.text
+        except ValueError: continue  # trozos sin texto (p. ej. sólo metadatos de seguridad)
+        parcial = respuesta_parcial(texto)
+        if al_avanzar and parcial != mostrado:
+            al_avanzar(parcial)
+            mostrado = parcial
+    match = PATRON_JSON.search(texto)
+    return texto, (json.loads(match.group()) if match else None)
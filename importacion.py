@@ -0,0 +1,152 @@
+# --- IMPORTACIÓN POR STREAMING DE LISTAS DE PRECIOS DE PROVEEDORES ---
+# El archivo se lee por bloques (openpyxl en modo read-only, CSV con chunksize), cada fila se
+# valida y normaliza, y los productos se guardan con upsert sobre la clave natural
+# (lab_id, clave_importacion) en lotes acotados. Ver sql/005_items_clave_importacion.sql.
+import csv
+import re
+import numpy as np
+import pandas as pd
+from texto import normalizar
+
+TAMANO_BLOQUE = 2000
+TAMANO_LOTE_IMPORT = 500
+MAX_ERRORES = 1000
+ALIAS_COLUMNAS = {
+    "nombre": {"nombre", "producto", "descripcion", "name", "articulo"},
+    "precio": {"precio", "valor", "price", "precio unitario", "precio neto"},
+    "categoria": {"categoria", "category", "familia", "linea"},
+    "unidad": {"unidad", "unit", "formato", "presentacion"},
+    "codigo": {"codigo", "cod", "sku", "code", "referencia", "ref", "catalogo", "n catalogo"},
+}
+VALORES_PROVEEDOR = {"ubicacion": "Bodega Proveedor", "posicion_caja": "Bodega Proveedor", "lote": "Bodega Proveedor", "cantidad_actual": 9999}
+
+
+def mapear_columnas(encabezados):
+    """{encabezado original: columna estándar}; las columnas desconocidas se ignoran."""
+    mapa = {}
+    for original in encabezados:
+        clave = re.sub(r'[^a-z0-9 ]', '', normalizar(original)).strip()
+        for estandar, alias in ALIAS_COLUMNAS.items():
+            if clave in alias and estandar not in mapa.values():
+                mapa[original] = estandar
+    return mapa
+
+
+def leer_por_bloques(archivo, nombre_archivo, tamano=TAMANO_BLOQUE):
+    """Genera DataFrames de texto con a lo más `tamano` filas y columna `_fila` (fila en el archivo)."""
+    if nombre_archivo.lower().endswith(".csv"):
+        muestra = archivo.read(8192)
+        archivo.seek(0)
+        muestra = muestra.decode("utf-8-sig", "replace") if isinstance(muestra, bytes) else muestra
+        try: sep = csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+        except csv.Error: sep = ","
+        inicio = 2
+        for bloque in pd.read_csv(archivo, sep=sep, dtype=str, chunksize=tamano, encoding="utf-8-sig", encoding_errors="replace", skip_blank_lines=True):
+            bloque['_fila'] = np.arange(inicio, inicio + len(bloque))
+            inicio += len(bloque)
+            yield bloque
+        return
+
+    from openpyxl import load_workbook
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezados = [str(c).strip() if c is not None else f"col_{k}" for k, c in enumerate(next(filas, ()))]
+        ancho = len(encabezados)
+        buffer, numeros = [], []
+        for n, fila in enumerate(filas, start=2):
+            if fila is None or all(c is None for c in fila): continue
+            buffer.append(tuple(fila[:ancho]) + (None,) * (ancho - len(fila)))
+            numeros.append(n)
+            if len(buffer) >= tamano:
+                yield pd.DataFrame(buffer, columns=encabezados, dtype=object).assign(_fila=numeros)
+                buffer, numeros = [], []
+        if buffer: yield pd.DataFrame(buffer, columns=encabezados, dtype=object).assign(_fila=numeros)
+    finally:
+        libro.close()
+
+
+def a_numero(serie):
+    """'$12.990', '12.990,5', '1,290.50', '12,5', 1290 -> float; lo ilegible queda NaN."""
+    texto = serie.astype(str).str.strip().str.replace(r'[^\d,.\-]', '', regex=True)
+    coma, punto = texto.str.rfind(','), texto.str.rfind('.')
+    texto = pd.Series(np.select(
+        [(coma >= 0) & (punto >= 0) & (coma > punto),                     # 12.990,5
+         (coma >= 0) & (punto >= 0),                                      # 1,290.50
+         texto.str.fullmatch(r'-?\d{1,3}(\.\d{3})+').fillna(False)],     # 12.990 (miles)
+        [texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+         texto.str.replace(',', '', regex=False),
+         texto.str.replace('.', '', regex=False)],
+        texto.str.replace(',', '.', regex=False)), index=serie.index)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def clave_natural(nombre, codigo):
+    """'cod:<código>' si viene código; si no 'nom:<nombre en minúsculas, espacios colapsados>'."""
+    nom = "nom:" + nombre.str.strip().str.replace(r'\s+', ' ', regex=True).str.lower()
+    cod = codigo.fillna("").astype(str).str.strip()
+    return nom.where(cod == "", "cod:" + cod.str.lower())
+
+
+def validar_bloque(bloque, lab_id):
+    """(registros válidos, [(fila, motivo), ...]) de un bloque crudo."""
+    df = bloque.rename(columns=mapear_columnas([c for c in bloque.columns if c != '_fila']))
+    if 'nombre' not in df.columns: raise ValueError("El archivo no tiene una columna de nombre (Nombre, Producto o Descripción).")
+    nombre = df['nombre'].where(df['nombre'].notna(), "").astype(str).str.strip()
+    precio = a_numero(df['precio']) if 'precio' in df.columns else pd.Series(np.nan, index=df.index)
+    precio_crudo = df['precio'].notna() & (df['precio'].astype(str).str.strip() != "") if 'precio' in df.columns else pd.Series(False, index=df.index)
+
+    motivos = pd.Series("", index=df.index)
+    motivos = motivos.mask(nombre == "", "Nombre vacío")
+    motivos = motivos.mask((motivos == "") & precio_crudo & precio.isna(), "Precio no numérico")
+    motivos = motivos.mask((motivos == "") & (precio < 0), "Precio negativo")
+    malas = motivos != ""
+    errores = list(zip(df.loc[malas, '_fila'].astype(int), motivos[malas]))
+
+    ok = df[~malas]
+    salida = pd.DataFrame({
+        'nombre': nombre[~malas],
+        'precio': precio[~malas].fillna(0),
+        'categoria': (ok['categoria'].fillna("").astype(str).str.strip().str.upper() if 'categoria' in ok.columns else pd.Series("", index=ok.index)).replace("", "GENERAL"),
+        'unidad': ok['unidad'].fillna("").astype(str).str.strip() if 'unidad' in ok.columns else "",
+        'clave_importacion': clave_natural(nombre[~malas], ok['codigo'] if 'codigo' in ok.columns else pd.Series("", index=ok.index)),
+    }, index=ok.index)
+    for col, valor in VALORES_PROVEEDOR.items(): salida[col] = valor
+    salida['lab_id'] = lab_id
+    # Última aparición gana: Postgres no acepta la misma clave dos veces en un upsert
+    salida = salida.drop_duplicates('clave_importacion', keep='last')
+    return salida.to_dict(orient="records"), errores
+
+
+def importar_catalogo(cliente, archivo, nombre_archivo, lab_id, al_avanzar=None, tamano_lote=TAMANO_LOTE_IMPORT):
+    """Importa la lista de precios por bloques. `al_avanzar(resumen)` se llama tras cada lote."""
+    resumen = {"leidas": 0, "guardadas": 0, "con_error": 0, "repetidas": 0, "errores": []}
+    vistas = set()
+    for bloque in leer_por_bloques(archivo, nombre_archivo):
+        resumen["leidas"] += len(bloque)
+        registros, errores = validar_bloque(bloque, lab_id)
+        resumen["con_error"] += len(errores)
+        resumen["errores"].extend(errores[:MAX_ERRORES - len(resumen["errores"])])
+        resumen["repetidas"] += sum(r['clave_importacion'] in vistas for r in registros) + (len(bloque) - len(errores) - len(registros))
+        vistas.update(r['clave_importacion'] for r in registros)
+        for i in range(0, len(registros), tamano_lote):
+            lote = registros[i:i + tamano_lote]
+            cliente.table("items").upsert(lote, on_conflict="lab_id,clave_importacion").execute()
+            resumen["guardadas"] += len(lote)
+            if al_avanzar: al_avanzar(resumen)
+        if not registros and al_avanzar: al_avanzar(resumen)
+    return resumen
+
+
+def contar_filas(archivo, nombre_archivo):
+    """Total aproximado de filas de datos, para la barra de progreso (None si no se sabe barato)."""
+    if nombre_archivo.lower().endswith(".csv"):
+        total = sum(bloque.count(b"\n") for bloque in iter(lambda: archivo.read(1 << 20), b""))
+        archivo.seek(0)
+        return max(total - 1, 0)
+    from openpyxl import load_workbook
+    libro = load_workbook(archivo, read_only=True)
+    try: filas = libro.worksheets[0].max_row
+    finally: libro.close()
+    archivo.seek(0)
+    return (filas - 1) if filas else None
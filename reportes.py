@@ -0,0 +1,143 @@
+# --- REPORTES PDF DE INVENTARIO ---
+# Las filas se formatean en bloque con pandas y el PDF sólo escribe celdas ya listas.
+# Con una fuente TrueType (DejaVu) los nombres con µ, α, β... salen tal cual; si no hay
+# ninguna instalada se cae a Arial con latin-1. fpdf se importa al generar el primer
+# reporte: la app lee AGRUPACIONES en cada ejecución y no debe cargarlo por eso.
+import os
+from functools import lru_cache
+from datetime import date
+import numpy as np
+import pandas as pd
+from alertas import calcular_alertas
+
+RUTAS_FUENTE = [os.environ.get("STCK_FUENTE_PDF", ""), "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+                "/usr/share/fonts/dejavu/DejaVuSans.ttf", "/Library/Fonts/DejaVuSans.ttf", "C:/Windows/Fonts/DejaVuSans.ttf"]
+AGRUPACIONES = {"Sin agrupar": None, "Por categoría": "categoria", "Por ubicación": "ubicacion"}
+# (columna, título, ancho mm, largo máximo en caracteres)
+COLUMNAS_REPORTE = [("nombre", "Reactivo", 85, 48), ("stock", "Stock", 30, 16), ("ubicacion", "Ubicación", 40, 22), ("vencimiento", "Vencimiento", 35, 18)]
+ALTO_FILA = 6
+
+
+def ruta_fuente_unicode():
+    return next((r for r in RUTAS_FUENTE if r and os.path.exists(r)), None)
+
+
+def registrar_fuente(pdf):
+    """Registra DejaVu (normal y negrita) si está disponible. Devuelve (familia, es_unicode)."""
+    from fpdf import set_global
+    ruta = ruta_fuente_unicode()
+    if ruta is None: return "Arial", False
+    # Sin caché .pkl junto a la fuente: la carpeta del sistema suele ser de sólo lectura
+    set_global("FPDF_CACHE_MODE", 1)
+    negrita = ruta.replace("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")
+    pdf.add_font("DejaVu", "", ruta, uni=True)
+    pdf.add_font("DejaVu", "B", negrita if os.path.exists(negrita) else ruta, uni=True)
+    return "DejaVu", True
+
+
+def texto_pdf(serie, largo, unicode=True):
+    # Con pandas 3, astype(str) deja los NaN como faltantes: se rellenan antes
+    serie = serie.astype(object).fillna("").astype(str).str.slice(0, largo)
+    return serie if unicode else serie.str.encode('latin-1', 'replace').str.decode('latin-1')
+
+
+def formatear_filas(df, unicode=True):
+    """DataFrame de textos listos para las celdas, sin recorrer fila por fila."""
+    cant = df['cantidad_actual'].astype(float)
+    stock = np.where(cant % 1 == 0, cant.round().astype('int64').astype(str), cant.round(3).astype(str))
+    crudo = pd.DataFrame({
+        'nombre': df['nombre'],
+        'stock': pd.Series(stock, index=df.index) + " " + df['unidad'].astype(str),
+        'ubicacion': df['ubicacion'],
+        'vencimiento': df['fecha_vencimiento'],
+    }, index=df.index)
+    return pd.DataFrame({col: texto_pdf(crudo[col], largo, unicode) for col, _, _, largo in COLUMNAS_REPORTE}, index=df.index)
+
+
+class _PaginasInventario:
+    """Encabezado, pie y filas del reporte; se combina con FPDF en clase_reporte()."""
+
+    def __init__(self, titulo, subtitulo):
+        super().__init__()
+        self.titulo, self.subtitulo = titulo, subtitulo
+        self.familia, self.unicode = registrar_fuente(self)
+        self.grupo = None
+        self.alias_nb_pages()
+        self.set_auto_page_break(True, margin=15)
+
+    def t(self, texto):
+        return texto if self.unicode else str(texto).encode('latin-1', 'replace').decode('latin-1')
+
+    def header(self):
+        self.set_font(self.familia, 'B', 14)
+        self.cell(0, 8, self.t(self.titulo), ln=True, align='C')
+        self.set_font(self.familia, '', 9)
+        self.cell(0, 6, self.t(self.subtitulo), ln=True, align='C')
+        if self.grupo is not None:
+            self.set_font(self.familia, 'B', 11)
+            self.cell(0, 8, self.t(self.grupo), ln=True)
+        self.set_font(self.familia, 'B', 9)
+        for _, titulo, ancho, _ in COLUMNAS_REPORTE: self.cell(ancho, 7, self.t(titulo), border=1)
+        self.ln()
+        self.set_font(self.familia, '', 8)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font(self.familia, '', 8)
+        self.cell(0, 6, self.t(f"Página {self.page_no()}/{{nb}}"), align='C')
+
+    def compactar_subset(self):
+        # fpdf 1.7 agrega a 'subset' cada carácter escrito, con repetidos; al cerrar lo
+        # recorre una vez por glifo de la fuente, así que crece y se vuelve cuadrático.
+        for fuente in self.fonts.values():
+            if 'subset' in fuente: fuente['subset'] = sorted(set(fuente['subset']))
+
+    def filas(self, textos, bloque=2000):
+        anchos = [ancho for _, _, ancho, _ in COLUMNAS_REPORTE]
+        for k, fila in enumerate(textos.itertuples(index=False, name=None), 1):
+            for ancho, valor in zip(anchos, fila): self.cell(ancho, ALTO_FILA, valor, border=1)
+            self.ln()
+            if k % bloque == 0: self.compactar_subset()
+        self.compactar_subset()
+
+    def totales(self, etiqueta, t):
+        self.set_font(self.familia, 'B', 8)
+        texto = f"{etiqueta}: {t['reactivos']} reactivos · {t['criticos']} bajo umbral o sin stock · {t['vencidos']} vencidos · valor ${t['valor']:,.0f}"
+        self.cell(0, 7, self.t(texto), ln=True)
+        self.set_font(self.familia, '', 8)
+
+
+@lru_cache(maxsize=None)
+def clase_reporte():
+    from fpdf import FPDF
+    return type("ReporteInventario", (_PaginasInventario, FPDF), {})
+
+
+def calcular_totales(df, alertas):
+    return {"reactivos": len(df), "criticos": int((alertas['bajo_umbral'] | alertas['sin_stock']).sum()),
+            "vencidos": int(alertas['vencido'].sum()), "valor": float(df['precio'].sum()) if 'precio' in df.columns else 0.0}
+
+
+def generar_reporte_inventario(df_items, generado_por="", agrupar=None, hoy=None):
+    """PDF del inventario ordenado por nombre; con `agrupar` ('categoria' o 'ubicacion') cada
+    grupo empieza en página nueva y cierra con sus totales."""
+    hoy = hoy or date.today()
+    pdf = clase_reporte()("Reporte Oficial de Inventario", f"Generado por: {generado_por or 'Stck LIMS'} | Fecha: {hoy}")
+    df = df_items.assign(_orden=df_items['nombre'].astype(str).str.lower()).sort_values('_orden', kind='stable')
+    alertas = calcular_alertas(df, hoy)
+    textos = formatear_filas(df, pdf.unicode)
+
+    if agrupar is None:
+        pdf.add_page()
+        pdf.filas(textos)
+    else:
+        claves = df[agrupar].astype(str).str.strip().replace("", "Sin asignar")
+        for grupo, idx in claves.groupby(claves, sort=True).groups.items():
+            pdf.grupo = f"{'Categoría' if agrupar == 'categoria' else 'Ubicación'}: {grupo}"
+            pdf.add_page()
+            pdf.filas(textos.loc[idx])
+            pdf.totales("Subtotal", calcular_totales(df.loc[idx], alertas.loc[idx]))
+        pdf.grupo = None
+    pdf.totales("Total inventario", calcular_totales(df, alertas))
+    return pdf.output(dest='S').encode('latin-1')
+
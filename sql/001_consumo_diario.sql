@@ -0,0 +1,45 @@
+-- Rollup diario de consumo por item, mantenido incrementalmente desde `movimiento`.
+-- lab_id e item_id se guardan como text, igual que los escribe app.py.
+
+create table if not exists consumo_diario (
+    lab_id   text    not null,
+    item_id  text    not null,
+    dia      date    not null,
+    cantidad numeric not null default 0,
+    primary key (lab_id, item_id, dia)
+);
+
+create table if not exists consumo_watermark (
+    lab_id        text primary key,
+    refrescado_en timestamptz not null default 'epoch'
+);
+
+create index if not exists movimiento_lab_created_idx on movimiento (lab_id, created_at);
+
+-- created_at es el now() de la transacción que insertó el movimiento, no el de su commit: una
+-- fila puede aparecer con created_at anterior a un refresco que no la vio. Por eso cada refresco
+-- recalcula completos (reemplazando los totales) los días desde el del refresco anterior menos
+-- `p_margen`, y así cubre a cualquier transacción que dure menos que ese margen.
+-- Los días en hora de Santiago. El FOR UPDATE serializa refrescos concurrentes del mismo lab.
+create or replace function refrescar_consumo_diario(p_lab_id text, p_margen interval default interval '1 hour')
+returns timestamptz
+language plpgsql
+as $$
+declare
+    v_dia date;
+begin
+    insert into consumo_watermark (lab_id) values (p_lab_id) on conflict (lab_id) do nothing;
+    select ((refrescado_en - p_margen) at time zone 'America/Santiago')::date into v_dia
+    from consumo_watermark where lab_id = p_lab_id for update;
+
+    delete from consumo_diario where lab_id = p_lab_id and dia >= v_dia;
+    insert into consumo_diario (lab_id, item_id, dia, cantidad)
+    select p_lab_id, item_id::text, (created_at at time zone 'America/Santiago')::date, sum(-cantidad_cambio)
+    from movimiento
+    where lab_id = p_lab_id and created_at >= v_dia::timestamp at time zone 'America/Santiago' and cantidad_cambio < 0
+    group by item_id, (created_at at time zone 'America/Santiago')::date;
+
+    update consumo_watermark set refrescado_en = now() where lab_id = p_lab_id;
+    return now();
+end;
+$$;
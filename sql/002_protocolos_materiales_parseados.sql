@@ -0,0 +1,2 @@
+-- Lista de materiales parseada al guardar cada protocolo: [{item_id, cantidad, unidad}, ...]
+alter table protocolos add column if not exists materiales_parseados jsonb;
@@ -0,0 +1,47 @@
+-- Ajuste de stock atómico y por lotes. Cada línea de p_ajustes es
+--   {"item_id": "...", "delta": -2.5, "tipo": "Uso IA: ..."}  o  {"item_id": "...", "fijar": 10, "tipo": "..."}
+-- Aplica las líneas en una sola transacción (bloqueando las filas de items en orden de id
+-- para evitar deadlocks), escribe un movimiento por línea y devuelve el stock resultante.
+-- p_lab_id llega como text y se convierte una vez al tipo de items.lab_id (text o uuid según
+-- el proyecto): las columnas se comparan sin cast y así pueden usar sus índices.
+
+create or replace function ajustar_stock(p_lab_id text, p_usuario text, p_ajustes jsonb)
+returns table (item_id text, nombre text, cantidad_actual numeric, cantidad_cambio numeric)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    r        record;
+    v_lab    items.lab_id%type := p_lab_id;
+    v_id     items.id%type;
+    v_previo numeric;
+    v_nuevo  numeric;
+    v_nombre text;
+begin
+    for r in
+        select x.item_id as id_txt, x.delta, x.fijar, x.tipo
+        from rows from (jsonb_to_recordset(p_ajustes) as (item_id text, delta numeric, fijar numeric, tipo text))
+             with ordinality as x(item_id, delta, fijar, tipo, n)
+        order by x.item_id, x.n
+    loop
+        v_id := r.id_txt;
+        select i.cantidad_actual, i.nombre into v_previo, v_nombre
+        from items i where i.id = v_id and i.lab_id = v_lab
+        for update;
+        if not found then
+            continue;
+        end if;
+
+        v_nuevo := coalesce(r.fijar, coalesce(v_previo, 0) + coalesce(r.delta, 0));
+        update items i set cantidad_actual = v_nuevo where i.id = v_id;
+        insert into movimiento (item_id, nombre_item, cantidad_cambio, tipo, usuario, lab_id)
+        values (r.id_txt, v_nombre, v_nuevo - coalesce(v_previo, 0), r.tipo, p_usuario, v_lab);
+
+        item_id := r.id_txt;
+        nombre := v_nombre;
+        cantidad_actual := v_nuevo;
+        cantidad_cambio := v_nuevo - coalesce(v_previo, 0);
+        return next;
+    end loop;
+end;
+$$;
@@ -0,0 +1,47 @@
+-- Dos reservas del mismo equipo no pueden solaparse. La restricción cierra la carrera entre
+-- usuarios que agendan a la vez y su índice GiST sirve las consultas por ventana de tiempo.
+--
+-- Antes de aplicarla en una base con datos, revisar los choques que ya existen: crear sólo la
+-- vista reservas_solapadas (la primera sentencia después de la extensión) y consultarla con
+--
+--   select * from reservas_solapadas;
+--
+-- Cada fila es un par de reservas del mismo equipo cuyos horarios se cruzan. Se resuelven a mano,
+-- hablando con quienes reservaron: mover o acortar una de las dos, o borrar la que sobra si es
+-- un duplicado (mismo usuario y horario). Con la vista vacía la restricción se aplica; si aún
+-- hay choques, la migración se detiene con un error que los lista y no cambia nada.
+-- Se puede volver a correr: si la restricción ya existe, no hace nada.
+create extension if not exists btree_gist;
+
+create or replace view reservas_solapadas as
+select a.equipo_id,
+       a.id as reserva, a.usuario, a.fecha_inicio, a.fecha_fin,
+       b.id as choca_con, b.usuario as usuario_choque, b.fecha_inicio as inicio_choque, b.fecha_fin as fin_choque
+from reservas a
+join reservas b
+  on b.equipo_id = a.equipo_id and b.id::text > a.id::text
+ and tstzrange(a.fecha_inicio, a.fecha_fin, '[)') && tstzrange(b.fecha_inicio, b.fecha_fin, '[)')
+order by a.equipo_id, a.fecha_inicio;
+
+do $$
+declare
+    v_choques text;
+    v_total   integer;
+begin
+    if exists (select 1 from pg_constraint where conname = 'reservas_sin_solape' and conrelid = 'reservas'::regclass) then
+        return;
+    end if;
+
+    select count(*) into v_total from reservas_solapadas;
+    if v_total > 0 then
+        select string_agg(format('%s ↔ %s (equipo %s)', s.reserva, s.choca_con, s.equipo_id), ', ') into v_choques
+        from (select * from reservas_solapadas limit 20) s;
+        raise exception '% pares de reservas se solapan; resolverlos antes de aplicar reservas_sin_solape: %', v_total, v_choques
+            using hint = 'select * from reservas_solapadas';
+    end if;
+
+    alter table reservas
+        add constraint reservas_sin_solape
+        exclude using gist (equipo_id with =, tstzrange(fecha_inicio, fecha_fin, '[)') with &&);
+end;
+$$;
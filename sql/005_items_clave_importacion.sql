@@ -0,0 +1,20 @@
+-- Clave natural de los productos de proveedor: 'cod:<código>' o 'nom:<nombre en minúsculas>'.
+-- Las re-subidas de listas de precios hacen upsert sobre (lab_id, clave_importacion) en vez
+-- de duplicar el catálogo. Los items de laboratorio la dejan en null y no compiten por ella.
+alter table items add column if not exists clave_importacion text;
+
+-- Catálogos ya cargados: la clave se asigna a una sola fila por nombre; las copias que dejaron
+-- las subidas anteriores quedan sin clave para limpiarlas a mano.
+update items i
+set clave_importacion = x.clave
+from (
+    select distinct on (it.lab_id, lower(regexp_replace(trim(it.nombre), '\s+', ' ', 'g')))
+           it.id, 'nom:' || lower(regexp_replace(trim(it.nombre), '\s+', ' ', 'g')) as clave
+    from items it
+    join equipo e on e.lab_id = it.lab_id and e.rol = 'proveedor'
+    where it.clave_importacion is null and coalesce(trim(it.nombre), '') <> ''
+    order by it.lab_id, lower(regexp_replace(trim(it.nombre), '\s+', ' ', 'g')), it.id desc
+) x
+where i.id = x.id;
+
+create unique index if not exists items_lab_clave_importacion on items (lab_id, clave_importacion);
@@ -0,0 +1,129 @@
+-- Consumo estructurado de cada entrada de bitácora: una fila por reactivo descontado, ligada
+-- a la entrada y al movimiento que la aplicó. Reemplaza el leer los descuentos desde el HTML
+-- de `resultado` y permite consultar qué consumió cada experimento.
+
+create table if not exists consumo_bitacora (
+    id            bigint generated always as identity primary key,
+    bitacora_id   text    not null,
+    lab_id        text    not null,
+    item_id       text    not null,
+    movimiento_id text,
+    cantidad      numeric not null,
+    tipo          text,
+    created_at    timestamptz not null default now()
+);
+
+create index if not exists consumo_bitacora_entrada_idx on consumo_bitacora (lab_id, bitacora_id);
+create index if not exists consumo_bitacora_item_idx on consumo_bitacora (lab_id, item_id);
+
+-- Entradas anteriores a esta migración: se rescatan una vez desde el HTML (sin movimiento_id).
+insert into consumo_bitacora (bitacora_id, lab_id, item_id, cantidad, tipo)
+select b.id::text, b.lab_id, m[2], m[1]::numeric, 'Migrado desde HTML'
+from bitacora b
+cross join lateral regexp_matches(coalesce(b.resultado, ''), '📉\s*([0-9]+(?:\.[0-9]+)?)[^<]*<span data-id=''([^'']+)''', 'g') as m
+where not exists (select 1 from consumo_bitacora c where c.bitacora_id = b.id::text);
+
+-- ajustar_stock (sql/003) gana p_bitacora_id: si viene, cada línea con delta negativo deja su
+-- fila de consumo ligada al movimiento que insertó. Como en sql/003, p_lab_id se convierte una
+-- vez al tipo de lab_id de la tabla que se consulta y las columnas nunca se castean.
+drop function if exists ajustar_stock(text, text, jsonb);
+
+create or replace function ajustar_stock(p_lab_id text, p_usuario text, p_ajustes jsonb, p_bitacora_id text default null)
+returns table (item_id text, nombre text, cantidad_actual numeric, cantidad_cambio numeric)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    r        record;
+    v_lab    items.lab_id%type := p_lab_id;
+    v_id     items.id%type;
+    v_previo numeric;
+    v_nuevo  numeric;
+    v_nombre text;
+    v_mov    text;
+begin
+    for r in
+        select x.item_id as id_txt, x.delta, x.fijar, x.tipo
+        from rows from (jsonb_to_recordset(p_ajustes) as (item_id text, delta numeric, fijar numeric, tipo text))
+             with ordinality as x(item_id, delta, fijar, tipo, n)
+        order by x.item_id, x.n
+    loop
+        v_id := r.id_txt;
+        select i.cantidad_actual, i.nombre into v_previo, v_nombre
+        from items i where i.id = v_id and i.lab_id = v_lab
+        for update;
+        if not found then
+            continue;
+        end if;
+
+        v_nuevo := coalesce(r.fijar, coalesce(v_previo, 0) + coalesce(r.delta, 0));
+        update items i set cantidad_actual = v_nuevo where i.id = v_id;
+        insert into movimiento (item_id, nombre_item, cantidad_cambio, tipo, usuario, lab_id)
+        values (r.id_txt, v_nombre, v_nuevo - coalesce(v_previo, 0), r.tipo, p_usuario, v_lab)
+        returning movimiento.id::text into v_mov;
+
+        if p_bitacora_id is not null and v_nuevo < coalesce(v_previo, 0) then
+            insert into consumo_bitacora (bitacora_id, lab_id, item_id, movimiento_id, cantidad, tipo)
+            values (p_bitacora_id, p_lab_id, r.id_txt, v_mov, coalesce(v_previo, 0) - v_nuevo, r.tipo);
+        end if;
+
+        item_id := r.id_txt;
+        nombre := v_nombre;
+        cantidad_actual := v_nuevo;
+        cantidad_cambio := v_nuevo - coalesce(v_previo, 0);
+        return next;
+    end loop;
+end;
+$$;
+
+-- Inserta la entrada y aplica sus descuentos en la misma transacción. Devuelve el id de la entrada.
+create or replace function registrar_entrada_bitacora(p_lab_id text, p_usuario text, p_fecha date, p_contenido text, p_resultado text, p_ajustes jsonb)
+returns text
+language plpgsql
+as $$
+declare
+    v_lab      bitacora.lab_id%type := p_lab_id;
+    v_bitacora text;
+begin
+    insert into bitacora (lab_id, usuario, fecha, contenido, resultado)
+    values (v_lab, p_usuario, p_fecha, p_contenido, p_resultado)
+    returning bitacora.id::text into v_bitacora;
+
+    perform ajustar_stock(p_lab_id, p_usuario, coalesce(p_ajustes, '[]'::jsonb), v_bitacora);
+    return v_bitacora;
+end;
+$$;
+
+-- Devuelve al stock todo lo que consumió la entrada y la borra, en una sola transacción.
+-- Los descuentos se leen solo de consumo_bitacora: la app ya no escribe el formato HTML con
+-- `<span data-id=...>` y las entradas antiguas se convirtieron arriba. Si aun así llega una
+-- entrada con ese HTML y sin filas de consumo, se rechaza en vez de borrarla sin devolver stock.
+create or replace function revertir_entrada_bitacora(p_lab_id text, p_usuario text, p_bitacora_id text)
+returns integer
+language plpgsql
+as $$
+declare
+    v_lab     bitacora.lab_id%type := p_lab_id;
+    v_id      bitacora.id%type := p_bitacora_id;
+    v_ajustes jsonb;
+    v_lineas  integer;
+begin
+    select coalesce(jsonb_agg(jsonb_build_object('item_id', c.item_id, 'delta', c.cantidad, 'tipo', 'Reversión (Borrado de Bitácora)')), '[]'::jsonb), count(*)
+    into v_ajustes, v_lineas
+    from consumo_bitacora c
+    where c.lab_id = p_lab_id and c.bitacora_id = p_bitacora_id;
+
+    if v_lineas = 0 and exists (
+        select 1 from bitacora b
+        where b.id = v_id and b.lab_id = v_lab and b.resultado ~ '📉[^<]*<span data-id='
+    ) then
+        raise exception 'La entrada % tiene descuentos en formato HTML sin filas en consumo_bitacora', p_bitacora_id
+            using errcode = 'P0001', hint = 'Vuelva a ejecutar la conversión de sql/006_consumo_bitacora.sql';
+    end if;
+
+    perform ajustar_stock(p_lab_id, p_usuario, v_ajustes);
+    delete from consumo_bitacora c where c.lab_id = p_lab_id and c.bitacora_id = p_bitacora_id;
+    delete from bitacora b where b.id = v_id and b.lab_id = v_lab;
+    return v_lineas;
+end;
+$$;
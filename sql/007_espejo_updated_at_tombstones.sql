@@ -0,0 +1,70 @@
+-- Soporte para el espejo local (espejo.py): cada tabla del laboratorio lleva `updated_at`,
+-- que un trigger renueva en cada update, y los borrados dejan una lápida en `filas_eliminadas`.
+-- También la deja un update que cambia el lab_id (o la clave) de la fila: para el espejo del
+-- lab anterior es un borrado.
+-- El espejo pide sólo lo cambiado desde su última marca y aplica las lápidas.
+
+create table if not exists filas_eliminadas (
+    id           bigint generated always as identity primary key,
+    tabla        text        not null,
+    lab_id       text,
+    fila_id      text        not null,
+    eliminado_en timestamptz not null default now()
+);
+
+create index if not exists filas_eliminadas_lab_idx on filas_eliminadas (lab_id, tabla, eliminado_en, id);
+
+create or replace function tocar_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+-- TG_ARGV[0] es la columna que identifica la fila en el espejo (id, o email en `equipo`).
+-- Sirve para delete y para update: en ambos la lápida lleva el lab_id y la clave de OLD.
+create or replace function registrar_fila_eliminada()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into filas_eliminadas (tabla, lab_id, fila_id)
+    values (TG_TABLE_NAME, to_jsonb(old) ->> 'lab_id', to_jsonb(old) ->> TG_ARGV[0]);
+    return old;
+end;
+$$;
+
+do $$
+declare
+    t     record;
+begin
+    for t in select * from (values ('items', 'id'), ('protocolos', 'id'), ('equipos_lab', 'id'), ('reservas', 'id'), ('equipo', 'email')) as x(tabla, clave)
+    loop
+        -- Las filas existentes quedan con la misma marca; el espejo pagina por (updated_at, clave).
+        execute format('alter table %I add column if not exists updated_at timestamptz not null default now()', t.tabla);
+        execute format('create index if not exists %I on %I (lab_id, updated_at, %I)', t.tabla || '_lab_updated_idx', t.tabla, t.clave);
+        execute format('drop trigger if exists %I on %I', t.tabla || '_updated_at', t.tabla);
+        execute format('create trigger %I before update on %I for each row execute function tocar_updated_at()', t.tabla || '_updated_at', t.tabla);
+        execute format('drop trigger if exists %I on %I', t.tabla || '_lapida', t.tabla);
+        execute format('create trigger %I after delete on %I for each row execute function registrar_fila_eliminada(%L)', t.tabla || '_lapida', t.tabla, t.clave);
+        execute format('drop trigger if exists %I on %I', t.tabla || '_lapida_traslado', t.tabla);
+        execute format('create trigger %I after update on %I for each row when (old.lab_id is distinct from new.lab_id or old.%I is distinct from new.%I) '
+                       'execute function registrar_fila_eliminada(%L)', t.tabla || '_lapida_traslado', t.tabla, t.clave, t.clave, t.clave);
+    end loop;
+end;
+$$;
+
+-- Las lápidas sólo hacen falta mientras algún espejo pueda estar atrasado; un espejo con más de
+-- 30 días sin sincronizar se rehace completo (DIAS_LAPIDAS en espejo.py).
+create or replace function purgar_filas_eliminadas(p_dias integer default 30)
+returns integer
+language sql
+as $$
+    with borradas as (
+        delete from filas_eliminadas where eliminado_en < now() - make_interval(days => p_dias) returning 1
+    )
+    select count(*)::integer from borradas;
+$$;
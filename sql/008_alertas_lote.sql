@@ -0,0 +1,54 @@
+-- Soporte para alertas_lote.py: el refresco del rollup de consumo de todos los laboratorios en
+-- una llamada y la tabla donde queda el resultado de cada corrida.
+
+-- Refresca el rollup de cada laboratorio con refrescar_consumo_diario (sql/001), en orden de
+-- lab_id para tomar los bloqueos de consumo_watermark siempre en el mismo orden.
+create or replace function refrescar_consumo_diario_todos()
+returns integer
+language plpgsql
+as $$
+declare
+    v_lab  text;
+    v_labs integer := 0;
+begin
+    for v_lab in
+        select lab_id::text from equipo where lab_id is not null
+        union
+        select lab_id from consumo_watermark
+        order by 1
+    loop
+        perform refrescar_consumo_diario(v_lab);
+        v_labs := v_labs + 1;
+    end loop;
+    return v_labs;
+end;
+$$;
+
+create table if not exists alertas_lab (
+    id           bigint generated always as identity primary key,
+    lab_id       text        not null,
+    item_id      text        not null,
+    tipo         text        not null,  -- vencido | por_vencer | critico | consumo_rapido
+    nombre       text,
+    detalle      jsonb,
+    calculado_en timestamptz not null
+);
+
+create index if not exists alertas_lab_lab_idx on alertas_lab (lab_id, tipo);
+
+-- Reemplaza las alertas de `p_labs` en una transacción: un lab sin alertas queda vacío.
+create or replace function reemplazar_alertas(p_labs text[], p_calculado_en timestamptz, p_alertas jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+    v_filas integer;
+begin
+    delete from alertas_lab where lab_id = any(p_labs);
+    insert into alertas_lab (lab_id, item_id, tipo, nombre, detalle, calculado_en)
+    select x.lab_id, x.item_id, x.tipo, x.nombre, x.detalle, p_calculado_en
+    from jsonb_to_recordset(coalesce(p_alertas, '[]'::jsonb)) as x(lab_id text, item_id text, tipo text, nombre text, detalle jsonb);
+    get diagnostics v_filas = row_count;
+    return v_filas;
+end;
+$$;
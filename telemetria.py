@@ -0,0 +1,135 @@
+# --- TELEMETRÍA: SPANS DE TIEMPO POR LABORATORIO Y PESTAÑA ---
+# Cada span mide una llamada a Supabase, a Gemini, un envío SMTP o una sección de la UI y
+# se agrega por (lab, pestaña, tipo, nombre) en una ventana acotada de muestras, de donde
+# salen p50/p95 e histogramas. Los spans que superan el umbral de su tipo se registran en
+# el logger "stck.lento". El laboratorio y la pestaña actuales viajan en ContextVars.
+import csv
+import io
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+
+MUESTRAS_POR_CLAVE = 500
+MAX_LENTOS = 200
+# Cotas superiores (ms) de los baldes del histograma; el último balde es "más de 10 s"
+BALDES_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+UMBRALES_MS = {"supabase": 1000, "llm": 8000, "correo": 5000, "ui": 3000, "pdf": 5000}
+
+log_lento = logging.getLogger("stck.lento")
+lab_actual = ContextVar("lab_actual", default="-")
+pestana_actual = ContextVar("pestana_actual", default="General")
+
+
+class Telemetria:
+    def __init__(self, umbrales=None, muestras=MUESTRAS_POR_CLAVE):
+        self.umbrales = {**UMBRALES_MS, **(umbrales or {})}
+        self._muestras = defaultdict(lambda: deque(maxlen=muestras))
+        self._totales = defaultdict(int)
+        self._lentos = deque(maxlen=MAX_LENTOS)
+        self._lock = threading.Lock()
+
+    def registrar(self, tipo, nombre, ms, lab=None, pestana=None):
+        clave = (lab or lab_actual.get(), pestana or pestana_actual.get(), tipo, nombre)
+        with self._lock:
+            self._muestras[clave].append(ms)
+            self._totales[clave] += 1
+        umbral = self.umbrales.get(tipo)
+        if umbral is not None and ms > umbral:
+            evento = {"momento": time.strftime("%Y-%m-%d %H:%M:%S"), "lab": clave[0], "pestana": clave[1], "tipo": tipo, "nombre": nombre, "ms": round(ms, 1), "umbral_ms": umbral}
+            with self._lock: self._lentos.append(evento)
+            log_lento.warning("Lento %s %s: %.0f ms (umbral %d ms) lab=%s pestaña=%s", tipo, nombre, ms, umbral, clave[0], clave[1])
+
+    @contextmanager
+    def span(self, tipo, nombre):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.registrar(tipo, nombre, (time.perf_counter() - t0) * 1000)
+
+    @contextmanager
+    def seccion(self, pestana):
+        """Marca la pestaña actual para los spans internos y mide la sección completa."""
+        token = pestana_actual.set(pestana)
+        try:
+            with self.span("ui", pestana): yield
+        finally: pestana_actual.reset(token)
+
+    def resumen(self, lab=None):
+        """Una fila por (pestaña, tipo, nombre) con n, p50, p95, máximo e histograma."""
+        with self._lock: datos = {k: (np.array(v), self._totales[k]) for k, v in self._muestras.items() if lab is None or k[0] == lab}
+        filas = []
+        for (lab_k, pestana, tipo, nombre), (ms, total) in sorted(datos.items()):
+            conteo = np.bincount(np.searchsorted(BALDES_MS, ms, side="left"), minlength=len(BALDES_MS) + 1)
+            filas.append({"lab": lab_k, "pestana": pestana, "tipo": tipo, "nombre": nombre, "n": int(total), "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                          "p95_ms": round(float(np.percentile(ms, 95)), 1), "max_ms": round(float(ms.max()), 1),
+                          "histograma": {(f"<={b}" if b != np.inf else f">{BALDES_MS[-1]}"): int(c) for b, c in zip(BALDES_MS + [np.inf], conteo)}})
+        return filas
+
+    def lentos(self, lab=None):
+        with self._lock: return [e for e in self._lentos if lab is None or e["lab"] == lab]
+
+    def exportar_json(self, lab=None):
+        return json.dumps({"resumen": self.resumen(lab), "lentos": self.lentos(lab), "umbrales_ms": self.umbrales}, ensure_ascii=False, indent=2)
+
+    def exportar_csv(self, lab=None):
+        buf = io.StringIO()
+        campos = ["lab", "pestana", "tipo", "nombre", "n", "p50_ms", "p95_ms", "max_ms"] + [f"<={b}" for b in BALDES_MS] + [f">{BALDES_MS[-1]}"]
+        escritor = csv.DictWriter(buf, fieldnames=campos)
+        escritor.writeheader()
+        for fila in self.resumen(lab):
+            escritor.writerow({**{k: v for k, v in fila.items() if k != "histograma"}, **fila["histograma"]})
+        return buf.getvalue()
+
+
+# --- ENVOLTORIOS: miden sin tocar cada llamada de la app ---
+class _ConsultaMedida:
+    def __init__(self, consulta, telemetria, nombre):
+        self._consulta, self._tel, self._nombre = consulta, telemetria, nombre
+
+    def execute(self, *args, **kwargs):
+        with self._tel.span("supabase", self._nombre): return self._consulta.execute(*args, **kwargs)
+
+    def __getattr__(self, atributo):
+        metodo = getattr(self._consulta, atributo)
+        if not callable(metodo): return metodo
+        def encadenar(*args, **kwargs):
+            res = metodo(*args, **kwargs)
+            # select/insert/upsert/update/delete definen la operación que se reporta
+            nombre = f"{self._nombre.split('.')[0]}.{atributo}" if atributo in ("select", "insert", "upsert", "update", "delete") else self._nombre
+            return _ConsultaMedida(res, self._tel, nombre) if hasattr(res, "execute") else res
+        return encadenar
+
+
+class ClienteMedido:
+    """Proxy del cliente de Supabase: table(...)...execute() y rpc(...).execute() quedan medidos."""
+
+    def __init__(self, cliente, telemetria):
+        self._cliente, self._tel = cliente, telemetria
+
+    def table(self, nombre): return _ConsultaMedida(self._cliente.table(nombre), self._tel, f"{nombre}.select")
+    def rpc(self, nombre, *args, **kwargs): return _ConsultaMedida(self._cliente.rpc(nombre, *args, **kwargs), self._tel, f"rpc.{nombre}")
+    def __getattr__(self, atributo): return getattr(self._cliente, atributo)
+
+
+class ModeloMedido:
+    """Proxy de GenerativeModel: mide generate_content; en streaming, hasta el último trozo."""
+
+    def __init__(self, modelo, telemetria):
+        self._modelo, self._tel = modelo, telemetria
+
+    def generate_content(self, *args, stream=False, **kwargs):
+        if not stream:
+            with self._tel.span("llm", "gemini.generate_content"): return self._modelo.generate_content(*args, **kwargs)
+        return self._stream(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        lab, pestana = lab_actual.get(), pestana_actual.get()
+        try: yield from self._modelo.generate_content(*args, stream=True, **kwargs)
+        finally: self._tel.registrar("llm", "gemini.stream", (time.perf_counter() - t0) * 1000, lab, pestana)
+
+    def __getattr__(self, atributo): return getattr(self._modelo, atributo)
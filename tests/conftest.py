@@ -0,0 +1,108 @@
+# --- BASE POSTGRES PARA LAS PRUEBAS DE sql/ ---
+# Las funciones de sql/ se prueban contra un Postgres real: el de STCK_TEST_PG (URI de
+# conexión) o, si no está, uno temporal levantado con pgserver. Sin ninguno, esas pruebas se
+# saltan. Cada prueba recibe una base nueva con el esquema mínimo de Supabase que usa la app
+# y las migraciones que pida. `servidor_smtp` levanta un SMTP local con aiosmtpd.
+import os
+import socket
+import tempfile
+import time
+import uuid
+from pathlib import Path
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+ESQUEMA_BASE = """
+create table items (
+    id text primary key default gen_random_uuid()::text, lab_id text, nombre text, categoria text, ubicacion text,
+    cantidad_actual numeric default 0, umbral_minimo numeric default 0, unidad text, fecha_vencimiento date
+);
+create table movimiento (
+    id bigint generated always as identity primary key, item_id text, nombre_item text, cantidad_cambio numeric,
+    tipo text, usuario text, lab_id text, created_at timestamptz not null default now()
+);
+create table bitacora (
+    id bigint generated always as identity primary key, lab_id text, usuario text, fecha date, contenido text,
+    resultado text, link_adjunto text, created_at timestamptz not null default now()
+);
+create table equipo (email text primary key, lab_id text, rol text, nombre text);
+create table protocolos (id text primary key default gen_random_uuid()::text, lab_id text, nombre text, materiales_base text);
+create table equipos_lab (id text primary key default gen_random_uuid()::text, lab_id text, nombre text);
+create table reservas (
+    id text primary key default gen_random_uuid()::text, lab_id text, equipo_id text, usuario text,
+    fecha_inicio timestamptz, fecha_fin timestamptz
+);
+"""
+
+
+@pytest.fixture(scope="session")
+def uri_postgres():
+    uri = os.environ.get("STCK_TEST_PG")
+    if uri:
+        yield uri
+        return
+    pgserver = pytest.importorskip("pgserver")
+    with tempfile.TemporaryDirectory() as directorio:
+        servidor = pgserver.get_server(directorio, cleanup_mode="stop")
+        yield servidor.get_uri()
+        servidor.cleanup()
+
+
+@pytest.fixture
+def base_pg(uri_postgres):
+    """base_pg(*migraciones) crea una base vacía con ESQUEMA_BASE y esos archivos de sql/;
+    devuelve su cadena de conexión. Se borra al terminar la prueba."""
+    psycopg = pytest.importorskip("psycopg")
+    creadas = []
+
+    def crear(*migraciones):
+        nombre = f"stck_{uuid.uuid4().hex[:12]}"
+        with psycopg.connect(uri_postgres, autocommit=True) as con: con.execute(f"create database {nombre}")
+        creadas.append(nombre)
+        conninfo = psycopg.conninfo.make_conninfo(uri_postgres, dbname=nombre)
+        with psycopg.connect(conninfo, autocommit=True) as con:
+            con.execute(ESQUEMA_BASE)
+            for archivo in migraciones: con.execute((RAIZ / "sql" / archivo).read_text())
+        return conninfo
+
+    yield crear
+    with psycopg.connect(uri_postgres, autocommit=True) as con:
+        for nombre in creadas: con.execute(f"drop database if exists {nombre} with (force)")
+
+
+class Buzon:
+    """Handler de aiosmtpd: guarda cada DATA con su sesión; responde `codigo` a los primeros `rechazos`."""
+
+    def __init__(self, rechazos=0, codigo="451 Intente más tarde"):
+        self.rechazos, self.codigo = rechazos, codigo
+        self.recibidos, self.sesiones, self.intentos = [], [], []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.intentos.append(time.monotonic())
+        if session not in self.sesiones: self.sesiones.append(session)
+        if self.rechazos:
+            self.rechazos -= 1
+            return self.codigo
+        self.recibidos.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def servidor_smtp():
+    """servidor_smtp(**kw) arranca un SMTP en un puerto libre; devuelve (buzón, puerto)."""
+    controller = pytest.importorskip("aiosmtpd.controller")
+    arrancados = []
+
+    def arrancar(**kw):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            puerto = s.getsockname()[1]
+        buzon = Buzon(**kw)
+        servidor = controller.Controller(buzon, hostname="127.0.0.1", port=puerto)
+        servidor.start()
+        arrancados.append(servidor)
+        return buzon, puerto
+
+    yield arrancar
+    for servidor in arrancados: servidor.stop()
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+import pytest
+from agenda import IndiceReservas, es_error_solape, ocurrencias
+
+MIGRACION = Path(__file__).resolve().parent.parent / "sql" / "004_reservas_sin_solape.sql"
+DIA = datetime(2024, 5, 6)
+
+
+def h(hora, minuto=0, dias=0):
+    return DIA + timedelta(days=dias, hours=hora, minutes=minuto)
+
+
+def indice(*reservas):
+    return IndiceReservas(pd.DataFrame([{"equipo_id": eq, "fecha_inicio": a.isoformat(), "fecha_fin": b.isoformat()} for eq, a, b in reservas],
+                                       columns=["equipo_id", "fecha_inicio", "fecha_fin"]))
+
+
+def test_solape_y_otro_equipo():
+    ix = indice(("1", h(9), h(11)), ("2", h(12), h(13)))
+    assert ix.conflictos("1", h(10), h(12)) == [(h(9), h(11))]
+    assert ix.conflictos(1, h(8), h(9, 30)) == [(h(9), h(11))]
+    assert not ix.choca("1", h(12), h(13))
+    assert not ix.choca("3", h(9), h(11))
+
+
+def test_intervalos_que_se_tocan_no_chocan():
+    ix = indice(("1", h(9), h(10)), ("1", h(11), h(12)))
+    assert not ix.choca("1", h(10), h(11))
+    assert ix.choca("1", h(9, 59), h(11))
+
+
+def test_reserva_larga_cubre_inicios_posteriores():
+    # La de 8 a 18 empieza antes que las cortas y termina después: sólo el máximo acumulado de fines la encuentra
+    ix = indice(("1", h(8), h(18)), ("1", h(9), h(10)), ("1", h(11), h(12)))
+    assert ix.conflictos("1", h(13), h(14)) == [(h(8), h(18))]
+    assert ix.conflictos("1", h(11, 30), h(13)) == [(h(8), h(18)), (h(11), h(12))]
+    assert not ix.choca("1", h(18), h(19))
+
+
+def test_proximo_libre():
+    ix = indice(("1", h(7), h(18)), ("1", h(9), h(10)), ("1", h(18), h(20, 30)))
+    assert ix.proximo_libre("1", timedelta(hours=1), h(7)) == h(20, 30)
+    assert ix.proximo_libre("1", timedelta(hours=2), h(7)) == h(7, dias=1)
+    assert ix.proximo_libre("1", timedelta(hours=2), h(7), max_dias=0) is None
+    assert indice().proximo_libre("1", timedelta(hours=1), h(6)) == h(7)
+
+
+def test_ocurrencias_semanales():
+    assert ocurrencias(h(9), h(10), "Semanal", 3) == [(h(9), h(10)), (h(9, dias=7), h(10, dias=7)), (h(9, dias=14), h(10, dias=14))]
+    assert ocurrencias(h(9), h(10), "No se repite", 5) == [(h(9), h(10))]
+
+
+def con_btree_gist(base_pg, *migraciones):
+    psycopg = pytest.importorskip("psycopg")
+    conninfo = base_pg()
+    with psycopg.connect(conninfo) as con:
+        if not con.execute("select 1 from pg_available_extensions where name = 'btree_gist'").fetchone(): pytest.skip("el Postgres de prueba no trae btree_gist")
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        for archivo in migraciones: con.execute((MIGRACION.parent / archivo).read_text())
+    return psycopg, conninfo
+
+
+def test_restriccion_de_exclusion_y_su_error(base_pg):
+    psycopg, conninfo = con_btree_gist(base_pg, MIGRACION.name)
+    insertar = "insert into reservas (lab_id, equipo_id, usuario, fecha_inicio, fecha_fin) values ('lab-1', %s, 'ana', %s, %s)"
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute(insertar, ("1", h(9), h(10)))
+        con.execute(insertar, ("1", h(10), h(11)))  # se toca, no se solapa
+        con.execute(insertar, ("2", h(9), h(10)))   # otro equipo
+        with pytest.raises(psycopg.errors.ExclusionViolation) as choque:
+            con.execute(insertar, ("1", h(9, 30), h(10, 30)))
+        assert choque.value.sqlstate == "23P01" and es_error_solape(choque.value)
+        # Volver a correr la migración no cambia nada
+        con.execute(MIGRACION.read_text())
+        assert con.execute("select count(*) from reservas").fetchone()[0] == 3
+    assert es_error_solape(Exception("{'code': '23P01', 'message': 'conflicting key value violates exclusion constraint'}"))
+    assert not es_error_solape(Exception("{'code': '23505', 'message': 'duplicate key value'}"))
+
+
+def test_migracion_se_detiene_con_choques_previos(base_pg):
+    psycopg, conninfo = con_btree_gist(base_pg)
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute("insert into reservas (id, equipo_id, fecha_inicio, fecha_fin) values ('a', '1', %s, %s), ('b', '1', %s, %s)", (h(9), h(11), h(10), h(12)))
+        with pytest.raises(psycopg.errors.RaiseException, match="a ↔ b"):
+            con.execute(MIGRACION.read_text())
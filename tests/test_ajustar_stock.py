@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+from psycopg.types.json import Jsonb
+
+MIGRACIONES = ("003_ajustar_stock.sql", "006_consumo_bitacora.sql")
+
+
+def ajustar(con, ajustes, bitacora_id=None, lab_id="lab-1"):
+    return con.execute("select * from ajustar_stock(%s, 'ana', %s, %s)", (lab_id, Jsonb(ajustes), bitacora_id)).fetchall()
+
+
+def stock(con, item_id):
+    return float(con.execute("select cantidad_actual from items where id = %s", (item_id,)).fetchone()[0])
+
+
+@pytest.fixture
+def lab(base_pg):
+    conninfo = base_pg(*MIGRACIONES)
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute("insert into items (id, lab_id, nombre, cantidad_actual) values ('A', 'lab-1', 'Etanol', 1000), ('B', 'lab-1', 'Agar', 1000), ('C', 'lab-2', 'Ajeno', 5)")
+    return conninfo
+
+
+def test_deltas_concurrentes_sin_perdidas_ni_deadlocks(lab):
+    hilos, vueltas, errores = 8, 25, []
+
+    def trabajar(k):
+        # La mitad de los hilos pide los items en orden inverso
+        orden = ["A", "B"] if k % 2 else ["B", "A"]
+        try:
+            with psycopg.connect(lab, autocommit=True) as con:
+                for _ in range(vueltas): ajustar(con, [{"item_id": i, "delta": -1, "tipo": "Uso"} for i in orden])
+        except Exception as e: errores.append(e)
+
+    ts = [threading.Thread(target=trabajar, args=(k,)) for k in range(hilos)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert errores == []
+    with psycopg.connect(lab) as con:
+        assert stock(con, "A") == stock(con, "B") == 1000 - hilos * vueltas
+        assert con.execute("select count(*), sum(cantidad_cambio) from movimiento").fetchone() == (2 * hilos * vueltas, -2 * hilos * vueltas)
+
+
+def test_bloquea_en_orden_de_id(lab):
+    with psycopg.connect(lab) as t1, psycopg.connect(lab, autocommit=True) as observador:
+        ajustar(t1, [{"item_id": "A", "delta": -1}])  # t1 queda con A bloqueado
+        resultado = {}
+
+        def t2():
+            with psycopg.connect(lab, autocommit=True) as con: resultado["filas"] = ajustar(con, [{"item_id": "B", "delta": -10}, {"item_id": "A", "delta": -10}])
+
+        hilo = threading.Thread(target=t2)
+        hilo.start()
+        for _ in range(100):
+            if observador.execute("select count(*) from pg_stat_activity where wait_event_type = 'Lock' and query like '%ajustar_stock%'").fetchone()[0]: break
+            time.sleep(0.05)
+        else: pytest.fail("la segunda llamada nunca esperó el bloqueo de A")
+        # t2 espera A sin haber tomado B, así que t1 puede seguir con B y confirmar
+        assert observador.execute("select id from items where id = 'B' for update skip locked").fetchall() == [("B",)]
+        ajustar(t1, [{"item_id": "B", "delta": -1}])
+        t1.commit()
+        hilo.join(timeout=10)
+        assert not hilo.is_alive()
+        assert sorted((f[0], float(f[2])) for f in resultado["filas"]) == [("A", 989.0), ("B", 989.0)]
+
+
+def test_falla_al_ligar_consumo_revierte_todo(lab):
+    with psycopg.connect(lab, autocommit=True) as con:
+        con.execute("alter table consumo_bitacora add constraint sin_b check (item_id <> 'B')")
+        with pytest.raises(psycopg.errors.CheckViolation):
+            con.execute("select registrar_entrada_bitacora('lab-1', 'ana', current_date, 'Hice PCR', '', %s)",
+                        (Jsonb([{"item_id": "A", "delta": -3, "tipo": "Uso IA"}, {"item_id": "B", "delta": -4, "tipo": "Uso IA"}]),))
+        assert stock(con, "A") == stock(con, "B") == 1000
+        for tabla in ("movimiento", "consumo_bitacora", "bitacora"):
+            assert con.execute(f"select count(*) from {tabla}").fetchone()[0] == 0
+
+
+def test_liga_consumo_e_ignora_items_de_otro_lab(lab):
+    with psycopg.connect(lab, autocommit=True) as con:
+        filas = ajustar(con, [{"item_id": "A", "delta": -3, "tipo": "Uso"}, {"item_id": "A", "fijar": 900, "tipo": "Conteo"}, {"item_id": "C", "delta": -1}], bitacora_id="7")
+        assert [(f[0], float(f[2]), float(f[3])) for f in filas] == [("A", 997.0, -3.0), ("A", 900.0, -97.0)]
+        assert stock(con, "C") == 5
+        ligados = con.execute("select c.cantidad, m.cantidad_cambio from consumo_bitacora c join movimiento m on m.id::text = c.movimiento_id where c.bitacora_id = '7' order by m.id").fetchall()
+        assert [(float(a), float(b)) for a, b in ligados] == [(3.0, -3.0), (97.0, -97.0)]
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+from alertas import calcular_alertas, resumen_alertas
+from datos import normalizar_items
+
+HOY = date(2024, 6, 15)
+
+
+def items(*filas):
+    return normalizar_items([{"id": str(k), "nombre": f"R{k}", **f} for k, f in enumerate(filas)])
+
+
+def test_limites_de_vencimiento():
+    df = items(*({"fecha_vencimiento": (HOY + timedelta(days=d)).isoformat(), "cantidad_actual": 1} for d in (-1, 0, 30, 31)), {"fecha_vencimiento": "", "cantidad_actual": 1})
+    a = calcular_alertas(df, HOY, dias_vencimiento=30)
+    assert a['vencido'].tolist() == [True, False, False, False, False]
+    # Vence hoy y vence justo en dias_alerta cuentan como por vencer
+    assert a['vence_pronto'].tolist() == [False, True, True, False, False]
+    assert calcular_alertas(df, HOY, dias_vencimiento=31)['vence_pronto'].tolist() == [False, True, True, True, False]
+
+
+def test_stock_critico_y_sin_stock():
+    df = items({"cantidad_actual": 0, "umbral_minimo": 5}, {"cantidad_actual": 5, "umbral_minimo": 5}, {"cantidad_actual": 6, "umbral_minimo": 5},
+               {"cantidad_actual": 1, "umbral_minimo": 0}, {"cantidad_actual": -2})
+    a = calcular_alertas(df, HOY)
+    assert a['sin_stock'].tolist() == [True, False, False, False, True]
+    assert a['bajo_umbral'].tolist() == [False, True, False, False, False]
+    assert resumen_alertas(df, a)['criticos']['nombre'].tolist() == ["R0", "R1", "R4"]
+
+
+def test_fechas_en_formatos_mixtos():
+    df = items({"fecha_vencimiento": "2024-06-10"}, {"fecha_vencimiento": "2024-06-20T00:00:00"}, {"fecha_vencimiento": "no aplica"})
+    r = resumen_alertas(df, calcular_alertas(df, HOY))
+    assert r['vencidos']['nombre'].tolist() == ["R0"]
+    assert r['por_vencer']['nombre'].tolist() == ["R1"]
@@ -0,0 +1,75 @@
+import email
+import functools
+from collections import Counter
+from datetime import date
+import pytest
+import alertas_lote
+from alertas_lote import ejecutar_lote
+from bench.falsos import SupabaseFalso
+from bench.lote import tablas_varios_labs
+from correo import BandejaSalida
+
+N_LABS, N_ITEMS, PAGINA = 6, 40, 25
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    # Páginas chicas: cada tabla se lee en varias
+    monkeypatch.setattr(alertas_lote, "leer_todo", functools.partial(alertas_lote.leer_todo, tamano=PAGINA))
+    tablas = tablas_varios_labs(N_LABS, N_ITEMS)
+    # Un administrador de dos labs (con el correo escrito distinto) recibe un solo resumen
+    tablas["equipo"] += [{"email": "jefa@lab.cl", "nombre": "Jefa", "lab_id": "lab-001", "rol": "admin"},
+                         {"email": "Jefa@Lab.cl", "nombre": "Jefa", "lab_id": "lab-002", "rol": "admin"}]
+    return SupabaseFalso(tablas)
+
+
+def correr(cliente, puerto):
+    bandeja = BandejaSalida("127.0.0.1", puerto, starttls=False, max_retenidos=None)
+    try: return ejecutar_lote(cliente, bandeja, "stck@lab.cl", date.today())
+    finally: bandeja.cerrar()
+
+
+def test_un_resumen_por_admin_en_una_sesion(cliente, servidor_smtp):
+    buzon, puerto = servidor_smtp()
+    res = correr(cliente, puerto)
+    destinos = Counter(d.lower() for sobre in buzon.recibidos for d in sobre.rcpt_tos)
+    admins = {f["email"].lower() for f in cliente.tablas["equipo"] if f["rol"] == "admin"}
+    assert res["correos_fallidos"] == []
+    assert set(destinos) == admins and set(destinos.values()) == {1}
+    assert len(buzon.sesiones) == 1
+    jefa = next(email.message_from_bytes(s.content) for s in buzon.recibidos if "jefa@lab.cl" in s.rcpt_tos)
+    cuerpo = jefa.get_payload()[0].get_payload(decode=True).decode()
+    assert "Laboratorio lab-001" in cuerpo and "Laboratorio lab-002" in cuerpo
+
+
+def test_lectura_paginada_cubre_todos_los_labs(cliente, servidor_smtp):
+    _, puerto = servidor_smtp()
+    res = correr(cliente, puerto)
+    assert res["labs"] == N_LABS and res["items"] == N_LABS * N_ITEMS
+    assert cliente.llamadas["items.select"] == N_LABS * N_ITEMS // PAGINA + 1
+    assert {f["lab_id"] for f in cliente.tablas["alertas_lab"]} == {f"lab-{k:03d}" for k in range(N_LABS)}
+
+
+def test_reemplaza_alertas_en_vez_de_acumular(cliente, servidor_smtp):
+    _, puerto = servidor_smtp()
+    primera = correr(cliente, puerto)
+    assert len(cliente.tablas["alertas_lab"]) == primera["alertas"] == primera["guardadas"]
+    segunda = correr(cliente, puerto)
+    assert len(cliente.tablas["alertas_lab"]) == segunda["alertas"] == primera["alertas"]
+    # Un lab que queda sin alertas se vacía
+    for it in cliente.tablas["items"]:
+        if it["lab_id"] == "lab-000": it.update(cantidad_actual=1e9, umbral_minimo=0, fecha_vencimiento="2999-01-01")
+    correr(cliente, puerto)
+    assert not [f for f in cliente.tablas["alertas_lab"] if f["lab_id"] == "lab-000"]
+
+
+def test_reemplazar_alertas_sql(base_pg):
+    psycopg = pytest.importorskip("psycopg")
+    from psycopg.types.json import Jsonb
+    with psycopg.connect(base_pg("001_consumo_diario.sql", "008_alertas_lote.sql"), autocommit=True) as con:
+        def reemplazar(labs, alertas): return con.execute("select reemplazar_alertas(%s, now(), %s)", (labs, Jsonb(alertas))).fetchone()[0]
+        fila = lambda lab, item: {"lab_id": lab, "item_id": item, "tipo": "critico", "nombre": item, "detalle": {"cantidad": 0}}
+        assert reemplazar(["A", "B"], [fila("A", "1"), fila("A", "2"), fila("B", "3")]) == 3
+        assert reemplazar(["A", "B"], [fila("A", "1"), fila("B", "3")]) == 2
+        assert reemplazar(["B"], []) == 0
+        assert con.execute("select lab_id, item_id from alertas_lab order by item_id").fetchall() == [("A", "1")]
@@ -0,0 +1,17 @@
+import json
+import subprocess
+import sys
+from bench.arranque import DIFERIDOS, RAIZ, medir_arranque
+
+
+def test_modulos_no_importan_dependencias_pesadas():
+    codigo = "import json, sys, etiquetas, reportes, vision, ia_streaming, telemetria, datos; print(json.dumps([m for m in %r if m in sys.modules]))" % DIFERIDOS
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+    assert json.loads(salida) == []
+
+
+def test_primera_ejecucion_sin_errores_ni_imports_diferidos():
+    # El tiempo depende de la máquina; aquí solo se verifica lo determinista
+    for nombre, r in medir_arranque(repeticiones=1).items():
+        assert r["errores"] == [], nombre
+        assert r["diferidos_cargados"] == [], nombre
@@ -0,0 +1,49 @@
+import pandas as pd
+from atajos_ia import PREGUNTA_EXTRA, RESPUESTA_CIERRE, CacheRespuestas, clave_cache, es_respuesta_corta, huella_catalogo, resolver_local
+
+PROTOCOLOS = pd.DataFrame([{"nombre": "Pasaje celular", "materiales_base": "5 ml PBS"}])
+BOM = pd.DataFrame({"i1": [5.0]}, index=["Pasaje celular"])
+
+
+def test_cierre_sin_pregunta_pendiente_se_resuelve_local():
+    assert resolver_local("listo", PROTOCOLOS, BOM)["respuesta_chat"] == RESPUESTA_CIERRE
+    assert resolver_local("ok gracias", PROTOCOLOS, BOM, "Entendido y descontado.")["respuesta_chat"] == RESPUESTA_CIERRE
+
+
+def test_no_a_la_pregunta_extra_se_resuelve_local():
+    ultima = f"Registrado: Pasaje celular (x2). {PREGUNTA_EXTRA}"
+    assert resolver_local("no", PROTOCOLOS, BOM, ultima)["respuesta_chat"] == RESPUESTA_CIERRE
+    # "ok" o "ya" no dicen si se usó una placa: los interpreta el modelo
+    assert resolver_local("ok", PROTOCOLOS, BOM, ultima) is None
+
+
+def test_respuesta_a_otra_pregunta_va_al_modelo():
+    assert resolver_local("no", PROTOCOLOS, BOM, "¿Descuento también el PBS de la reserva?") is None
+    assert resolver_local("ok", PROTOCOLOS, BOM, "¿Confirmas que eran 3 muestras?") is None
+
+
+def test_invocacion_exacta_de_protocolo():
+    data = resolver_local("hoy hice pasaje celular x3", PROTOCOLOS, BOM, "¿Algo más?")
+    assert data["protocolo_detectado"] == {"nombre": "Pasaje celular", "muestras": 3}
+    assert data["descuentos_protocolo"] == [{"id_item": "i1", "cantidad_total_a_restar": 15.0}]
+
+
+def test_protocolo_con_si_o_no_dentro_de_una_palabra():
+    protocolos = pd.DataFrame([{"nombre": "Lisis celular", "materiales_base": "2 ml Buffer"}])
+    data = resolver_local("hice lisis celular x3", protocolos, pd.DataFrame({"b1": [2.0]}, index=["Lisis celular"]))
+    assert data["descuentos_protocolo"] == [{"id_item": "b1", "cantidad_total_a_restar": 6.0}]
+    # El mensaje no es una respuesta corta: los descuentos del protocolo sí se aplican
+    assert not es_respuesta_corta("hice lisis celular x3") and not es_respuesta_corta("inmuno de nuevo")
+    assert es_respuesta_corta("Sí, listo") and es_respuesta_corta("no")
+
+
+def test_cache_no_sirve_stock_viejo():
+    items = pd.DataFrame([{"id": "i1", "nombre": "Etanol", "cantidad_actual": 500.0}])
+    cache = CacheRespuestas()
+    clave = clave_cache("¿Cuánto etanol queda?", "", 3, huella_catalogo(items), 1)
+    cache.guardar(clave, {"respuesta_chat": "Quedan 500 ml"})
+    assert cache.obtener(clave_cache("cuanto etanol queda", "", 3, huella_catalogo(items), 1)) == {"respuesta_chat": "Quedan 500 ml"}
+    # Una escritura local sube la versión; un cambio de otra sesión cambia la huella al recargar
+    assert cache.obtener(clave_cache("¿Cuánto etanol queda?", "", 4, huella_catalogo(items), 1)) is None
+    otra_sesion = items.assign(cantidad_actual=480.0)
+    assert cache.obtener(clave_cache("¿Cuánto etanol queda?", "", 3, huella_catalogo(otra_sesion), 1)) is None
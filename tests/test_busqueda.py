@@ -0,0 +1,77 @@
+import pandas as pd
+from bench.sintetico import generar_lab
+from busqueda import IndiceCatalogo
+from datos import normalizar_items
+from texto import distancia_edicion
+
+CATALOGO = pd.DataFrame([
+    {"nombre": "Ácido clorhídrico", "categoria": "SOLVENTES", "ubicacion": "Gabinete químico", "posicion_caja": ""},
+    {"nombre": "Etanol absoluto", "categoria": "SOLVENTES", "ubicacion": "Estante A", "posicion_caja": ""},
+    {"nombre": "Metanol", "categoria": "SOLVENTES", "ubicacion": "Estante A", "posicion_caja": ""},
+    {"nombre": "Buffer fosfato salino", "categoria": "BUFFERS", "ubicacion": "Refri 1", "posicion_caja": "Caja 3"},
+    {"nombre": "Tubo falcon 15 ml", "categoria": "PLÁSTICOS", "ubicacion": "Bodega", "posicion_caja": ""},
+    {"nombre": "Caja de puntas", "categoria": "PLÁSTICOS", "ubicacion": "Etanol", "posicion_caja": ""},
+])
+
+
+def nombres(consulta):
+    return CATALOGO.iloc[IndiceCatalogo(CATALOGO).buscar(consulta)]['nombre'].tolist()
+
+
+def test_ignora_tildes_y_mayusculas():
+    assert nombres("ACIDO CLORHIDRICO") == ["Ácido clorhídrico"]
+    assert nombres("químico") == ["Ácido clorhídrico"]
+
+
+def test_prefijo_de_la_palabra_que_se_escribe():
+    assert nombres("falc") == ["Tubo falcon 15 ml"]
+    assert nombres("buffer fosf") == ["Buffer fosfato salino"]
+
+
+def test_sinonimos_en_ambos_sentidos():
+    assert nombres("pbs") == ["Buffer fosfato salino"]
+    assert nombres("etoh")[0] == "Etanol absoluto"
+
+
+def test_errores_de_tipeo():
+    assert nombres("etnaol")[0] == "Etanol absoluto"
+    assert nombres("metnaol") == ["Metanol"]
+    assert nombres("clorhidirco") == ["Ácido clorhídrico"]
+
+
+def test_el_nombre_pesa_mas_que_la_ubicacion():
+    assert nombres("etanol") == ["Etanol absoluto", "Caja de puntas"]
+
+
+def test_distancia_con_transposiciones():
+    assert distancia_edicion("etnaol", "etanol", 1) == 1
+    assert distancia_edicion("etanol", "metanol", 1) == 1
+    assert distancia_edicion("agua", "acido", 1) == 2
+
+
+def test_consultas_del_benchmark_encuentran_su_item():
+    df = normalizar_items(generar_lab(1000)['items'])
+    indice = IndiceCatalogo(df)
+    for consulta, esperado in [("acido", "Ácido clorhídrico"), ("pbs", "PBS 10x"), ("anticuerpo cd4", "Anticuerpo anti-CD4"), ("etnaol", "Etanol absoluto")]:
+        encontrados = df.iloc[indice.buscar(consulta)]['nombre']
+        assert len(encontrados) and encontrados.str.startswith(esperado).all(), consulta
+
+
+def test_palabras_seguidas_en_otro_campo_ganan_al_nombre():
+    df = pd.DataFrame([
+        {"nombre": "Agar Sigma #12", "categoria": "MEDIOS", "ubicacion": "Refri 2", "posicion_caja": "Caja 43"},
+        {"nombre": "Etanol Merck #1", "categoria": "SOLVENTES", "ubicacion": "Refri 2", "posicion_caja": "Caja 120"},
+        {"nombre": "DMSO", "categoria": "SOLVENTES", "ubicacion": "Refri 1", "posicion_caja": "Caja 12"},
+    ])
+    indice = IndiceCatalogo(df)
+    assert df.iloc[indice.buscar("caja 12")]['nombre'].tolist() == ["DMSO", "Etanol Merck #1", "Agar Sigma #12"]
+    assert df.iloc[indice.buscar("refri 1")]['nombre'].tolist()[0] == "DMSO"
+    # La consulta puede repartirse entre campos: ubicación y caja
+    assert df.iloc[indice.buscar("refri 2 caja 43")]['nombre'].tolist()[0] == "Agar Sigma #12"
+
+
+def test_catalogo_grande_ubicacion_y_caja():
+    df = normalizar_items(generar_lab(5000)['items'])
+    indice = IndiceCatalogo(df)
+    assert (df.iloc[indice.buscar("caja 12")[:10]]['posicion_caja'] == "Caja 12").all()
+    assert (df.iloc[indice.buscar("refri 1")[:10]]['ubicacion'] == "Refri 1").all()
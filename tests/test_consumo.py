@@ -0,0 +1,14 @@
+import functools
+from datetime import date, timedelta
+import consumo
+from bench.falsos import SupabaseFalso
+
+
+def test_consumo_ventana_lee_todas_las_paginas(monkeypatch):
+    # 12 items × 30 días con un tope de 50 filas por respuesta, como el max-rows de PostgREST
+    monkeypatch.setattr(consumo, "leer_todo", functools.partial(consumo.leer_todo, tamano=50))
+    hoy = date(2024, 3, 31)
+    filas = [{"lab_id": "lab-1", "item_id": f"I{i}", "dia": (hoy - timedelta(days=d)).isoformat(), "cantidad": i + 1} for i in range(12) for d in range(30)]
+    filas.append({"lab_id": "lab-2", "item_id": "I0", "dia": hoy.isoformat(), "cantidad": 99})
+    total = consumo.consumo_ventana(SupabaseFalso({"consumo_diario": filas}, max_filas=50), "lab-1", 30, hoy)
+    assert total.to_dict() == {f"I{i}": 30.0 * (i + 1) for i in range(12)}
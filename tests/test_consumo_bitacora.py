@@ -0,0 +1,97 @@
+from pathlib import Path
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+from psycopg.types.json import Jsonb
+
+SQL = Path(__file__).resolve().parent.parent / "sql"
+MIGRACIONES = ("003_ajustar_stock.sql", "006_consumo_bitacora.sql")
+
+
+def stock(con, item_id):
+    return float(con.execute("select cantidad_actual from items where id = %s", (item_id,)).fetchone()[0])
+
+
+def registrar(con, ajustes, lab_id="lab-1"):
+    return con.execute("select registrar_entrada_bitacora(%s, 'ana', current_date, 'Hice PCR', '', %s)", (lab_id, Jsonb(ajustes))).fetchone()[0]
+
+
+def revertir(con, bitacora_id, lab_id="lab-1"):
+    return con.execute("select revertir_entrada_bitacora(%s, 'ana', %s)", (lab_id, str(bitacora_id))).fetchone()[0]
+
+
+@pytest.fixture
+def lab(base_pg):
+    conninfo = base_pg(*MIGRACIONES)
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute("insert into items (id, lab_id, nombre, cantidad_actual) values ('A', 'lab-1', 'Etanol', 100), ('B', 'lab-1', 'Agar', 50), ('C', 'lab-2', 'Ajeno', 5)")
+    return conninfo
+
+
+def test_registrar_y_revertir_restaura_el_stock(lab):
+    with psycopg.connect(lab, autocommit=True) as con:
+        entrada = registrar(con, [{"item_id": "A", "delta": -30, "tipo": "Uso IA"}, {"item_id": "B", "delta": -5, "tipo": "Uso IA"}, {"item_id": "A", "delta": -2.5, "tipo": "Uso IA"}])
+        assert (stock(con, "A"), stock(con, "B")) == (67.5, 45.0)
+        assert con.execute("select count(*) from consumo_bitacora where bitacora_id = %s", (entrada,)).fetchone()[0] == 3
+        assert revertir(con, entrada) == 3
+        assert (stock(con, "A"), stock(con, "B")) == (100.0, 50.0)
+        for tabla in ("consumo_bitacora", "bitacora"):
+            assert con.execute(f"select count(*) from {tabla}").fetchone()[0] == 0
+        assert con.execute("select sum(cantidad_cambio) from movimiento").fetchone()[0] == 0
+
+
+def test_revertir_solo_toca_el_lab_indicado(lab):
+    with psycopg.connect(lab, autocommit=True) as con:
+        entrada = registrar(con, [{"item_id": "A", "delta": -10, "tipo": "Uso IA"}])
+        assert revertir(con, entrada, lab_id="lab-2") == 0
+        assert stock(con, "A") == 90
+        assert con.execute("select count(*) from bitacora").fetchone()[0] == 1
+        assert con.execute("select count(*) from consumo_bitacora").fetchone()[0] == 1
+        assert revertir(con, entrada) == 1
+        assert stock(con, "A") == 100
+
+
+def test_revertir_una_entrada_inexistente_no_hace_nada(lab):
+    with psycopg.connect(lab, autocommit=True) as con:
+        registrar(con, [{"item_id": "A", "delta": -10, "tipo": "Uso IA"}])
+        assert revertir(con, 999999) == 0
+        assert stock(con, "A") == 90
+        assert con.execute("select count(*) from bitacora").fetchone()[0] == 1
+        assert con.execute("select count(*) from movimiento").fetchone()[0] == 1
+
+
+def test_entrada_html_sin_consumo_se_rechaza(lab):
+    html = "&nbsp; - 📉 5 ml de Etanol <span data-id='A' style='display:none'></span> <i>(Extra)</i>"
+    with psycopg.connect(lab, autocommit=True) as con:
+        entrada = con.execute("insert into bitacora (lab_id, usuario, contenido, resultado) values ('lab-1', 'ana', 'viejo', %s) returning id", (html,)).fetchone()[0]
+        with pytest.raises(psycopg.errors.RaiseException):
+            revertir(con, entrada)
+        assert con.execute("select count(*) from bitacora").fetchone()[0] == 1
+        # Una nota manual sin descuentos se borra sin más
+        nota = con.execute("insert into bitacora (lab_id, usuario, contenido, resultado) values ('lab-1', 'ana', 'nota', '') returning id").fetchone()[0]
+        assert revertir(con, nota) == 0
+        assert con.execute("select count(*) from bitacora where id = %s", (nota,)).fetchone()[0] == 0
+
+
+def test_migracion_convierte_entradas_html_previas(base_pg):
+    conninfo = base_pg("003_ajustar_stock.sql")
+    html = "📉 5 ml de Etanol <span data-id='A' style='display:none'></span><br>📉 2.5 g de Agar <span data-id='B' style='display:none'></span>"
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute("insert into items (id, lab_id, nombre, cantidad_actual) values ('A', 'lab-1', 'Etanol', 95), ('B', 'lab-1', 'Agar', 47.5)")
+        entrada = con.execute("insert into bitacora (lab_id, usuario, contenido, resultado) values ('lab-1', 'ana', 'viejo', %s) returning id", (html,)).fetchone()[0]
+        con.execute((SQL / "006_consumo_bitacora.sql").read_text())
+        assert revertir(con, entrada) == 2
+        assert (stock(con, "A"), stock(con, "B")) == (100.0, 50.0)
+
+
+def test_funciona_con_lab_id_uuid(base_pg):
+    # En Supabase lab_id suele ser el uuid del usuario; las funciones no castean columnas
+    lab = "6f1c2a9e-0b7d-4e55-9a43-2f3b8c1d0e77"
+    with psycopg.connect(base_pg(), autocommit=True) as con:
+        for tabla in ("items", "movimiento", "bitacora"): con.execute(f"alter table {tabla} alter column lab_id type uuid using lab_id::uuid")
+        con.execute(f"insert into items (id, lab_id, nombre, cantidad_actual) values ('A', '{lab}', 'Etanol', 100)")
+        for archivo in MIGRACIONES: con.execute((SQL / archivo).read_text())
+        entrada = registrar(con, [{"item_id": "A", "delta": -30, "tipo": "Uso IA"}], lab_id=lab)
+        assert stock(con, "A") == 70
+        assert revertir(con, entrada, lab_id=lab) == 1
+        assert stock(con, "A") == 100 and con.execute("select count(*) from bitacora").fetchone()[0] == 0
@@ -0,0 +1,68 @@
+from datetime import date
+import pytest
+from bench.falsos import SupabaseFalso
+
+psycopg = pytest.importorskip("psycopg")
+
+
+def rollup(con, lab_id="lab-1"):
+    filas = con.execute("select item_id, dia, cantidad from consumo_diario where lab_id = %s order by item_id, dia", (lab_id,)).fetchall()
+    return {(i, d.isoformat()): float(c) for i, d, c in filas}
+
+
+def retiro(con, item_id, cantidad, created_at=None, lab_id="lab-1"):
+    if created_at is None:
+        con.execute("insert into movimiento (item_id, cantidad_cambio, tipo, lab_id) values (%s, %s, 'Uso', %s)", (item_id, -cantidad, lab_id))
+    else:
+        con.execute("insert into movimiento (item_id, cantidad_cambio, tipo, lab_id, created_at) values (%s, %s, 'Uso', %s, %s)", (item_id, -cantidad, lab_id, created_at))
+
+
+def test_movimiento_confirmado_despues_del_refresco_se_cuenta(base_pg):
+    conninfo = base_pg("001_consumo_diario.sql")
+    with psycopg.connect(conninfo, autocommit=True) as app, psycopg.connect(conninfo) as lenta:
+        # La transacción lenta toma su created_at antes que el retiro ya confirmado, y confirma después del refresco
+        retiro(lenta, "A", 5)
+        retiro(app, "A", 1)
+        app.execute("select refrescar_consumo_diario('lab-1')")
+        hoy = app.execute("select (now() at time zone 'America/Santiago')::date").fetchone()[0].isoformat()
+        assert rollup(app) == {("A", hoy): 1.0}
+        lenta.commit()
+        app.execute("select refrescar_consumo_diario('lab-1')")
+        assert rollup(app) == {("A", hoy): 6.0}
+        # Un refresco sin movimientos nuevos no vuelve a sumar
+        app.execute("select refrescar_consumo_diario('lab-1')")
+        assert rollup(app) == {("A", hoy): 6.0}
+
+
+def test_dias_en_hora_de_santiago_y_solo_retiros(base_pg):
+    conninfo = base_pg("001_consumo_diario.sql")
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        retiro(con, "A", 2, "2024-03-10T02:30:00+00:00")  # 23:30 del 9 en Santiago (UTC-3)
+        retiro(con, "A", 3, "2024-03-10T03:30:00+00:00")  # 00:30 del 10
+        con.execute("insert into movimiento (item_id, cantidad_cambio, tipo, lab_id) values ('A', 50, 'Ingreso', 'lab-1')")
+        retiro(con, "B", 4, "2024-03-10T12:00:00+00:00", lab_id="lab-2")
+        con.execute("select refrescar_consumo_diario('lab-1')")
+        assert rollup(con) == {("A", "2024-03-09"): 2.0, ("A", "2024-03-10"): 3.0}
+        assert rollup(con, "lab-2") == {}
+
+
+def test_el_doble_coincide_con_la_funcion_sql(base_pg):
+    conninfo = base_pg("001_consumo_diario.sql", "008_alertas_lote.sql")
+    historicos = [("A", -2, "2024-03-10T02:30:00+00:00"), ("A", -3, "2024-03-10T03:30:00+00:00"), ("B", 7, "2024-03-11T15:00:00+00:00"), ("B", -1.5, "2024-03-11T15:00:00+00:00")]
+    falso = SupabaseFalso({"equipo": [{"email": "a@lab.cl", "lab_id": "lab-1"}]})
+    with psycopg.connect(conninfo, autocommit=True) as con:
+        con.execute("insert into equipo (email, lab_id) values ('a@lab.cl', 'lab-1')")
+        for item, cambio, momento in historicos:
+            con.execute("insert into movimiento (item_id, cantidad_cambio, lab_id, created_at) values (%s, %s, 'lab-1', %s)", (item, cambio, momento))
+            falso.table("movimiento").insert({"item_id": item, "cantidad_cambio": cambio, "lab_id": "lab-1", "created_at": momento}).execute()
+        con.execute("select refrescar_consumo_diario_todos()")
+        falso.rpc("refrescar_consumo_diario_todos").execute()
+        for item, cambio in [("B", -0.5), ("C", -4)]:
+            con.execute("insert into movimiento (item_id, cantidad_cambio, lab_id) values (%s, %s, 'lab-1')", (item, cambio))
+            falso.table("movimiento").insert({"item_id": item, "cantidad_cambio": cambio, "lab_id": "lab-1"}).execute()
+        con.execute("select refrescar_consumo_diario_todos()")
+        falso.rpc("refrescar_consumo_diario_todos").execute()
+        esperado = rollup(con)
+    hoy = str(next(d for (i, d) in esperado if i == "C"))
+    assert esperado == {("A", "2024-03-09"): 2.0, ("A", "2024-03-10"): 3.0, ("B", "2024-03-11"): 1.5, ("B", hoy): 0.5, ("C", hoy): 4.0}
+    assert {(f["item_id"], f["dia"]): f["cantidad"] for f in falso.tablas["consumo_diario"]} == esperado
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from bench.sintetico import generar_lab
+from contexto_ia import K_RESPALDO, IndiceContexto, evaluar_recall
+from costeo import matriz_bom
+from datos import normalizar_items
+
+
+@pytest.fixture(scope="module")
+def lab():
+    tablas = generar_lab(1000)
+    df, df_prot = normalizar_items(tablas['items']), pd.DataFrame(tablas['protocolos'])
+    return df, df_prot, IndiceContexto(df, df_prot, matriz_bom(df_prot, df))
+
+
+def ids(df, *nombres):
+    return df.loc[df['nombre'].isin(nombres), 'id'].tolist()
+
+
+def test_recall_sobre_consultas_etiquetadas(lab):
+    df, _, indice = lab
+    casos = [
+        ("use 5 ml de PBS 10x Sigma #2", ids(df, "PBS 10x Sigma #2")),
+        ("saqué etnaol absoluto merck 3", ids(df, "Etanol absoluto Merck #3")),
+        ("gasté agarosa thermo #1 y tris base gibco #0", ids(df, "Agarosa Thermo #1", "Tris base Gibco #0")),
+        ("descongelé el anticuerpo anti cd4 corning 4", ids(df, "Anticuerpo anti-CD4 Corning #4")),
+        ("abrí un criovial 2 ml gibco #7", ids(df, "Criovial 2 ml Gibco #7")),
+    ]
+    assert all(esperados for _, esperados in casos)
+    assert evaluar_recall(indice, casos) == 1.0
+
+
+def test_protocolo_trae_los_reactivos_de_su_receta(lab):
+    _, df_prot, indice = lab
+    sel, prots = indice.seleccionar("hice el Protocolo 3 con 4 muestras")
+    assert "Protocolo 3" in prots['nombre'].tolist()
+    receta = {l['item_id'] for l in df_prot.loc[df_prot['nombre'] == "Protocolo 3", 'materiales_parseados'].iloc[0]}
+    assert receta <= set(sel['id'])
+
+
+def test_sin_calces_manda_los_items_con_mas_stock(lab):
+    df, _, indice = lab
+    sel, _ = indice.seleccionar("hola, ¿cómo estás?")
+    assert len(sel) == K_RESPALDO
+    assert sel['cantidad_actual'].tolist() == sorted(df['cantidad_actual'], reverse=True)[:K_RESPALDO]
@@ -0,0 +1,65 @@
+import time
+from email.mime.text import MIMEText
+from correo import BandejaSalida
+
+
+def mensaje(n):
+    msg = MIMEText(f"cuerpo {n}")
+    msg['From'], msg['To'], msg['Subject'] = "stck@lab.cl", f"u{n}@lab.cl", f"Aviso {n}"
+    return msg
+
+
+def test_reutiliza_una_sesion_y_reconecta_tras_inactividad(servidor_smtp):
+    buzon, puerto = servidor_smtp()
+    bandeja = BandejaSalida("127.0.0.1", puerto, starttls=False, inactividad=0.2)
+    try:
+        ids = [bandeja.encolar(mensaje(n)) for n in range(5)]
+        assert bandeja.esperar(10)
+        assert len(buzon.recibidos) == 5 and len(buzon.sesiones) == 1
+        assert {bandeja.estado(i)['estado'] for i in ids} == {"enviado"}
+        time.sleep(0.5)
+        bandeja.encolar(mensaje(5))
+        assert bandeja.esperar(10)
+        assert len(buzon.recibidos) == 6 and len(buzon.sesiones) == 2
+    finally: bandeja.cerrar()
+
+
+def test_reintenta_con_backoff_exponencial(servidor_smtp):
+    buzon, puerto = servidor_smtp(rechazos=2)
+    bandeja = BandejaSalida("127.0.0.1", puerto, starttls=False, reintentos=3, espera_base=0.2)
+    try:
+        id_msg = bandeja.encolar(mensaje(1))
+        assert bandeja.esperar(10)
+        est = bandeja.estado(id_msg)
+        assert (est['estado'], est['intentos'], est['error']) == ("enviado", 3, None)
+        assert len(buzon.recibidos) == 1
+        pausas = [b - a for a, b in zip(buzon.intentos, buzon.intentos[1:])]
+        assert pausas[0] >= 0.2 and pausas[1] >= 0.4
+    finally: bandeja.cerrar()
+
+
+def test_agota_los_reintentos(servidor_smtp):
+    buzon, puerto = servidor_smtp(rechazos=99, codigo="550 Buzón inexistente")
+    bandeja = BandejaSalida("127.0.0.1", puerto, starttls=False, reintentos=2, espera_base=0.05)
+    try:
+        id_msg = bandeja.encolar(mensaje(1))
+        assert bandeja.esperar(10)
+        est = bandeja.estado(id_msg)
+        assert (est['estado'], est['intentos']) == ("error", 2)
+        assert "550" in est['error'] and buzon.recibidos == []
+    finally: bandeja.cerrar()
+
+
+def test_olvida_estados_finales_por_tope_y_antiguedad(servidor_smtp):
+    _, puerto = servidor_smtp()
+    bandeja = BandejaSalida("127.0.0.1", puerto, starttls=False, max_retenidos=3, retener_s=0.3)
+    try:
+        ids = [bandeja.encolar(mensaje(n)) for n in range(5)]
+        assert bandeja.esperar(10)
+        assert [e['id'] for e in bandeja.estados()] == ids[2:]
+        assert bandeja.estado(ids[0])['estado'] == "desconocido"
+        time.sleep(0.5)
+        ultimo = bandeja.encolar(mensaje(5))
+        assert bandeja.esperar(10)
+        assert [e['id'] for e in bandeja.estados()] == [ultimo]
+    finally: bandeja.cerrar()
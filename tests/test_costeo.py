@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+from costeo import detalle_protocolo, matriz_bom, parsear_receta, patron_nombres, simular_costos
+
+ITEMS = pd.DataFrame([
+    {"id": "1", "nombre": "PBS", "unidad": "ml", "cantidad_actual": 100.0, "precio": 1000.0},
+    {"id": "2", "nombre": "D-PBS", "unidad": "ml", "cantidad_actual": 50.0, "precio": 5000.0},
+    {"id": "3", "nombre": "Agua", "unidad": "ml", "cantidad_actual": 1000.0, "precio": 0.0},
+    {"id": "4", "nombre": "Tris base", "unidad": "g", "cantidad_actual": 10.0, "precio": 2000.0},
+])
+
+
+def lineas(texto):
+    return [(l["item_id"], l["cantidad"], l["unidad"]) for l in parsear_receta(texto, ITEMS)]
+
+
+def test_nombres_cortos_solo_como_palabra_completa():
+    assert lineas("Usa 4 ml de DPBS") == []
+    assert lineas("Lavar 3 veces con aguas de enjuague, 2 ml de PBS") == [("1", 2.0, "ml")]
+    assert lineas("Usa 2 ml de D-PBS") == [("2", 2.0, "ml")]
+
+
+def test_coma_decimal_y_coma_separadora():
+    assert lineas("Usa 2,5 ml de D-PBS, 3 ml de agua") == [("2", 2.5, "ml"), ("3", 3.0, "ml")]
+    assert lineas("Agrega 0.5 g de Tris base") == [("4", 0.5, "g")]
+
+
+def test_patron_compilado_una_vez_da_lo_mismo():
+    patron = patron_nombres(ITEMS)
+    texto = "Usa 1,5 ml de PBS, 2 g de Tris base"
+    assert parsear_receta(texto, ITEMS, patron) == parsear_receta(texto, ITEMS)
+
+
+def test_costeo_por_muestras():
+    prot = pd.DataFrame([{"nombre": "Lavado", "materiales_base": "Usa 2 ml de PBS, 1 g de Tris base", "materiales_parseados": None}])
+    bom = matriz_bom(prot, ITEMS)
+    assert bom.loc["Lavado"].to_dict() == {"1": 2.0, "2": 0.0, "3": 0.0, "4": 1.0}
+    # PBS: 1000/100 por ml; Tris: 2000/10 por g
+    assert simular_costos(bom, ITEMS, [1, 10]).loc["Lavado"].tolist() == pytest.approx([220.0, 2200.0])
+    det = detalle_protocolo(bom, ITEMS, "Lavado", 20)
+    assert det[["Reactivo", "Requerido", "Alcanza"]].values.tolist() == [["PBS", 40.0, True], ["Tris base", 20.0, False]]
@@ -0,0 +1,113 @@
+import threading
+from contextvars import ContextVar
+import numpy as np
+import datos
+import pandas as pd
+from bench.falsos import SupabaseFalso
+from datos import VersionesLab, cargar_en_paralelo, filas_modificadas, guardar_cambios, leer_items, leer_pagina_bitacora, leer_protocolos, limpiar_item, upsert_en_lotes
+
+ORIGINAL = pd.DataFrame([
+    {"id": "1", "nombre": "Etanol", "cantidad_actual": 10.0, "fecha_vencimiento": None},
+    {"id": "2", "nombre": "Agar", "cantidad_actual": 5.0, "fecha_vencimiento": "2025-01-01"},
+    {"id": "3", "nombre": "PBS", "cantidad_actual": np.nan, "fecha_vencimiento": None},
+])
+
+
+def test_edicion_sin_cambios_no_escribe():
+    cliente = SupabaseFalso({"items": ORIGINAL.to_dict(orient="records")})
+    assert filas_modificadas(ORIGINAL, ORIGINAL.copy()).empty
+    assert guardar_cambios(cliente, "items", ORIGINAL, ORIGINAL.copy(), "lab-1", limpiar_item) == 0
+    assert cliente.llamadas["items.upsert"] == 0
+
+
+def test_solo_las_filas_editadas_y_las_nuevas():
+    editado = ORIGINAL.copy()
+    editado.loc[1, "cantidad_actual"] = 4.0
+    editado = pd.concat([editado, pd.DataFrame([{"id": "9", "nombre": "Nuevo", "cantidad_actual": 1.0}, {"id": "", "nombre": "Sin id", "cantidad_actual": 1.0}])], ignore_index=True)
+    assert filas_modificadas(ORIGINAL, editado)["id"].tolist() == ["2", "9"]
+
+
+def test_upsert_por_lotes_con_lab_y_nulos():
+    original = pd.DataFrame({"id": [str(i) for i in range(7)], "cantidad_actual": [1.0] * 7})
+    editado = original.assign(cantidad_actual=[2.0] * 6 + [np.nan])
+    cliente = SupabaseFalso({"items": original.to_dict(orient="records")})
+    assert guardar_cambios(cliente, "items", original, editado, "lab-1") == 7
+    assert cliente.llamadas["items.upsert"] == 1
+    guardadas = {f["id"]: f for f in cliente.tablas["items"]}
+    assert guardadas["0"]["cantidad_actual"] == 2.0 and guardadas["0"]["lab_id"] == "lab-1"
+    assert guardadas["6"]["cantidad_actual"] is None
+    upsert_en_lotes(cliente, "items", [{"id": str(i)} for i in range(7)], tamano=3)
+    assert cliente.llamadas["items.upsert"] == 4
+
+
+def test_bitacora_paginada_desempata_por_id():
+    # Cuatro entradas con el mismo created_at caen entre dos páginas
+    momentos = ["2024-05-01T10:00:00+00:00"] * 2 + ["2024-05-02T10:00:00+00:00"] * 4 + ["2024-05-03T10:00:00+00:00"]
+    filas = [{"id": str(k + 8), "lab_id": "lab-1", "usuario": "Ana" if k % 2 else "Bruno", "created_at": m, "contenido": f"e{k}"} for k, m in enumerate(momentos)]
+    cliente = SupabaseFalso({"bitacora": filas + [{"id": "99", "lab_id": "lab-2", "created_at": momentos[-1]}]})
+    vistas, cursor, paginas = [], None, 0
+    while True:
+        df, cursor = leer_pagina_bitacora(cliente, "lab-1", cursor=cursor, limite=3)
+        vistas += df['id'].tolist()
+        paginas += 1
+        if cursor is None: break
+    assert paginas == 3
+    assert vistas == ["14", "13", "12", "11", "10", "9", "8"]
+    df, cursor = leer_pagina_bitacora(cliente, "lab-1", usuario="Ana", limite=3)
+    assert df['id'].tolist() == ["13", "11", "9"] and cursor is None
+    assert df['hora_local'].tolist() == ["06:00", "06:00", "06:00"]
+
+
+def test_carga_paralela_aisla_errores_y_esperas():
+    soltar = threading.Event()
+    def falla(): raise RuntimeError("sin conexión")
+    try:
+        resultados, errores = cargar_en_paralelo({"items": lambda: [1, 2], "lenta": lambda: soltar.wait(5), "rota": falla}, timeout=0.3)
+    finally: soltar.set()
+    assert resultados == {"items": [1, 2]}
+    assert errores == {"lenta": "sin respuesta en 0.3 s", "rota": "RuntimeError: sin conexión"}
+
+
+def test_tareas_colgadas_no_agotan_el_pool(monkeypatch):
+    monkeypatch.setattr(datos, "HILOS_CARGA", 2)
+    monkeypatch.setattr(datos, "_pool_carga", None)
+    monkeypatch.setattr(datos, "_colgadas", set())
+    soltar = threading.Event()
+    try:
+        _, errores = cargar_en_paralelo({"a": lambda: soltar.wait(5), "b": lambda: soltar.wait(5)}, timeout=0.2)
+        assert set(errores) == {"a", "b"}
+        # Ambos hilos siguen ocupados: la siguiente carga corre en un pool nuevo
+        resultados, errores = cargar_en_paralelo({"items": lambda: "ok"}, timeout=1)
+        assert resultados == {"items": "ok"} and errores == {}
+    finally: soltar.set()
+
+
+def test_carga_paralela_propaga_contexto_y_al_iniciar():
+    lab = ContextVar("lab", default="-")
+    hilos = []
+    token = lab.set("lab-1")
+    try: resultados, errores = cargar_en_paralelo({k: lab.get for k in "abc"}, al_iniciar=lambda: hilos.append(threading.current_thread().name))
+    finally: lab.reset(token)
+    assert resultados == dict.fromkeys("abc", "lab-1") and errores == {}
+    assert len(hilos) == 3 and all(h.startswith("stck-carga") for h in hilos)
+
+
+def test_catalogo_completo_pese_al_tope_de_filas():
+    cliente = SupabaseFalso({"items": [{"id": f"{k:05d}", "lab_id": "lab-1", "nombre": f"R{k}"} for k in range(2500)] + [{"id": "x", "lab_id": "lab-2", "nombre": "Ajeno"}],
+                             "protocolos": [{"id": f"p{k:04d}", "lab_id": "lab-1", "nombre": f"P{k}"} for k in range(1000)]}, max_filas=1000)
+    items = leer_items(cliente, "lab-1")
+    assert len(items) == 2500 and items["id"].is_unique and cliente.llamadas["items.select"] == 3
+    # Una página exactamente llena obliga a pedir la siguiente, que llega vacía
+    assert len(leer_protocolos(cliente, "lab-1")) == 1000 and cliente.llamadas["protocolos.select"] == 2
+
+
+def test_invalidar_sube_solo_las_tablas_escritas():
+    versiones = VersionesLab()
+    versiones.invalidar("lab-1", "items", "movimiento")
+    versiones.invalidar("lab-1", "items")
+    assert {t: versiones.version("lab-1", t) for t in ("items", "movimiento", "bitacora", "protocolos")} == {"items": 2, "movimiento": 1, "bitacora": 0, "protocolos": 0}
+    assert versiones.version("lab-2", "items") == 0
+    hilos = [threading.Thread(target=lambda: [versiones.invalidar("lab-2", "reservas") for _ in range(200)]) for _ in range(4)]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    assert versiones.version("lab-2", "reservas") == 800 and versiones.version("lab-1", "reservas") == 0
@@ -0,0 +1,48 @@
+import pytest
+from bench.falsos import SupabaseFalso
+from espejo import EspejoLocal
+
+
+@pytest.fixture
+def cliente():
+    return SupabaseFalso({
+        "equipo": [{"email": "ana@lab.cl", "lab_id": "A", "nombre": "Ana"}, {"email": "beto@lab.cl", "lab_id": "A", "nombre": "Beto"}],
+        "items": [{"id": "1", "lab_id": "A", "nombre": "Etanol"}, {"id": "2", "lab_id": "A", "nombre": "Agar"}],
+    })
+
+
+def claves(espejo, lab, tabla, clave="id"):
+    return sorted(f[clave] for f in espejo.leer(lab, tabla))
+
+
+def test_fila_que_cambia_de_lab_sale_del_espejo_anterior(cliente, tmp_path):
+    espejo = EspejoLocal(str(tmp_path / "espejo.db"))
+    for lab in ("A", "B"): espejo.sincronizar(cliente, lab, "equipo")
+    cliente.table("equipo").update({"lab_id": "B", "rol": "miembro"}).eq("email", "beto@lab.cl").execute()
+    for lab in ("A", "B"): espejo.sincronizar(cliente, lab, "equipo")
+    assert claves(espejo, "A", "equipo", "email") == ["ana@lab.cl"]
+    assert claves(espejo, "B", "equipo", "email") == ["beto@lab.cl"]
+
+
+def test_fila_que_sale_y_vuelve_queda(cliente, tmp_path):
+    espejo = EspejoLocal(str(tmp_path / "espejo.db"))
+    espejo.sincronizar(cliente, "A", "items")
+    cliente.table("items").update({"lab_id": "B"}).eq("id", "2").execute()
+    cliente.table("items").update({"lab_id": "A"}).eq("id", "2").execute()
+    cliente.table("items").delete().eq("id", "1").execute()
+    assert espejo.sincronizar(cliente, "A", "items") == (1, 2)
+    assert claves(espejo, "A", "items") == ["2"]
+
+
+def test_trigger_de_traslado_deja_lapida(base_pg):
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(base_pg("007_espejo_updated_at_tombstones.sql"), autocommit=True) as con:
+        con.execute("insert into equipo (email, lab_id, nombre) values ('ana@lab.cl', 'A', 'Ana')")
+        con.execute("insert into items (id, lab_id, nombre) values ('1', 'A', 'Etanol')")
+        con.execute("update equipo set nombre = 'Ana María' where email = 'ana@lab.cl'")
+        con.execute("update items set cantidad_actual = 3 where id = '1'")
+        assert con.execute("select count(*) from filas_eliminadas").fetchone()[0] == 0
+        con.execute("update equipo set lab_id = 'B' where email = 'ana@lab.cl'")
+        con.execute("update items set lab_id = 'C' where id = '1'")
+        con.execute("update items set id = '9' where id = '1'")
+        assert con.execute("select tabla, lab_id, fila_id from filas_eliminadas order by id").fetchall() == [("equipo", "A", "ana@lab.cl"), ("items", "A", "1"), ("items", "C", "1")]
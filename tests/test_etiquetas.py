@@ -0,0 +1,50 @@
+import os
+import pandas as pd
+import pytest
+import etiquetas
+
+pytest.importorskip("qrcode")
+pytest.importorskip("fpdf")
+
+
+@pytest.fixture(autouse=True)
+def cache_qr(tmp_path, monkeypatch):
+    monkeypatch.setattr(etiquetas, "CARPETA_CACHE_QR", str(tmp_path))
+    return tmp_path
+
+
+def test_solo_dibuja_los_qr_que_faltan(cache_qr):
+    rutas, nuevos = etiquetas.asegurar_qrs(["Etanol", "Agar", "Etanol"])
+    assert nuevos == 2 and list(rutas) == ["Etanol", "Agar"]
+    assert all(os.path.exists(r) for r in rutas.values())
+    antes = os.path.getmtime(rutas["Etanol"])
+    rutas, nuevos = etiquetas.asegurar_qrs(["Etanol", "Agar", "PBS"])
+    assert nuevos == 1 and os.path.getmtime(rutas["Etanol"]) == antes
+    assert sorted(os.listdir(cache_qr)) == sorted(os.path.basename(r) for r in rutas.values())
+
+
+def test_la_clave_cambia_con_los_parametros(monkeypatch):
+    ruta = etiquetas.ruta_qr("Etanol")
+    monkeypatch.setattr(etiquetas, "PARAMS_QR", {**etiquetas.PARAMS_QR, "box_size": 5})
+    assert etiquetas.ruta_qr("Etanol") != ruta
+
+
+def test_la_cache_descarta_las_imagenes_mas_antiguas(cache_qr, monkeypatch):
+    monkeypatch.setattr(etiquetas, "MAX_CACHE_QR", 3)
+    viejas, _ = etiquetas.asegurar_qrs(["A", "B", "C"])
+    for k, ruta in enumerate(viejas.values()): os.utime(ruta, (1000 + k, 1000 + k))
+    rutas, nuevos = etiquetas.asegurar_qrs(["C", "D"])
+    assert nuevos == 1 and sorted(os.listdir(cache_qr)) == sorted(os.path.basename(r) for r in [viejas["B"], *rutas.values()])
+    # Lo que pide la llamada actual nunca se borra, aunque supere el máximo
+    rutas, _ = etiquetas.asegurar_qrs(["E", "F", "G", "H"])
+    assert sorted(os.listdir(cache_qr)) == sorted(os.path.basename(r) for r in rutas.values())
+
+
+def test_lote_grande_en_paralelo_y_hoja_pdf(monkeypatch):
+    monkeypatch.setattr(etiquetas, "UMBRAL_PARALELO", 4)
+    por_hoja = etiquetas.COLUMNAS * etiquetas.FILAS
+    df = pd.DataFrame({"nombre": [f"Reactivo ñ {k}" for k in range(por_hoja + 1)], "ubicacion": "Refri 1", "posicion_caja": "Caja 3"})
+    pdf, nuevos = etiquetas.generar_hoja_etiquetas(df, procesos=2)
+    assert nuevos == por_hoja + 1
+    assert pdf.startswith(b"%PDF") and b"/Count 2" in pdf
+    assert etiquetas.generar_hoja_etiquetas(df.head(3))[1] == 0
@@ -0,0 +1,42 @@
+import json
+from types import SimpleNamespace
+from ia_streaming import generar_en_streaming, respuesta_parcial
+
+COMPLETO = json.dumps({"respuesta_chat": "Listo: 5 ml de \"PBS\"\ndescontados ✅", "entrada_cuaderno": "PCR"}, ensure_ascii=False)
+
+
+def test_json_truncado_en_cualquier_punto():
+    inicio = COMPLETO.index('"respuesta_chat"')
+    for corte in range(len(COMPLETO) + 1):
+        parcial = respuesta_parcial(COMPLETO[:corte])
+        assert "Listo: 5 ml de \"PBS\"\ndescontados ✅".startswith(parcial), (corte, parcial)
+        if corte < inicio: assert parcial == ""
+    assert respuesta_parcial(COMPLETO) == "Listo: 5 ml de \"PBS\"\ndescontados ✅"
+
+
+def test_escape_unicode_cortado_espera_al_siguiente_trozo():
+    assert respuesta_parcial('{"respuesta_chat": "Listo \\u00') == "Listo "
+    assert respuesta_parcial('{"respuesta_chat": "Listo \\u00e1') == "Listo á"
+    assert respuesta_parcial('{"respuesta_chat": "a\\') == "a"
+
+
+class TrozoSinTexto:
+    # Como los trozos de Gemini que sólo traen metadatos de seguridad
+    @property
+    def text(self): raise ValueError("sin partes de texto")
+
+
+class Modelo:
+    def __init__(self, trozos): self.trozos = trozos
+
+    def generate_content(self, prompt, stream=False):
+        for t in self.trozos: yield TrozoSinTexto() if t is None else SimpleNamespace(text=t)
+
+
+def test_avisa_solo_cuando_cambia_el_texto_y_parsea_al_final():
+    trozos = ["```json\n{", '"respuesta_chat": "Ho', None, 'la"', ', "entrada_cuaderno": ""}', "\n```"]
+    vistos = []
+    texto, data = generar_en_streaming(Modelo(trozos), "p", vistos.append)
+    assert vistos == ["Ho", "Hola"]
+    assert data == {"respuesta_chat": "Hola", "entrada_cuaderno": ""}
+    assert generar_en_streaming(Modelo(['{"respuesta_chat": "cor']), "p")[1] is None
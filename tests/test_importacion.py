@@ -0,0 +1,46 @@
+import functools
+from io import BytesIO
+import pandas as pd
+import pytest
+import importacion
+from bench.falsos import SupabaseFalso
+from importacion import a_numero, importar_catalogo, validar_bloque
+
+
+def test_numeros_con_separadores_de_ambos_estilos():
+    crudos = pd.Series(["1.234,5", "1,234.5", "$12.990", "12,5", 1290, "1.234.567", "-3", "abc", "", None])
+    assert a_numero(crudos).fillna(-1).tolist() == [1234.5, 1234.5, 12990.0, 12.5, 1290.0, 1234567.0, -3.0, -1, -1, -1]
+
+
+def bloque(filas, columnas=("Producto", "Precio Neto", "SKU")):
+    return pd.DataFrame(filas, columns=list(columnas), dtype=object).assign(_fila=range(2, len(filas) + 2))
+
+
+def test_validacion_por_fila_y_clave_natural():
+    registros, errores = validar_bloque(bloque([
+        ["Etanol 1L", "$12.990", "ET-01"], ["", "100", None], ["Agar", "gratis", None], ["Tris", "-5", None],
+        ["  PBS   10x ", "1.500", ""], ["Etanol 1 litro", "13.500", "et-01"],
+    ]), "lab-1")
+    assert errores == [(3, "Nombre vacío"), (4, "Precio no numérico"), (5, "Precio negativo")]
+    # Misma clave (código sin distinguir mayúsculas): gana la última aparición
+    assert [(r["nombre"], r["precio"], r["clave_importacion"]) for r in registros] == [("PBS   10x", 1500.0, "nom:pbs 10x"), ("Etanol 1 litro", 13500.0, "cod:et-01")]
+    assert {r["lab_id"] for r in registros} == {"lab-1"} and {r["categoria"] for r in registros} == {"GENERAL"}
+
+
+def test_sin_columna_de_nombre():
+    with pytest.raises(ValueError):
+        validar_bloque(bloque([["x", "1"]], ("Código", "Precio")), "lab-1")
+
+
+def test_importa_csv_por_bloques_con_upsert_natural(monkeypatch):
+    monkeypatch.setattr(importacion, "leer_por_bloques", functools.partial(importacion.leer_por_bloques, tamano=4))
+    csv = "Producto;Precio;Categoría\n" + "".join(f"Reactivo {k};{k}.000;sales\n" for k in range(10)) + "Reactivo 3;9.999;sales\n;5;x\n"
+    cliente = SupabaseFalso({"items": [{"id": "1", "lab_id": "lab-1", "nombre": "Reactivo 0", "clave_importacion": "nom:reactivo 0", "precio": 1}]})
+    avances = []
+    resumen = importar_catalogo(cliente, BytesIO(csv.encode("utf-8")), "lista.csv", "lab-1", avances.append, tamano_lote=3)
+    assert {k: resumen[k] for k in ("leidas", "guardadas", "con_error", "repetidas")} == {"leidas": 12, "guardadas": 11, "con_error": 1, "repetidas": 1}
+    assert resumen["errores"] == [(13, "Nombre vacío")]
+    items = {f["clave_importacion"]: f for f in cliente.tablas["items"]}
+    assert len(items) == 10 and items["nom:reactivo 0"]["id"] == "1" and items["nom:reactivo 3"]["precio"] == 9999.0
+    assert items["nom:reactivo 5"]["categoria"] == "SALES"
+    assert len(avances) == cliente.llamadas["items.upsert"] > 3
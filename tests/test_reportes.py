@@ -0,0 +1,50 @@
+import re
+from datetime import date
+import pandas as pd
+import pytest
+
+pytest.importorskip("fpdf")
+import reportes
+from alertas import calcular_alertas
+from datos import normalizar_items
+
+HOY = date(2024, 6, 15)
+ITEMS = normalizar_items([
+    {"id": "1", "nombre": "β-mercaptoetanol", "categoria": "SOLVENTES", "ubicacion": "Refri 1", "cantidad_actual": 12, "unidad": "ml", "precio": 1000, "fecha_vencimiento": "2024-01-01"},
+    {"id": "2", "nombre": "Anticuerpo α-CD4 µg", "categoria": "ANTICUERPOS", "ubicacion": "", "cantidad_actual": 2.54321, "unidad": "µl", "umbral_minimo": 5, "precio": 500},
+    {"id": "3", "nombre": "agarosa", "categoria": "", "ubicacion": "Refri 1", "cantidad_actual": 0, "unidad": "g"},
+])
+
+
+def paginas(pdf):
+    return int(re.search(rb"/Count (\d+)", pdf).group(1))
+
+
+def test_filas_formateadas_en_bloque():
+    textos = reportes.formatear_filas(ITEMS)
+    assert textos['stock'].tolist() == ["12 ml", "2.543 µl", "0 g"]
+    assert textos['nombre'].str.len().max() <= 48
+    latin = reportes.formatear_filas(ITEMS, unicode=False)
+    assert latin.at[1, 'nombre'] == "Anticuerpo ?-CD4 µg"
+
+
+def test_totales():
+    t = reportes.calcular_totales(ITEMS, calcular_alertas(ITEMS, HOY))
+    assert t == {"reactivos": 3, "criticos": 2, "vencidos": 1, "valor": 1500.0}
+
+
+@pytest.mark.parametrize("unicode", [True, False])
+def test_un_grupo_por_pagina(monkeypatch, unicode):
+    if not unicode: monkeypatch.setattr(reportes, "RUTAS_FUENTE", [])
+    elif reportes.ruta_fuente_unicode() is None: pytest.skip("sin DejaVu instalada")
+    assert paginas(reportes.generar_reporte_inventario(ITEMS, "ana", None, HOY)) == 1
+    # SOLVENTES, ANTICUERPOS y la categoría vacía normalizada a GENERAL
+    assert paginas(reportes.generar_reporte_inventario(ITEMS, "ana", "categoria", HOY)) == 3
+    # "Refri 1" y "Sin asignar"
+    assert paginas(reportes.generar_reporte_inventario(ITEMS, "ana", "ubicacion", HOY)) == 2
+
+
+def test_reporte_largo_pagina_solo():
+    n = 200
+    df = normalizar_items([{"id": str(k), "nombre": f"R{k}", "cantidad_actual": k, "unidad": "ml"} for k in range(n)])
+    assert paginas(reportes.generar_reporte_inventario(df, hoy=HOY)) > 1
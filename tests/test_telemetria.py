@@ -0,0 +1,44 @@
+import logging
+from bench.falsos import SupabaseFalso
+from telemetria import ClienteMedido, Telemetria, lab_actual
+
+
+def test_percentiles_e_histograma_sobre_una_muestra_conocida():
+    tel = Telemetria()
+    for ms in range(101): tel.registrar("supabase", "items.select", float(ms), lab="lab-1", pestana="Inventario")
+    tel.registrar("supabase", "items.select", 5.0, lab="lab-2", pestana="Inventario")
+    [fila] = tel.resumen("lab-1")
+    assert (fila["n"], fila["p50_ms"], fila["p95_ms"], fila["max_ms"]) == (101, 50.0, 95.0, 100.0)
+    assert fila["histograma"]["<=10"] == 11 and fila["histograma"]["<=100"] == 50 and sum(fila["histograma"].values()) == 101
+    assert len(tel.resumen()) == 2
+
+
+def test_ventana_acotada_conserva_el_total():
+    tel = Telemetria(muestras=10)
+    for ms in [1000.0] * 5 + [1.0] * 10: tel.registrar("ui", "Inventario", ms, lab="lab-1")
+    [fila] = tel.resumen()
+    assert fila["n"] == 15 and fila["max_ms"] == 1.0
+
+
+def test_spans_lentos_se_anotan_y_se_loguean(caplog):
+    tel = Telemetria(umbrales={"llm": 100})
+    with caplog.at_level(logging.WARNING, logger="stck.lento"):
+        tel.registrar("llm", "gemini.stream", 100.0, lab="lab-1")
+        tel.registrar("llm", "gemini.stream", 250.0, lab="lab-1")
+        tel.registrar("desconocido", "x", 1e6, lab="lab-1")
+    [lento] = tel.lentos("lab-1")
+    assert (lento["nombre"], lento["ms"], lento["umbral_ms"]) == ("gemini.stream", 250.0, 100)
+    assert len(caplog.records) == 1 and tel.lentos("lab-2") == []
+    assert tel.exportar_csv().count("\n") == 3
+
+
+def test_cliente_medido_nombra_por_tabla_y_operacion():
+    tel = Telemetria()
+    cliente = ClienteMedido(SupabaseFalso({"items": [{"id": "1", "lab_id": "lab-1"}]}), tel)
+    token = lab_actual.set("lab-1")
+    try:
+        cliente.table("items").select("*").eq("lab_id", "lab-1").execute()
+        cliente.table("items").update({"nombre": "x"}).eq("id", "1").execute()
+        cliente.table("items").select("id").execute()
+    finally: lab_actual.reset(token)
+    assert {(f["lab"], f["nombre"], f["n"]) for f in tel.resumen()} == {("lab-1", "items.select", 2), ("lab-1", "items.update", 1)}
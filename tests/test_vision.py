@@ -0,0 +1,30 @@
+from io import BytesIO
+import pytest
+from vision import decodificar_qr, preparar_para_ia
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def etiqueta(texto, lado=None):
+    from etiquetas import generar_qr
+    pytest.importorskip("qrcode")
+    img = Image.open(BytesIO(generar_qr(texto)))
+    return img.resize((lado, lado), Image.NEAREST) if lado else img
+
+
+def test_lee_la_etiqueta_localmente():
+    pytest.importorskip("cv2")
+    assert decodificar_qr(etiqueta("Etanol absoluto")) == "Etanol absoluto"
+    # Foto grande: si falla a tamaño completo se reintenta achicada
+    assert decodificar_qr(etiqueta("Tripsina-EDTA", 2400)) == "Tripsina-EDTA"
+    assert decodificar_qr(Image.new("RGB", (300, 300), "white")) is None
+
+
+def test_foto_para_la_ia_achicada_y_en_jpeg():
+    foto = Image.new("RGBA", (4000, 3000), (200, 30, 30, 255))
+    blob, datos = preparar_para_ia(foto)
+    assert blob == {"mime_type": "image/jpeg", "data": datos}
+    reducida = Image.open(BytesIO(datos))
+    assert reducida.format == "JPEG" and reducida.size == (1024, 768)
+    chica = Image.open(BytesIO(preparar_para_ia(Image.new("L", (200, 100)))[1]))
+    assert chica.size == (200, 100) and chica.mode == "RGB"
@@ -0,0 +1,91 @@
+# --- NORMALIZACIÓN DE TEXTO Y VOCABULARIO DE BÚSQUEDA ---
+# Común al índice del catálogo (busqueda.py), a la selección de contexto de la IA
+# (contexto_ia.py), a los atajos de la IA y a la importación: texto sin tildes ni mayúsculas
+# y un vocabulario que expande cada palabra de una consulta a sus calces exactos, por prefijo
+# y difusos (errores de tipeo): por trigramas o, si esos no alcanzan, por distancia de edición
+# con transposiciones ("etnaol" → "etanol" comparte muy pocos trigramas).
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+
+PESO_EXACTO = 1.0
+PESO_PREFIJO = 0.7
+PESO_DIFUSO = 0.5
+MIN_PREFIJO = 2
+MIN_DIFUSO = 4
+UMBRAL_TRIGRAMAS = 0.34
+MIN_DIFUSO_2 = 8  # desde este largo se aceptan dos ediciones en vez de una
+MAX_EXPANSION_PREFIJO = 2000
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def palabras(texto):
+    return re.findall(r'[a-z0-9µ]+', normalizar(texto))
+
+
+def distancia_edicion(a, b, tope):
+    """Distancia de Damerau-Levenshtein restringida (una transposición cuenta como una edición).
+    Devuelve tope + 1 apenas se sabe que la supera."""
+    if abs(len(a) - len(b)) > tope: return tope + 1
+    previa2, previa = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            actual[j] = min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb: actual[j] = min(actual[j], previa2[j - 2] + 1)
+        if min(actual) > tope: return tope + 1
+        previa2, previa = previa, actual
+    return previa[-1]
+
+
+def trigramas(token):
+    t = f" {token} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+class Vocabulario:
+    """Tokens ordenados (para prefijos por búsqueda binaria) e índice de trigramas (para difusos)."""
+
+    def __init__(self, tokens):
+        self.tokens = sorted(set(tokens))
+        self._conjunto = set(self.tokens)
+        self._tri = defaultdict(list)
+        for tok in self.tokens:
+            if len(tok) >= MIN_DIFUSO:
+                for g in trigramas(tok): self._tri[g].append(tok)
+
+    def __contains__(self, token): return token in self._conjunto
+
+    def prefijos(self, q):
+        if len(q) < MIN_PREFIJO: return []
+        i = bisect.bisect_left(self.tokens, q)
+        fin = min(i + MAX_EXPANSION_PREFIJO, len(self.tokens))
+        salida = []
+        while i < fin and self.tokens[i].startswith(q):
+            salida.append(self.tokens[i]); i += 1
+        return salida
+
+    def difusos(self, q):
+        if len(q) < MIN_DIFUSO: return []
+        tq = trigramas(q)
+        votos = defaultdict(int)
+        for g in tq:
+            for tok in self._tri.get(g, ()): votos[tok] += 1
+        tope = 2 if len(q) >= MIN_DIFUSO_2 else 1
+        return [tok for tok, v in votos.items()
+                if v / len(tq | trigramas(tok)) >= UMBRAL_TRIGRAMAS or distancia_edicion(q, tok, tope) <= tope]
+
+    def expandir(self, q, prefijo=True, difuso_siempre=True):
+        """{token: peso} de los calces de `q`. Sin `prefijo`, los prefijos sólo si no hay calce
+        exacto; sin `difuso_siempre`, los difusos sólo si no hubo ningún otro calce."""
+        calces = {q: PESO_EXACTO} if q in self._conjunto else {}
+        if prefijo or not calces:
+            for tok in self.prefijos(q): calces.setdefault(tok, PESO_PREFIJO)
+        if difuso_siempre or not calces:
+            for tok in self.difusos(q): calces.setdefault(tok, PESO_DIFUSO)
+        return calces
@@ -0,0 +1,34 @@
+# --- VISIÓN LOCAL: LECTURA DE QR Y PREPARACIÓN DE FOTOS PARA LA IA ---
+# Las etiquetas de generar_qr sólo codifican el nombre del reactivo, así que se leen
+# localmente con OpenCV (opcional) sin pasar por Gemini. Las fotos que sí van al modelo
+# se achican y recomprimen antes de subirlas. OpenCV y PIL se importan en el primer uso.
+from io import BytesIO
+import numpy as np
+
+LADO_MAX_IA = 1024
+CALIDAD_JPEG = 80
+
+
+def decodificar_qr(img):
+    """Texto del primer QR de la imagen, o None (también si OpenCV no está instalado)."""
+    try: import cv2
+    except ImportError: return None
+    gris = cv2.cvtColor(np.asarray(img.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    detector = cv2.QRCodeDetector()
+    texto, puntos, _ = detector.detectAndDecode(gris)
+    if not texto and min(gris.shape) > 800:
+        # En fotos grandes el detector a veces falla: se reintenta a menor resolución
+        escala = 800 / min(gris.shape)
+        texto, puntos, _ = detector.detectAndDecode(cv2.resize(gris, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA))
+    return texto.strip() or None
+
+
+def preparar_para_ia(img, lado_max=LADO_MAX_IA, calidad=CALIDAD_JPEG):
+    """Blob JPEG reducido para Gemini. Devuelve (blob, bytes_jpeg)."""
+    from PIL import Image
+    img = img.convert('RGB')
+    img.thumbnail((lado_max, lado_max), Image.LANCZOS)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=calidad, optimize=True)
+    datos = buf.getvalue()
+    return {"mime_type": "image/jpeg", "data": datos}, datos